@@ -0,0 +1,144 @@
+import argparse
+import contextlib
+import queue
+import sys
+from socket import *
+
+from framing import FRAME_HEADER, frame, unframe
+
+## Port of the server, unless told otherwise (as in tcpserver.py)
+SERVER_PORT = 8898
+
+## Most bytes read at once
+RECEIVE_SIZE = 1 << 16
+
+## Long-lived connection to a framed server (tcpserver.py --framed): any
+## number of length-prefixed messages, each answered in order
+class FramedClient(object) :
+
+    def __init__(self, host='localhost', port=SERVER_PORT, timeout=None) :
+        self.socket = create_connection((host, port), timeout)
+
+        ## Send small messages at once, rather than wait to fill a segment
+        self.socket.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
+        self.inbound = bytearray()
+        self.replies = []
+
+    def __enter__(self) :
+        return self
+
+    def __exit__(self, *exc_info) :
+        self.close()
+
+    def close(self) :
+        self.socket.close()
+
+    ## Send messages (str or bytes) without waiting for their replies
+    def send(self, *messages) :
+        self.socket.sendall(b''.join(frame(message) for message in messages))
+
+    ## Wait for the next reply, as bytes
+    def receive(self) :
+        while not self.replies :
+            data = self.socket.recv(RECEIVE_SIZE)
+            if not data :
+                raise ConnectionError("server closed the connection")
+            self.inbound += data
+            self.replies.extend(reversed(unframe(self.inbound)))
+        return self.replies.pop()
+
+    ## Send one message, and wait for its reply
+    def request(self, message) :
+        self.send(message)
+        return self.receive()
+
+    ## Send many messages before reading any reply (pipelining), in
+    ## batches of about ``window`` bytes so that neither side's buffers
+    ## fill up; returns the replies, in order
+    def pipeline(self, messages, window=RECEIVE_SIZE) :
+        replies = []
+        batch, size = [], 0
+        inFlight = 0
+        for message in messages :
+            if isinstance(message, str) :
+                message = message.encode()
+            batch.append(message)
+            size = size + FRAME_HEADER.size + len(message)
+            if size >= window :
+                self.send(*batch)
+
+                ## Read the replies to the previous batch, keeping this one
+                ## in flight
+                for _ in range(inFlight) :
+                    replies.append(self.receive())
+                inFlight = len(batch)
+                batch, size = [], 0
+        self.send(*batch)
+        for _ in range(inFlight + len(batch)) :
+            replies.append(self.receive())
+        return replies
+
+## Pool of FramedClient connections to one server, shared between threads:
+## each request takes an idle connection (or opens one) and gives it back
+## afterwards, so that handshakes are paid once per connection, not per
+## message
+class ConnectionPool(object) :
+
+    def __init__(self, host='localhost', port=SERVER_PORT, size=8,
+                 timeout=None) :
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.idle = queue.LifoQueue(maxsize=size)
+
+    def __enter__(self) :
+        return self
+
+    def __exit__(self, *exc_info) :
+        self.close()
+
+    ## Borrow a connection; one that fails is closed instead of returned
+    @contextlib.contextmanager
+    def connection(self) :
+        try :
+            client = self.idle.get_nowait()
+        except queue.Empty :
+            client = FramedClient(self.host, self.port, self.timeout)
+        try :
+            yield client
+        except BaseException :
+            client.close()
+            raise
+        try :
+            self.idle.put_nowait(client)
+        except queue.Full :
+            client.close()
+
+    def request(self, message) :
+        with self.connection() as client :
+            return client.request(message)
+
+    def pipeline(self, messages, window=RECEIVE_SIZE) :
+        with self.connection() as client :
+            return client.pipeline(messages, window)
+
+    def close(self) :
+        while(True) :
+            try :
+                self.idle.get_nowait().close()
+            except queue.Empty :
+                break
+
+if __name__ == '__main__' :
+
+    parser = argparse.ArgumentParser(
+        description='Framed uppercase echo client: sends each line of input')
+    parser.add_argument('host', nargs='?', default='localhost')
+    parser.add_argument('-p', '--port', type=int, default=SERVER_PORT)
+    args = parser.parse_args()
+
+    ## Pipeline every line, then print the replies
+    with FramedClient(args.host, args.port) as client :
+        lines = [line.rstrip('\n') for line in sys.stdin]
+        for reply in client.pipeline(line.encode() for line in lines) :
+            print("From Server: %s" % reply.decode())
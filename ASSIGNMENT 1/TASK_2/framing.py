@@ -0,0 +1,36 @@
+import struct
+
+## Every framed message is preceded by its length, in bytes
+FRAME_HEADER = struct.Struct('!I')
+
+## Largest message accepted, so that a bad header cannot exhaust memory
+MAX_FRAME = 1 << 30
+
+## Prefix a message with its length
+def frame(message) :
+    if isinstance(message, str) :
+        message = message.encode()
+    if len(message) > MAX_FRAME :
+        raise ValueError("message of %i bytes exceeds %i"
+                         % (len(message), MAX_FRAME))
+    return FRAME_HEADER.pack(len(message)) + message
+
+## Split the complete messages off the front of a buffer (a bytearray),
+## leaving any incomplete one in it
+def unframe(buffer) :
+    messages = []
+    view = memoryview(buffer)
+    start = 0
+    while len(buffer) - start >= FRAME_HEADER.size :
+        length, = FRAME_HEADER.unpack_from(buffer, start)
+        if length > MAX_FRAME :
+            raise ValueError("frame of %i bytes exceeds %i"
+                             % (length, MAX_FRAME))
+        end = start + FRAME_HEADER.size + length
+        if end > len(buffer) :
+            break
+        messages.append(bytes(view[start + FRAME_HEADER.size:end]))
+        start = end
+    view.release()
+    del buffer[:start]
+    return messages
@@ -0,0 +1,274 @@
+import argparse
+import collections
+import errno
+import heapq
+import json
+import os
+import selectors
+import subprocess
+import sys
+import time
+from socket import *
+
+from framing import frame, unframe
+
+## Port of the server, unless told otherwise (as in tcpserver.py)
+SERVER_PORT = 8898
+
+## Most bytes read at once
+RECEIVE_SIZE = 1 << 16
+
+## Seconds to wait for outstanding replies once the load stops
+GRACE = 5.0
+
+## One connection's worth of load: requests fall due on a fixed schedule,
+## and are sent one at a time, so that a slow reply delays the ones after
+## it (and their latency, measured from when they fell due, shows it)
+class Slot(object) :
+
+    def __init__(self, number, message, framed) :
+        self.number = number
+        self.message = message
+        self.framed = framed
+        self.socket = None
+        self.due = collections.deque()
+        self.busy = False
+        self.outbound = b''
+        self.inbound = bytearray()
+
+## Nearest-rank percentile of sorted values
+def percentile(values, q) :
+    if not values :
+        return None
+    return values[min(len(values) - 1, max(0, int(q * len(values) + 0.5) - 1))]
+
+## Put ``connections`` clients' worth of load on a server for ``duration``
+## seconds, at ``rate`` requests per second in all (or, if zero, each
+## client sending its next request as soon as it has a reply). The
+## one-shot protocol of sentenceLower opens a connection per request; the
+## framed protocol keeps one open per client. Returns a summary as a dict,
+## with latencies in milliseconds
+def runLoad(host='localhost', port=SERVER_PORT, connections=100, rate=0.0,
+            duration=5.0, size=32, framed=False) :
+
+    message = ('x' * size).encode()
+    selector = selectors.DefaultSelector()
+    slots = [Slot(number, message, framed) for number in range(connections)]
+    latencies = []
+    errors = 0
+
+    ## Schedule: every client's next request, in order of when it falls due
+    start = time.perf_counter()
+    end = start + duration
+    if rate > 0 :
+        period = connections / rate
+        arrivals = [(start + number / rate, number)
+                    for number in range(connections)]
+    else :
+        period = None
+        arrivals = []
+        for slot in slots :
+            slot.due.append(start)
+
+    def begin(slot) :
+        slot.busy = True
+        slot.inbound = bytearray()
+        slot.outbound = frame(slot.message) if slot.framed else slot.message
+        if slot.socket is None :
+            slot.socket = socket(AF_INET, SOCK_STREAM)
+            slot.socket.setblocking(False)
+            slot.socket.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
+            result = slot.socket.connect_ex((host, port))
+            if result not in (0, errno.EINPROGRESS) :
+                raise OSError(result, 'connect failed')
+            selector.register(slot.socket, selectors.EVENT_WRITE, slot)
+        else :
+            selector.modify(slot.socket, selectors.EVENT_WRITE, slot)
+
+    def hangUp(slot) :
+        if slot.socket is not None :
+            if slot.socket in selector.get_map() :
+                selector.unregister(slot.socket)
+            slot.socket.close()
+            slot.socket = None
+
+    def finish(slot, now, failed=False) :
+        nonlocal errors
+        if not slot.busy :
+            hangUp(slot)  # e.g. the server closed an idle connection
+            return
+        due = slot.due.popleft()
+        if failed :
+            errors = errors + 1
+        else :
+            latencies.append(1000 * (now - due))
+        slot.busy = False
+        if failed or not slot.framed :
+            hangUp(slot)
+        if period is None and now < end :
+            slot.due.append(now)
+
+    def advance(slot, events, now) :
+        if events & selectors.EVENT_WRITE :
+            sent = slot.socket.send(slot.outbound)
+            slot.outbound = slot.outbound[sent:]
+            if not slot.outbound :
+                selector.modify(slot.socket, selectors.EVENT_READ, slot)
+            return
+        data = slot.socket.recv(RECEIVE_SIZE)
+        if slot.framed :
+            if not data :
+                raise ConnectionError('server closed the connection')
+            slot.inbound += data
+            if unframe(slot.inbound) :
+                finish(slot, now)
+        elif data :
+            slot.inbound += data
+        else :
+            finish(slot, now)  # the server closes once it has replied
+
+    while(True) :
+        now = time.perf_counter()
+
+        ## Requests falling due, while the load lasts
+        while arrivals and arrivals[0][0] <= now :
+            due, number = heapq.heappop(arrivals)
+            if due < end :
+                slots[number].due.append(due)
+                heapq.heappush(arrivals, (due + period, number))
+
+        ## Start every request that is due, on clients that are free
+        for slot in slots :
+            if not slot.busy and slot.due and slot.due[0] <= now :
+                try :
+                    begin(slot)
+                except OSError :
+                    finish(slot, now, failed=True)
+
+        outstanding = any(slot.busy or slot.due for slot in slots)
+        if now >= end and not outstanding :
+            break
+        if now >= end + GRACE :
+            for slot in slots :
+                errors = errors + len(slot.due)  # never answered
+            break
+
+        ## Wait for the network, or for the next request to fall due
+        timeout = end + GRACE - now
+        if arrivals :
+            timeout = min(timeout, max(0.0, arrivals[0][0] - now))
+        for key, events in selector.select(timeout) :
+            try :
+                advance(key.data, events, time.perf_counter())
+            except (BlockingIOError, InterruptedError) :
+                pass
+            except OSError :
+                finish(key.data, time.perf_counter(), failed=True)
+
+    elapsed = min(time.perf_counter(), end) - start
+    for slot in slots :
+        if slot.socket is not None :
+            slot.socket.close()
+    selector.close()
+
+    latencies.sort()
+    return {
+        'connections': connections,
+        'rate': rate,
+        'framed': framed,
+        'completed': len(latencies),
+        'errors': errors,
+        'seconds': elapsed,
+        'throughput': len(latencies) / elapsed,
+        'p50': percentile(latencies, 0.5),
+        'p99': percentile(latencies, 0.99),
+        'p999': percentile(latencies, 0.999),
+        'max': latencies[-1] if latencies else None,
+    }
+
+## Start tcpserver.py in the given mode (e.g. 'thread', 'event' or
+## 'event:4' for four SO_REUSEPORT workers), and wait for it to listen.
+## Returns the server process and its port (chosen by the system, if 0)
+def startServer(mode, port, framed=False, backlog=1024) :
+    mode, _, workers = mode.partition(':')
+    command = [sys.executable, 'tcpserver.py', '-q', '-p', str(port),
+               '-m', mode, '-b', str(backlog), '-n', workers or '1']
+    if framed :
+        command.append('-f')
+    server = subprocess.Popen(command,
+                              cwd=os.path.dirname(os.path.abspath(__file__)),
+                              stdout=subprocess.PIPE, universal_newlines=True)
+
+    ## The server announces the port it bound, as its socket reports it
+    for line in server.stdout :
+        if line.startswith('Server beginning on port ') :
+            port = int(line.split()[4].rstrip('.'))
+            break
+    else :
+        server.wait()
+        raise RuntimeError("server mode %r did not start" % mode)
+
+    ## It listens on every IPv4 interface: probe the loopback one, which
+    ## 'localhost' may not resolve to (e.g. it may be IPv6 first)
+    deadline = time.monotonic() + 10
+    while(True) :
+        try :
+            create_connection(('127.0.0.1', port), 1).close()
+            return server, port
+        except OSError :
+            if server.poll() is not None or time.monotonic() > deadline :
+                server.kill()
+                raise RuntimeError("server mode %r did not start" % mode)
+            time.sleep(0.05)
+
+## Print a summary, one line per run
+def report(label, result) :
+    print("%-10s %6i conns %9.0f req/s  p50 %8.3fms  p99 %8.3fms"
+          "  p999 %8.3fms  errors %i" % (
+              label, result['connections'], result['throughput'],
+              result['p50'] or 0, result['p99'] or 0, result['p999'] or 0,
+              result['errors']))
+
+if __name__ == '__main__' :
+
+    parser = argparse.ArgumentParser(
+        description='Load generator for the uppercase echo server')
+    parser.add_argument('host', nargs='?', default='localhost')
+    parser.add_argument('-p', '--port', type=int, default=SERVER_PORT)
+    parser.add_argument('-c', '--connections', type=int, default=100,
+                        help='concurrent clients')
+    parser.add_argument('-r', '--rate', type=float, default=0.0,
+                        help='requests per second in all'
+                             ' (default: as fast as replies come)')
+    parser.add_argument('-d', '--duration', type=float, default=5.0,
+                        help='seconds of load')
+    parser.add_argument('-s', '--size', type=int, default=32,
+                        help='bytes per message')
+    parser.add_argument('-f', '--framed', action='store_true',
+                        help='persistent, length-prefixed connections'
+                             ' (tcpserver.py --framed)')
+    parser.add_argument('--compare', nargs='+', metavar='MODE',
+                        help='start tcpserver.py locally in each mode'
+                             ' (thread, event, event:N) in turn')
+    parser.add_argument('--json', action='store_true',
+                        help='print results as JSON')
+    args = parser.parse_args()
+
+    results = {}
+    for mode in args.compare or [None] :
+        server, host, port = None, args.host, args.port
+        if mode is not None :
+            server, port = startServer(mode, args.port, args.framed)
+            host = '127.0.0.1'
+        try :
+            results[mode or args.host] = runLoad(
+                host, port, args.connections, args.rate,
+                args.duration, args.size, args.framed)
+        finally :
+            if server is not None :
+                server.terminate()
+                server.wait()
+        if not args.json :
+            report(mode or args.host, results[mode or args.host])
+    if args.json :
+        print(json.dumps(results, indent=2))
@@ -1,28 +1,78 @@
-from socket import *
+import argparse
+import multiprocessing
+import selectors
+import signal
+import sys
 import threading
+from socket import *
 
-## Create method to send capitalized, formatted message back to client on particular socket
-def sentenceLower(connectionSocket, clientNumber) :
+from framing import frame, unframe
 
-    ## Recieve data from client
-    sentence = connectionSocket.recv(1024).decode()
+## Port the server listens on, unless told otherwise
+SERVER_PORT = 8898
+
+## Longest queue of connections waiting to be accepted
+DEFAULT_BACKLOG = 128
+
+## Most bytes read at once from a framed connection
+RECEIVE_SIZE = 1 << 16
+
+## Replies held back before a framed connection stops reading requests
+HIGH_WATER = 1 << 20
+
+## Format the reply to a client's sentence
+def capitalize(sentence, clientNumber) :
 
     ## Change data to uppercase
     capitalizedSentence = sentence.upper()
 
+    ## Format the intended message to the client
+    message = ("Hi Client %i!\nHere is your message, capitalized: %s\n"
+               % (clientNumber, capitalizedSentence))
+    return capitalizedSentence, message
+
+## Create method to send capitalized, formatted message back to client
+## on particular socket
+def sentenceLower(connectionSocket, clientNumber, log=print) :
+
+    ## Recieve data from client
+    sentence = connectionSocket.recv(1024).decode()
+    capitalizedSentence, message = capitalize(sentence, clientNumber)
+
     ## Note to server, what interaction has been
-    print "Client %i: %s ----> %s" % (clientNumber, sentence, capitalizedSentence)
+    log("Client %i: %s ----> %s"
+        % (clientNumber, sentence, capitalizedSentence))
 
-    ## Format and send the intended message to the same client
-    message = "Hi Client %i!\nHere is your message, capitalized: %s\n" % (clientNumber, capitalizedSentence)
+    ## Send the intended message to the same client
     connectionSocket.send(message.encode())
     connectionSocket.close()
 
-    ## Increment the number of clients
-    clientNumber = clientNumber + 1
+## Reply to every complete message in the buffer, as one string of frames
+def framedReplies(inbound, clientNumber, log=print) :
+    replies = []
+    for message in unframe(inbound) :
+        sentence = message.decode()
+        capitalizedSentence, reply = capitalize(sentence, clientNumber)
+        log("Client %i: %s ----> %s"
+            % (clientNumber, sentence, capitalizedSentence))
+        replies.append(frame(reply))
+    return b''.join(replies)
+
+## Framed version of sentenceLower: length-prefixed messages, answered in
+## order, over one connection kept open until the client closes it
+def framedSession(connectionSocket, clientNumber, log=print) :
+    inbound = bytearray()
+    with connectionSocket :
+        while(True) :
+            data = connectionSocket.recv(RECEIVE_SIZE)
+            if not data :
+                break
+            inbound += data
+            connectionSocket.sendall(
+                framedReplies(inbound, clientNumber, log))
 
 ## Create method to deal with thread handling of multiple clients
-def threadGenerator() :
+def threadGenerator(serverSocket, log=print, handler=sentenceLower) :
 
     clientNumber = 1
 
@@ -31,27 +81,227 @@ def threadGenerator() :
         connectionSocket, addr = serverSocket.accept()
 
         ## Create and begin new thread for every client connected
-        thread = threading.Thread(target=sentenceLower, args=(connectionSocket, clientNumber))
-        print "Client %i connected!" % clientNumber
+        thread = threading.Thread(
+            target=handler, args=(connectionSocket, clientNumber, log))
+        log("Client %i connected!" % clientNumber)
         thread.start()
 
         ## Increment number of clients
         clientNumber = clientNumber + 1
 
-## Begin server on arbitrary port number
-serverPort = 8898
+## State of one client of the event loop: the protocol of sentenceLower,
+## one sentence in and one message out, without blocking on either
+class Connection(object) :
+
+    def __init__(self, connectionSocket, clientNumber, log=print) :
+        self.socket = connectionSocket
+        self.clientNumber = clientNumber
+        self.log = log
+        self.outbound = b''
+
+    ## Handle a sentence; returns the events to wait for next (0 to close)
+    def readable(self) :
+        data = self.socket.recv(1024)
+        if not data :
+            return 0
+        sentence = data.decode()
+        capitalizedSentence, message = capitalize(sentence, self.clientNumber)
+        self.log("Client %i: %s ----> %s"
+                 % (self.clientNumber, sentence, capitalizedSentence))
+        self.outbound = message.encode()
+        return selectors.EVENT_WRITE
+
+    ## Send what the socket will take; close once the message is out
+    def writable(self) :
+        sent = self.socket.send(self.outbound)
+        self.outbound = self.outbound[sent:]
+        return selectors.EVENT_WRITE if self.outbound else 0
+
+## Event-loop version of framedSession: any number of requests may arrive
+## (pipelined) before their replies are sent
+class FramedConnection(Connection) :
+
+    def __init__(self, connectionSocket, clientNumber, log=print) :
+        super().__init__(connectionSocket, clientNumber, log)
+        self.inbound = bytearray()
+        self.outbound = bytearray()
+        self.closing = False
+
+    def readable(self) :
+        data = self.socket.recv(RECEIVE_SIZE)
+        if not data :
+            ## The client is done: finish sending replies, then close
+            self.closing = True
+        else :
+            self.inbound += data
+            self.outbound += framedReplies(self.inbound, self.clientNumber,
+                                           self.log)
+
+        ## Send at once if the socket will take it, rather than wait a turn
+        ## of the loop
+        return self.writable()
+
+    def writable(self) :
+        if self.outbound :
+            try :
+                sent = self.socket.send(self.outbound)
+            except BlockingIOError :
+                sent = 0
+            del self.outbound[:sent]
+        if self.closing :
+            return selectors.EVENT_WRITE if self.outbound else 0
+        if not self.outbound :
+            return selectors.EVENT_READ
+
+        ## Stop taking requests while the client is not taking replies
+        if len(self.outbound) > HIGH_WATER :
+            return selectors.EVENT_WRITE
+        return selectors.EVENT_READ | selectors.EVENT_WRITE
+
+## Serve every client from a single thread, waiting on all sockets at once
+## with a selector, instead of one (blocking) thread per client
+def eventLoop(serverSocket, log=print, connection=Connection,
+              firstClient=1, step=1) :
+
+    selector = selectors.DefaultSelector()
+    serverSocket.setblocking(False)
+    selector.register(serverSocket, selectors.EVENT_READ)
+    clientNumber = firstClient
+
+    while(True) :
+        for key, events in selector.select() :
+
+            ## Accept every connection waiting in the backlog
+            if key.fileobj is serverSocket :
+                while(True) :
+                    try :
+                        connectionSocket, addr = serverSocket.accept()
+                    except (BlockingIOError, InterruptedError) :
+                        break
+                    connectionSocket.setblocking(False)
+                    log("Client %i connected!" % clientNumber)
+                    selector.register(
+                        connectionSocket, selectors.EVENT_READ,
+                        connection(connectionSocket, clientNumber, log))
+                    clientNumber = clientNumber + step
+                continue
+
+            ## Move the client's conversation on, as far as it will go
+            client = key.data
+            try :
+                if events & selectors.EVENT_READ :
+                    wanted = client.readable()
+                else :
+                    wanted = client.writable()
+            except (BlockingIOError, InterruptedError) :
+                continue
+            except (OSError, ValueError) :
+                wanted = 0  # e.g. reset by the client, or not UTF-8
+            if wanted :
+                if wanted != key.events :
+                    selector.modify(key.fileobj, wanted, client)
+            else :
+                selector.unregister(key.fileobj)
+                key.fileobj.close()
 
 ## Create socket object, and bind it to listen to the port
-serverSocket = socket(AF_INET, SOCK_STREAM)
-serverSocket.bind(('', serverPort))
-serverSocket.listen(1)
+def listeningSocket(port=SERVER_PORT, backlog=DEFAULT_BACKLOG,
+                    reusePort=False) :
+    serverSocket = socket(AF_INET, SOCK_STREAM)
+    serverSocket.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+    if reusePort :
+        ## Let several processes listen on the port: the kernel spreads
+        ## incoming connections between them
+        serverSocket.setsockopt(SOL_SOCKET, SO_REUSEPORT, 1)
+    serverSocket.bind(('', port))
+    serverSocket.listen(backlog)
+    return serverSocket
+
+## Event loop of one of several processes sharing the port
+def eventWorker(port, backlog, log, worker, workers, connection=Connection) :
+    serverSocket = listeningSocket(port, backlog, reusePort=True)
+
+    ## Number clients so that no two workers give out the same number
+    eventLoop(serverSocket, log=log, connection=connection,
+              firstClient=worker + 1, step=workers)
+
+## Run an event loop on each of several processes, to use every core
+def reusePortServer(port=SERVER_PORT, backlog=DEFAULT_BACKLOG, workers=None,
+                    log=print, connection=Connection) :
+    if workers is None :
+        workers = multiprocessing.cpu_count()
+    processes = [
+        multiprocessing.Process(
+            target=eventWorker,
+            args=(port, backlog, log, worker, workers, connection))
+        for worker in range(workers)]
+
+    ## Take the workers down with the server, however it is stopped
+    signal.signal(signal.SIGTERM, lambda signum, frame : sys.exit())
+    try :
+        for process in processes :
+            process.start()
+        for process in processes :
+            process.join()
+    finally :
+        for process in processes :
+            if process.is_alive() :
+                process.terminate()
+
+## Discard the server's notes (e.g. when measuring its performance)
+def quiet(*args) :
+    pass
+
+if __name__ == '__main__' :
+
+    parser = argparse.ArgumentParser(description='Uppercase echo server')
+    parser.add_argument('-p', '--port', type=int, default=SERVER_PORT,
+                        help='port to listen on')
+    parser.add_argument('-b', '--backlog', type=int, default=DEFAULT_BACKLOG,
+                        help='connections queued before being accepted')
+    parser.add_argument('-m', '--mode', choices=['thread', 'event'],
+                        default='thread',
+                        help='a thread per client, or a single event loop')
+    parser.add_argument('-n', '--workers', type=int, default=1,
+                        help='event-loop processes sharing the port'
+                             ' (SO_REUSEPORT)')
+    parser.add_argument('-f', '--framed', action='store_true',
+                        help='length-prefixed messages over persistent'
+                             ' connections')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='do not note each client')
+    args = parser.parse_args()
+    if args.workers > 1 and args.mode != 'event' :
+        parser.error('--workers requires --mode event')
+    if args.workers > 1 and 'SO_REUSEPORT' not in globals() :
+        parser.error('SO_REUSEPORT is not supported on this platform')
+    if args.workers > 1 and args.port == 0 :
+        parser.error('--workers requires a port to share (not 0)')
+    log = quiet if args.quiet else print
+    handler, connection = sentenceLower, Connection
+    if args.framed :
+        handler, connection = framedSession, FramedConnection
 
+    ## Bind before announcing the port, which the system chooses if 0
+    port = args.port
+    if args.workers == 1 :
+        serverSocket = listeningSocket(args.port, args.backlog)
+        port = serverSocket.getsockname()[1]
 
-## Print intro lines
-print('==================================')
-print('Server beginning on port 8898...')
-print('The system is ready to begin! ')
-print('==================================')
+    ## Print intro lines (at once, should the output be a pipe)
+    print('==================================')
+    print('Server beginning on port %i...' % port)
+    print('The system is ready to begin! ')
+    print('==================================', flush=True)
 
-## Call threading method
-threadGenerator()
+    try :
+        if args.workers > 1 :
+            reusePortServer(args.port, args.backlog, args.workers, log=log,
+                            connection=connection)
+        elif args.mode == 'event' :
+            eventLoop(serverSocket, log=log, connection=connection)
+        else :
+            ## Call threading method
+            threadGenerator(serverSocket, log=log, handler=handler)
+    except KeyboardInterrupt :
+        pass
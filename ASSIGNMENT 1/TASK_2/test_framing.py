@@ -0,0 +1,119 @@
+import random
+import threading
+from socket import *
+
+import pytest
+
+from echoclient import ConnectionPool, FramedClient
+from framing import FRAME_HEADER, MAX_FRAME, frame, unframe
+from tcpserver import (FramedConnection, eventLoop, framedSession,
+                       listeningSocket, quiet, threadGenerator)
+
+MESSAGES = [b'', b'a', 'café', b'x' * 1000, bytes(range(256)) * 300]
+
+## The server's protocol is text (UTF-8)
+SENTENCES = ['', 'a', 'café', 'x' * 1000, 'many words ' * 10000]
+
+## Reply framedSession gives to a message from client 1
+def expected(message) :
+    return ("Hi Client 1!\nHere is your message, capitalized: %s\n"
+            % message.upper()).encode()
+
+## Random chunks of a byte string, of 1 to ``largest`` bytes
+def chunks(data, rng, largest) :
+    start = 0
+    while start < len(data) :
+        end = start + rng.randint(1, largest)
+        yield data[start:end]
+        start = end
+
+@pytest.mark.parametrize('largest', [1, 3, 7, 4096])
+def test_round_trip_across_partial_reads(largest) :
+    rng = random.Random(largest)
+    encoded = [m.encode() if isinstance(m, str) else m for m in MESSAGES]
+    stream = b''.join(frame(message) for message in MESSAGES)
+    buffer = bytearray()
+    received = []
+    for chunk in chunks(stream, rng, largest) :
+        buffer += chunk
+        received.extend(unframe(buffer))
+        assert len(buffer) < FRAME_HEADER.size + max(map(len, encoded))
+    assert received == encoded
+    assert not buffer
+
+def test_incomplete_frames_stay_in_the_buffer() :
+    buffer = bytearray(frame(b'whole') + frame(b'partial')[:-1])
+    assert unframe(buffer) == [b'whole']
+    assert buffer == frame(b'partial')[:-1]
+
+def test_oversized_frames_are_refused() :
+    with pytest.raises(ValueError) :
+        unframe(bytearray(FRAME_HEADER.pack(MAX_FRAME + 1)))
+
+def test_session_across_partial_sends() :
+    rng = random.Random(0)
+    serverSide, clientSide = socketpair()
+    thread = threading.Thread(target=framedSession,
+                              args=(serverSide, 1, quiet))
+    thread.start()
+    messages = ['message %i' % k for k in range(200)]
+    with clientSide :
+        clientSide.settimeout(5)
+        for chunk in chunks(b''.join(map(frame, messages)), rng, 5) :
+            clientSide.sendall(chunk)
+        clientSide.shutdown(SHUT_WR)
+
+        inbound = bytearray()
+        replies = []
+        while(True) :
+            data = clientSide.recv(rng.randint(1, 64))
+            if not data :
+                break
+            inbound += data
+            replies.extend(unframe(inbound))
+    thread.join(5)
+    assert replies == [expected(message) for message in messages]
+    assert not inbound
+
+## A framed server on an ephemeral port, in a daemon thread
+@pytest.fixture(params=['thread', 'event'])
+def server(request) :
+    serverSocket = listeningSocket(0)
+    if request.param == 'thread' :
+        loop, options = threadGenerator, dict(handler=framedSession)
+    else :
+        loop, options = eventLoop, dict(connection=FramedConnection)
+    threading.Thread(target=loop, args=(serverSocket,),
+                     kwargs=dict(log=quiet, **options), daemon=True).start()
+    return '127.0.0.1', serverSocket.getsockname()[1]
+
+def test_requests_share_a_connection(server) :
+    with FramedClient(*server, timeout=5) as client :
+        for message in SENTENCES :
+            assert client.request(message) == expected(message)
+
+def test_pipelined_replies_come_in_order(server) :
+    messages = ['m%i' % k for k in range(5000)]
+    with FramedClient(*server, timeout=5) as client :
+        replies = client.pipeline(messages, window=4096)
+    assert replies == [expected(message) for message in messages]
+
+def test_pool_reuses_connections_across_threads(server) :
+    failures = []
+
+    def client(k) :
+        for n in range(20) :
+            message = 'thread %i request %i' % (k, n)
+            reply = pool.request(message)
+            if not reply.endswith(message.upper().encode() + b'\n') :
+                failures.append(reply)
+
+    with ConnectionPool(*server, size=4, timeout=5) as pool :
+        threads = [threading.Thread(target=client, args=(k,))
+                   for k in range(8)]
+        for thread in threads :
+            thread.start()
+        for thread in threads :
+            thread.join()
+        assert 0 < pool.idle.qsize() <= 4
+    assert not failures
@@ -0,0 +1,57 @@
+import threading
+
+import pytest
+
+from loadgen import percentile, runLoad, startServer
+from tcpserver import (Connection, FramedConnection, eventLoop,
+                       listeningSocket, quiet)
+
+def test_percentile_takes_the_nearest_rank() :
+    values = list(range(1, 101))
+    assert percentile(values, 0.5) == 50
+    assert percentile(values, 0.99) == 99
+    assert percentile(values, 1.0) == 100
+    assert percentile([7], 0.999) == 7
+    assert percentile([], 0.5) is None
+
+## An event-loop server on an ephemeral port, in a daemon thread
+def serve(connection) :
+    serverSocket = listeningSocket(0)
+    threading.Thread(target=eventLoop, args=(serverSocket,),
+                     kwargs=dict(log=quiet, connection=connection),
+                     daemon=True).start()
+    return serverSocket.getsockname()[1]
+
+@pytest.mark.parametrize('framed', [False, True])
+@pytest.mark.parametrize('rate', [0.0, 200.0])
+def test_load_is_answered(framed, rate) :
+    port = serve(FramedConnection if framed else Connection)
+    result = runLoad('127.0.0.1', port, connections=10, rate=rate,
+                     duration=0.3, framed=framed)
+    assert result['errors'] == 0
+    assert result['completed'] > 0
+    if rate :
+        assert result['completed'] <= rate * 0.3 + 10
+    assert 0 <= result['p50'] <= result['p99'] <= result['max']
+
+def test_unreachable_server_counts_errors() :
+    serverSocket = listeningSocket(0)
+    port = serverSocket.getsockname()[1]
+    serverSocket.close()
+    result = runLoad('127.0.0.1', port, connections=2, rate=20.0,
+                     duration=0.2)
+    assert result['completed'] == 0
+    assert result['errors'] > 0
+
+@pytest.mark.parametrize('mode', ['thread', 'event'])
+def test_started_server_reports_its_port(mode) :
+    server, port = startServer(mode, 0, framed=True)
+    try :
+        assert port > 0
+        result = runLoad('127.0.0.1', port, connections=4, duration=0.2,
+                         framed=True)
+        assert result['errors'] == 0 and result['completed'] > 0
+    finally :
+        server.terminate()
+        server.wait()
+        server.stdout.close()
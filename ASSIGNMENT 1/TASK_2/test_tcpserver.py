@@ -0,0 +1,66 @@
+import struct
+import threading
+from socket import *
+
+import pytest
+
+from tcpserver import (Connection, eventLoop, listeningSocket, quiet,
+                       sentenceLower, threadGenerator)
+
+## Run a server on an ephemeral port, in a daemon thread, and return the
+## address clients connect to
+def serve(loop, **options) :
+    serverSocket = listeningSocket(0)
+    thread = threading.Thread(target=loop, args=(serverSocket,),
+                              kwargs=dict(log=quiet, **options), daemon=True)
+    thread.start()
+    return '127.0.0.1', serverSocket.getsockname()[1]
+
+## Send a sentence, and read the reply until the server closes
+def ask(address, sentence) :
+    with create_connection(address, 5) as clientSocket :
+        clientSocket.sendall(sentence.encode())
+        reply = b''
+        while(True) :
+            data = clientSocket.recv(1024)
+            if not data :
+                return reply.decode()
+            reply += data
+
+@pytest.fixture(params=['thread', 'event'])
+def server(request) :
+    if request.param == 'thread' :
+        return serve(threadGenerator, handler=sentenceLower)
+    return serve(eventLoop, connection=Connection)
+
+def test_one_client(server) :
+    assert ask(server, 'hello') == (
+        "Hi Client 1!\nHere is your message, capitalized: HELLO\n")
+
+def test_concurrent_clients_are_numbered(server) :
+    replies = [None] * 20
+
+    def client(k) :
+        replies[k] = ask(server, 'sentence %i' % k)
+
+    threads = [threading.Thread(target=client, args=(k,)) for k in range(20)]
+    for thread in threads :
+        thread.start()
+    for thread in threads :
+        thread.join()
+
+    numbers = set()
+    for k, reply in enumerate(replies) :
+        greeting, message = reply.split('\n', 1)
+        assert message == (
+            "Here is your message, capitalized: SENTENCE %i\n" % k)
+        numbers.add(int(greeting[len('Hi Client '):-1]))
+    assert numbers == set(range(1, 21))
+
+def test_event_loop_outlives_clients_that_reset() :
+    address = serve(eventLoop, connection=Connection)
+    clientSocket = create_connection(address, 5)
+    clientSocket.setsockopt(SOL_SOCKET, SO_LINGER, struct.pack('ii', 1, 0))
+    clientSocket.close()  # reset, without a sentence
+    assert ask(address, 'still there').endswith(
+        "\nHere is your message, capitalized: STILL THERE\n")
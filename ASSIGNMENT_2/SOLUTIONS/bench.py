@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+import argparse
+import collections
+import functools
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import timeit
+
+import networkx
+from bitarray import bitarray
+
+from checksum import internet_checksum
+from crc import crc, crc_batch, crc_bytes
+from csr import CSRGraph
+from ping import BUFFER_SIZE, RIGHT_HEXTET, EchoRequestBuilder, ping
+from routing import (dijkstra_generalized, dijkstra_predecessor_and_distance,
+                     predecessor_to_forwarding)
+from transport import LoopbackTransport
+
+try:
+    import numpy
+except ImportError:  # recorded as such in the results
+    numpy = None
+
+# Numbers of nodes of the generated topologies
+SIZES = (100, 1000, 10000, 100000)
+
+# Payload sizes (bytes): an echo request, a frame, a jumbo frame, etc.
+PAYLOAD_SIZES = (64, 1500, 9000, 1 << 16, 1 << 20)
+
+# CRC-32 (IEEE 802.3)
+CRC32 = 0x104C11DB7
+
+# Bytes of frames checked per call of crc_batch
+BATCH_BYTES = 1 << 20
+
+# Topology generators, by name: graphs of about 3 links per node
+GENERATORS = {
+    'gnm': lambda n, seed: networkx.gnm_random_graph(n, 3 * n, seed=seed),
+    'barabasi_albert': lambda n, seed: networkx.barabasi_albert_graph(
+        n, 3, seed=seed),
+    'watts_strogatz': lambda n, seed: networkx.connected_watts_strogatz_graph(
+        n, 6, 0.1, seed=seed),
+}
+
+# Parameters of dijkstra_generalized for the widest path problem
+WIDEST = dict(infinity=0, plus=min, less=lambda x, y: x > y, min=max,
+              sourcedist=math.inf)
+
+# Options recorded with the results that change what is measured: a
+# baseline run with other values is not comparable
+SETTINGS = ('seed', 'generator')
+
+# A function to time, and what it is timed on
+Benchmark = collections.namedtuple('Benchmark', ['name', 'params', 'function'])
+
+
+def benchmark_id(name, params):
+    """
+    Key of a benchmark in results and baselines, e.g. 'crc[bytes=1500]'.
+    """
+    return '{}[{}]'.format(name, ','.join(
+        '{}={}'.format(key, params[key]) for key in sorted(params)))
+
+
+def topology(generator, n, seed):
+    """
+    Generated graph with random integer link costs (1 to 20).
+    """
+    graph = GENERATORS[generator](n, seed)
+    rng = random.Random(seed)
+    for u, v in graph.edges():
+        graph[u][v]['cost'] = rng.randint(1, 20)
+    return graph
+
+
+def _routing_suite(params):
+    """
+    Routing benchmarks of one topology, as ``(name, params, setup)``:
+    ``setup(graphs, source)`` returns the function to time, given the
+    topology by representation ('networkx' or 'csr'), so that it need
+    only be generated if one of them is selected.
+    """
+    def on(graph, function, **options):
+        return lambda graphs, source: functools.partial(
+            function, graphs[graph], source, **options)
+
+    def forwarding(graphs, source):
+        P, _ = dijkstra_predecessor_and_distance(graphs['csr'], source)
+        return functools.partial(predecessor_to_forwarding, P, source)
+
+    suite = []
+    for name in ('networkx', 'csr'):
+        suite.append(('dijkstra_predecessor_and_distance',
+                      dict(params, graph=name),
+                      on(name, dijkstra_predecessor_and_distance)))
+        suite.append(('dijkstra_generalized',
+                      dict(params, graph=name, problem='shortest'),
+                      on(name, dijkstra_generalized)))
+        suite.append(('dijkstra_generalized',
+                      dict(params, graph=name, problem='widest'),
+                      on(name, dijkstra_generalized, **WIDEST)))
+    suite.append(('predecessor_to_forwarding', params, forwarding))
+    return suite
+
+
+def routing_benchmarks(sizes, generator='gnm', seed=0, select=None):
+    """
+    Routing functions on topologies of each size, each generated in turn
+    (and only once its predecessor's benchmarks have run). Sizes without
+    benchmarks whose ids contain ``select`` (if given) are not generated.
+    """
+    for n in sizes:
+        suite = [(name, params, setup) for name, params, setup
+                 in _routing_suite({'generator': generator, 'nodes': n})
+                 if select is None or select in benchmark_id(name, params)]
+        if not suite:
+            continue
+        graph = topology(generator, n, seed)
+        graphs = {'networkx': graph, 'csr': CSRGraph.from_graph(graph)}
+        source = next(iter(graph))
+        for name, params, setup in suite:
+            yield Benchmark(name, params, setup(graphs, source))
+
+
+def payload_benchmarks(sizes=PAYLOAD_SIZES, seed=0):
+    """
+    Checksums of random payloads of each size.
+    """
+    rng = random.Random(seed)
+    for size in sizes:
+        data = rng.randbytes(size)
+        bits = bitarray(endian='big')
+        bits.frombytes(data)
+        params = {'bytes': size}
+        yield Benchmark('internet_checksum', params,
+                        functools.partial(internet_checksum, data))
+        yield Benchmark('crc', dict(params, generator='crc32'),
+                        functools.partial(crc, bits, CRC32))
+        yield Benchmark('crc_bytes', dict(params, generator='crc32'),
+                        functools.partial(crc_bytes, data, CRC32))
+        frames = max(1, BATCH_BYTES // size)
+        yield Benchmark('crc_batch',
+                        dict(params, generator='crc32', frames=frames),
+                        functools.partial(crc_batch, [data] * frames, CRC32))
+
+
+def ping_benchmarks():
+    """
+    A ping round trip through LoopbackTransport, which answers in-process:
+    the cost of building, checksumming and parsing the packets.
+    """
+    transport = LoopbackTransport()
+    client_id = os.getpid() & RIGHT_HEXTET
+    builder = EchoRequestBuilder(client_id)
+    buffer = bytearray(BUFFER_SIZE)
+    sequence = itertools.count()
+
+    def round_trip():
+        return ping(transport, '127.0.0.1', client_id,
+                    next(sequence) & RIGHT_HEXTET, builder, buffer)
+
+    yield Benchmark('ping', {'transport': 'loopback'}, round_trip)
+
+
+def measure(function, repeat=5):
+    """
+    Seconds per call of a function: the minimum and median of ``repeat``
+    runs, each of as many calls as take at least 0.2s (see
+    timeit.Timer.autorange, whose own run also serves as a warm-up).
+    """
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    times = [t / number for t in timer.repeat(repeat, number)]
+    return {'min': min(times), 'median': statistics.median(times),
+            'number': number, 'repeat': repeat}
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'networkx': networkx.__version__,
+        'numpy': None if numpy is None else numpy.__version__,
+    }
+
+
+def run(benchmarks, repeat=5, select=None, log=print):
+    """
+    Time each benchmark whose id contains ``select`` (if given): results,
+    as dicts, in order.
+    """
+    results = []
+    for benchmark in benchmarks:
+        key = benchmark_id(benchmark.name, benchmark.params)
+        if select is not None and select not in key:
+            continue
+        result = {'id': key, 'name': benchmark.name,
+                  'params': benchmark.params}
+        result.update(measure(benchmark.function, repeat))
+        results.append(result)
+        log('{:<78} {:>12.6f}ms'.format(key, result['min'] * 1000))
+    return results
+
+
+def compare(results, baseline, threshold=0.25):
+    """
+    Ratios of the minimum times of results to those of a baseline (as
+    written by this script), by id: those above ``1 + threshold`` are
+    regressions. Returns ``(ratios, regressions)``.
+    """
+    previous = {result['id']: result for result in baseline['results']}
+    ratios = {}
+    for result in results:
+        if result['id'] in previous:
+            ratios[result['id']] = (
+                result['min'] / previous[result['id']]['min'])
+    regressions = sorted(key for key, ratio in ratios.items()
+                         if ratio > 1 + threshold)
+    return ratios, regressions
+
+
+def mismatches(document, baseline):
+    """
+    How a baseline's settings (see SETTINGS) and environment differ from
+    those of a run, as two lists of descriptions: ``(settings,
+    environment)``. Settings a baseline does not record count as
+    different.
+    """
+    settings = ['{}: {!r} in the baseline, {!r} now'.format(
+                    key, baseline.get(key, 'not recorded'), document[key])
+                for key in SETTINGS if baseline.get(key) != document[key]]
+    previous = baseline.get('environment', {})
+    current = document['environment']
+    differences = ['{}: {} in the baseline, {} now'.format(
+                       key, previous.get(key), current[key])
+                   for key in sorted(current)
+                   if previous.get(key) != current[key]]
+    return settings, differences
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description='Time the routing, checksum, CRC and ping code paths.')
+    parser.add_argument('-s', '--sizes', type=int, nargs='+', default=SIZES,
+                        help='numbers of nodes of the topologies')
+    parser.add_argument('-g', '--generator', choices=sorted(GENERATORS),
+                        default='gnm')
+    parser.add_argument('--payloads', type=int, nargs='+',
+                        default=PAYLOAD_SIZES, help='payload sizes (bytes)')
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-k', '--select', metavar='text',
+                        help='only benchmarks whose ids contain this text')
+    parser.add_argument('-o', '--output', metavar='path',
+                        help='write the results to this JSON file')
+    parser.add_argument('-b', '--baseline', metavar='path',
+                        help='compare with the results in this JSON file')
+    parser.add_argument('-t', '--threshold', type=float, default=0.25,
+                        help='slowdown reported as a regression'
+                             ' (fraction of the baseline time)')
+    parser.add_argument('-f', '--force', action='store_true',
+                        help='compare with a baseline of other settings')
+    args = parser.parse_args()
+    document = {'created': time.time(), 'environment': environment(),
+                'seed': args.seed, 'generator': args.generator,
+                'sizes': args.sizes, 'payloads': args.payloads}
+
+    # Check the baseline before spending any time on the benchmarks
+    if args.baseline is not None:
+        with open(args.baseline) as stream:
+            baseline = json.load(stream)
+        settings, differences = mismatches(document, baseline)
+        if settings and not args.force:
+            parser.error('baseline {} is not comparable ({}); use --force'
+                         ' to compare anyway'.format(
+                             args.baseline, '; '.join(settings)))
+        for difference in settings + differences:
+            print('warning: {}'.format(difference), file=sys.stderr)
+
+    benchmarks = itertools.chain(
+        routing_benchmarks(args.sizes, args.generator, args.seed,
+                           args.select),
+        payload_benchmarks(args.payloads, args.seed),
+        ping_benchmarks())
+    document['results'] = run(benchmarks, args.repeat, args.select)
+
+    if args.output is not None:
+        with open(args.output, 'w') as stream:
+            json.dump(document, stream, indent=2)
+
+    if args.baseline is not None:
+        ratios, regressions = compare(document['results'], baseline,
+                                      args.threshold)
+        print("\nCompared with {} ({}):".format(
+            args.baseline, baseline['environment']['python']))
+        for key, ratio in ratios.items():
+            print("{:<78} {:>8.2f}x{}".format(
+                key, ratio, '  REGRESSION' if key in regressions else ''))
+        if regressions:
+            print("{} regression(s) over {:.0%}{}".format(
+                len(regressions), args.threshold,
+                ', in another environment' if differences else ''))
+            sys.exit(1)
@@ -1,4 +1,13 @@
 # -*- coding: utf-8 -*-
+import sys
+
+try:
+    import numpy
+except ImportError:  # hextet_sum then runs in pure Python
+    numpy = None
+
+# Inputs from which hextet_sum uses NumPy rather than memoryview.cast
+NUMPY_THRESHOLD = 256
 
 
 def hextet_complement(num):
@@ -16,6 +25,60 @@ def hextet_complement(num):
     return (~num & mask)
 
 
+def checksum_update(checksum, old, new):
+    '''
+    Internet Checksum after part of the data changes, without rescanning
+    the rest: RFC 1624, eqn. 3, i.e. HC' = ~(~HC + ~m + m').
+    ``old`` and ``new`` are the data before and after the change, each
+    either a bytes-like object starting at an even offset in the data, or
+    an int: a single hextet (or the one's complement sum of several, e.g.
+    0 for any run of zero bytes). As the RFC discusses, the result differs
+    from a full recomputation (0x0000 vs 0xffff) only for all-zero data.
+    '''
+    if not isinstance(old, int):
+        old = hextet_sum(old)
+    if not isinstance(new, int):
+        new = hextet_sum(new)
+    total = hextet_complement(checksum) + hextet_complement(old) + new
+    return hextet_complement(_fold(total))
+
+
+def _fold(total):
+    '''
+    Add the carries of a one's complement sum back into the lowest hextet.
+    '''
+    while (total >> 16) > 0:
+        total = (total & 0xffff) + (total >> 16)
+    return total
+
+
+def hextet_sum(data):
+    '''
+    Folded one's complement sum of the (big-endian) hextets of a bytes-like
+    object, padded with a zero byte if its length is odd.
+    The data is summed in place, as native-order hextets: by RFC 1071
+    (section 2.B) this only byte-swaps the folded result.
+    '''
+    try:
+        data = memoryview(data).cast('B')
+    except TypeError:  # e.g. a list of byte values
+        data = memoryview(bytes(data))
+    even = len(data) & ~1
+
+    if numpy is not None and even >= NUMPY_THRESHOLD:
+        words = numpy.frombuffer(data, dtype='>u2', count=even // 2)
+        total = _fold(int(words.sum(dtype=numpy.uint64)))
+    else:
+        total = _fold(sum(data[:even].cast('H')))
+        if sys.byteorder == 'little':
+            total = ((total & 0xff) << 8) | (total >> 8)
+
+    # If number of bytes is odd, the last is padded with a zero byte
+    if even < len(data):
+        total = _fold(total + (data[even] << 8))
+    return total
+
+
 def internet_checksum(data, total=0x0):
     '''
     Internet Checksum of a bytes array.
@@ -24,23 +87,113 @@ def internet_checksum(data, total=0x0):
     2. http://www.netfor2.com/checksum.html
     '''
 
-    # Create temp array to hold/manipulate data from data input
-    temp = []
-    # If number of bytes is odd, append extra zero byte
-    # For every even-numbered element in the array, shift it to the right
-    # by 8 bits, to allow for the final summing
-    for x in range(0, len(data)):
-        if (x % 2 == 0):
-            temp.append(data[x] << 8)
+    # Return the hextet_complement of the sum of the checksum and total
+    return hextet_complement(hextet_sum(data) + total)
+
+
+def _packets(packets, length):
+    '''
+    Bytes of equal-length packets, back to back, and their length; see
+    internet_checksum_batch.
+    '''
+    try:
+        data = memoryview(packets)
+    except TypeError:  # e.g. a list of rows
+        rows = [bytes(row) for row in packets]
+        if length is None and rows:
+            length = len(rows[0])
+        if any(len(row) != length for row in rows):
+            raise ValueError('packets of unequal lengths')
+        data = memoryview(b''.join(rows))
+    if length is None:
+        # One packet per row, or a single packet
+        if data.ndim > 1:
+            length = data.nbytes // data.shape[0] if data.shape[0] else 0
         else:
-            temp.append(data[x])
+            length = data.nbytes
+    if not data.c_contiguous:
+        data = memoryview(data.tobytes())
+    data = data.cast('B')
+    if length <= 0:
+        if len(data):
+            raise ValueError('bad packet length {}'.format(length))
+        return data, 1
+    if len(data) % length:
+        raise ValueError('{} bytes are not a whole number of {}-byte'
+                         ' packets'.format(len(data), length))
+    return data, length
 
-    # Sum all of the elements in the now edited array
-    checksum = sum(temp)
 
-    # take only 16 bits out of the 32 bit sum and add up the carries
-    while (checksum >> 16) > 0:
-        checksum = (checksum & 0xffff) + (checksum >> 16)
+def internet_checksum_batch(packets, length=None):
+    '''
+    Internet Checksums of many packets of equal length, as a list.
+    ``packets`` is either a 2-D array (one packet per row), a sequence of
+    packets, or a bytes-like object holding the packets back to back, each
+    ``length`` bytes long (by default, a single packet). A partial packet
+    at the end raises ValueError.
+    '''
+    data, length = _packets(packets, length)
+    if numpy is None:
+        return [internet_checksum(data[i:i + length])
+                for i in range(0, len(data), length)]
 
-    # Return the hextet_complement of the sum of the checksum and total
-    return hextet_complement(checksum + total)
+    rows = numpy.frombuffer(data, dtype=numpy.uint8).reshape(-1, length)
+
+    # Pad odd-length packets with a zero byte
+    if rows.shape[1] % 2:
+        rows = numpy.pad(rows, ((0, 0), (0, 1)))
+
+    words = rows.view('>u2')
+    totals = words.sum(axis=1, dtype=numpy.uint64)
+    while (totals >> 16).any():
+        totals = (totals & 0xffff) + (totals >> 16)
+    return (~totals & 0xffff).tolist()
+
+
+class InternetChecksum(object):
+    '''
+    Incremental Internet Checksum, in the style of hashlib: feed the data
+    in chunks of any length with update(), then read the checksum from
+    ``value`` (an int) or digest() (two bytes, network order).
+    '''
+
+    def __init__(self, data=None):
+        # Folded sum of the complete hextets seen so far
+        self.total = 0
+        # First byte of an incomplete hextet, if a chunk had odd length
+        self.pending = None
+        if data is not None:
+            self.update(data)
+
+    def update(self, data):
+        data = memoryview(data).cast('B')
+        if not data:
+            return
+
+        # Complete the hextet split across the chunk boundary
+        if self.pending is not None:
+            self.total += (self.pending << 8) | data[0]
+            self.pending = None
+            data = data[1:]
+
+        # Hold back a trailing odd byte for the next chunk
+        if len(data) % 2:
+            self.pending = data[-1]
+            data = data[:-1]
+
+        self.total = _fold(self.total + hextet_sum(data))
+
+    @property
+    def value(self):
+        total = self.total
+        if self.pending is not None:
+            total += self.pending << 8  # i.e. padded with a zero byte
+        return hextet_complement(_fold(total))
+
+    def digest(self):
+        return self.value.to_bytes(2, 'big')
+
+    def copy(self):
+        other = InternetChecksum()
+        other.total, other.pending = self.total, self.pending
+        return other
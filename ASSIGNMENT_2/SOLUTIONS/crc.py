@@ -1,5 +1,16 @@
 # -*- coding: utf-8 -*-
+import functools
+
 from bitarray import bitarray
+from bitarray.util import int2ba
+
+try:
+    import numpy
+except ImportError:  # crc_bytes then runs in pure Python
+    numpy = None
+
+# Inputs from which crc_bytes processes blocks in parallel with NumPy
+NUMPY_THRESHOLD = 1 << 16
 
 
 def xor_at(a, b, offset=0):
@@ -8,28 +19,224 @@ def xor_at(a, b, offset=0):
         a[index] = a[index] ^ bk
 
 
+def generator_polynomial(g):
+    """
+    Generator as ``(poly, width)``: its bits as an int, and the number of
+    check bits (i.e. the degree of the polynomial).
+    """
+    if isinstance(g, int):
+        poly, width = g, g.bit_length() - 1
+    else:
+        poly, width = int(g.to01(), 2), len(g) - 1
+    if width < 1 or not poly >> width:
+        raise ValueError('generator must have a leading 1 and degree >= 1')
+    return poly, width
+
+
+@functools.lru_cache(maxsize=None)
+def crc_table(poly, width):
+    """
+    Lookup table for byte-wise division: entry ``t`` is the remainder of
+    ``t`` shifted left by ``width`` bits.
+    """
+    table = []
+    for t in range(256):
+        r = t << width
+        for i in range(width + 7, width - 1, -1):
+            if r >> i & 1:
+                r ^= poly << (i - width)
+        table.append(r)
+    return tuple(table)
+
+
+@functools.lru_cache(maxsize=None)
+def _shift_table(poly, width, count):
+    """
+    Byte-wise tables for multiplying a remainder by x^(8 * count), mod g.
+    """
+    table = crc_table(poly, width)
+    mask = (1 << width) - 1
+
+    # Remainder of x^(8 * count + k), for every bit k of a remainder
+    r = 1
+    for _ in range(count):
+        c = r << 8
+        r = (c & mask) ^ table[c >> width]
+    basis = []
+    for k in range(width):
+        basis.append(r)
+        r <<= 1
+        if r >> width:
+            r ^= poly
+
+    # Combine the basis for every value of every byte of a remainder
+    tables = []
+    for j in range(0, width, 8):
+        bits = basis[j:j + 8]
+        entries = [0] * 256
+        for v in range(1, 256):
+            low = (v & -v).bit_length() - 1
+            if low < len(bits):
+                entries[v] = entries[v & (v - 1)] ^ bits[low]
+            else:
+                entries[v] = entries[v & (v - 1)]
+        tables.append(entries)
+    return tables
+
+
+def _crc_blocks(data, poly, width, remainder):
+    """
+    crc_bytes, dividing equal-sized blocks side by side with NumPy and
+    then chaining their remainders. Returns the remainder and the number
+    of bytes consumed.
+    """
+    # Square-ish layout: as many blocks as bytes in each block
+    count = 1 << max(8, (len(data).bit_length() - 3) // 2)
+    blocks = len(data) // count
+    columns = numpy.frombuffer(data, dtype=numpy.uint8,
+                               count=blocks * count)
+    columns = columns.reshape(blocks, count).T.astype(numpy.uint64)
+
+    table = numpy.array(crc_table(poly, width), dtype=numpy.uint64)
+    mask = numpy.uint64((1 << width) - 1)
+    shift, eight = numpy.uint64(width), numpy.uint64(8)
+    r = numpy.zeros(blocks, dtype=numpy.uint64)
+    for column in columns:
+        c = (r << eight) | column
+        r = (c & mask) ^ table[c >> shift]
+
+    # Horner's rule: remainder * x^(8 * count) + block, for each block
+    tables = _shift_table(poly, width, count)
+    for block in r.tolist():
+        shifted = block
+        for j, entries in enumerate(tables):
+            shifted ^= entries[remainder >> (8 * j) & 0xff]
+        remainder = shifted
+    return remainder, blocks * count
+
+
+def crc_bytes(data, g, remainder=0):
+    """
+    Table-driven CRC of a bytes-like object, most significant bit first.
+
+    Returns the remainder, as an int, of dividing
+    ``remainder * x^(8 * len(data)) + data`` by the generator ``g`` (an
+    int or a bitarray); with the default ``remainder``, this is the same
+    as crc() on the corresponding bits.
+
+    Only inputs of at least NUMPY_THRESHOLD bytes are divided in parallel:
+    a single frame (64 to 9000 bytes, say) runs byte by byte in Python.
+    To check many frames, use crc_batch, which divides them side by side.
+    """
+    poly, width = generator_polynomial(g)
+    data = memoryview(data).cast('B')
+    start = 0
+    if (numpy is not None and width <= 56
+            and len(data) >= NUMPY_THRESHOLD):
+        remainder, start = _crc_blocks(data, poly, width, remainder)
+
+    table = crc_table(poly, width)
+    mask = (1 << width) - 1
+    for byte in data[start:]:
+        c = (remainder << 8) | byte
+        remainder = (c & mask) ^ table[c >> width]
+    return remainder
+
+
+def crc_batch(frames, g, length=None):
+    """
+    crc_bytes of many frames, as a list. ``frames`` is either a sequence
+    of bytes-like objects (of any lengths) or a bytes-like object holding
+    the frames back to back, each ``length`` bytes long.
+
+    With NumPy, the frames are divided side by side, one byte of every
+    frame per step: shorter frames are padded with leading zero bytes,
+    which leave a remainder of 0 unchanged.
+    """
+    poly, width = generator_polynomial(g)
+    if length is not None:
+        data = memoryview(frames).cast('B')
+        frames = [data[i:i + length] for i in range(0, len(data), length)]
+    if numpy is None or width > 56 or not frames:
+        return [crc_bytes(frame, poly) for frame in frames]
+
+    # One frame per row, aligned to the right; stored by column
+    frames = [memoryview(frame).cast('B') for frame in frames]
+    longest = max(len(frame) for frame in frames)
+    rows = numpy.zeros((len(frames), longest), dtype=numpy.uint8, order='F')
+    for row, frame in zip(rows, frames):
+        if len(frame):
+            row[longest - len(frame):] = numpy.frombuffer(frame,
+                                                          dtype=numpy.uint8)
+
+    table = numpy.array(crc_table(poly, width), dtype=numpy.uint64)
+    mask = numpy.uint64((1 << width) - 1)
+    shift, eight = numpy.uint64(width), numpy.uint64(8)
+    r = numpy.zeros(len(frames), dtype=numpy.uint64)
+    for column in rows.T:
+        c = (r << eight) | column.astype(numpy.uint64)
+        r = (c & mask) ^ table[c >> shift]
+    return r.tolist()
+
+
+def _crc_bits(d, poly, width, remainder=0):
+    """
+    crc_bytes for a bitarray, which need not hold a whole number of bytes.
+    """
+
+    # Bits are taken in index order, whatever the bitarray's endianness
+    full = len(d) - len(d) % 8
+    remainder = crc_bytes(bitarray(d[:full], endian='big').tobytes(), poly,
+                          remainder=remainder)
+    for bit in d[full:]:
+        remainder = (remainder << 1) | bit
+        if remainder >> width:
+            remainder ^= poly
+    return remainder
+
+
 def crc(d, g):
-    # We'd prefer not to modify the argument in xor_at
-    dcopy = d.copy()
-
-    # Generator/data length
-    gLength = len(g)
-    dLength = len(dcopy)
-
-    # Empty bitarray, of generator length
-    gZero = bitarray([0] * gLength)
-
-    # Loop through, and perform necessary edits to data, via xor_at
-    for i in range(0, (dLength - gLength + 1)):
-        # If leading bit is zero, perform xor_at with zeroes bitarray
-        if (dcopy[i] == 0):
-            xor_at(dcopy, gZero, i)
-        # Else perform xor_at with original generator
-        else:
-            xor_at(dcopy, g, i)
+    """
+    Cyclic redundancy check of a bitarray with a given generator.
+
+    Whole bytes are divided by table lookup (see crc_bytes), and only the
+    final, partial byte bit-by-bit.
+    """
+    poly, width = generator_polynomial(g)
 
     # Return the appropriate remainder
-    return dcopy[dLength - gLength + 1: dLength]
+    return int2ba(_crc_bits(d, poly, width), length=width)
+
+
+class CRC(object):
+    """
+    Incremental CRC, in the style of hashlib: feed the message in chunks
+    (bytes-like objects or bitarrays of any length) with update(), then
+    read the remainder from ``value`` (an int), digest() or bits().
+    """
+
+    def __init__(self, generator, data=None):
+        self.poly, self.width = generator_polynomial(generator)
+        self.value = 0
+        if data is not None:
+            self.update(data)
+
+    def update(self, data):
+        if isinstance(data, bitarray):
+            self.value = _crc_bits(data, self.poly, self.width, self.value)
+        else:
+            self.value = crc_bytes(data, self.poly, self.value)
+
+    def digest(self):
+        return self.value.to_bytes((self.width + 7) // 8, 'big')
+
+    def bits(self):
+        return int2ba(self.value, length=self.width)
+
+    def copy(self):
+        other = CRC(self.poly)
+        other.value = self.value
+        return other
 
 
 if __name__ == '__main__':
@@ -49,3 +256,9 @@ if __name__ == '__main__':
     r = crc(d + p, g)               # error-correction bits
     assert r == bitarray('100')     # known quotient
     assert crc(d + r, g) == p       # perform CRC check
+
+    print("Incrementally, from arbitrary chunks:")
+    stream = CRC(g)
+    for chunk in (d[:5], d[5:8], d[8:], r):
+        stream.update(chunk)
+    assert stream.bits() == p       # perform CRC check
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import array
+import collections
+
+
+def _weight_array(costs):
+    """
+    Pack link costs into an array, keeping integer costs as integers.
+    """
+    if all(isinstance(cost, int) for cost in costs):
+        return array.array('q', costs)
+    return array.array('d', costs)
+
+
+class CSRGraph(collections.namedtuple(
+        'CSRGraph',
+        ['labels', 'index', 'offsets', 'neighbours', 'weights', 'weight'])):
+    """
+    Immutable compressed sparse row (CSR) snapshot of a weighted graph.
+
+    Node ``i`` is labelled ``labels[i]`` (``index`` is the inverse map);
+    its neighbours are ``neighbours[offsets[i]:offsets[i + 1]]``, and the
+    corresponding link costs occupy the same slice of ``weights``.
+    An undirected link is stored once in each direction.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_graph(cls, graph, weight='cost'):
+        """
+        Snapshot of a NetworkX graph, keeping only the given link attribute.
+        """
+        labels = tuple(graph.nodes())
+        index = {v: i for i, v in enumerate(labels)}
+        offsets = array.array('q', [0])
+        neighbours = array.array('q')
+        costs = []
+
+        for u in labels:
+            for v, attributes in graph[u].items():
+                neighbours.append(index[v])
+                costs.append(attributes[weight])
+            offsets.append(len(neighbours))
+
+        return cls(labels, index, offsets, neighbours,
+                   _weight_array(costs), weight)
+
+    def nodes(self):
+        return self.labels
+
+    def number_of_nodes(self):
+        return len(self.labels)
+
+    def neighbourhood(self, i):
+        """
+        Neighbour ids and link costs of the node with id ``i``.
+        """
+        start, stop = self.offsets[i], self.offsets[i + 1]
+        return zip(self.neighbours[start:stop], self.weights[start:stop])
@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+import array
+import collections
+import itertools
+import math
+import operator
+import random
+
+from csr import CSRGraph
+
+try:
+    import numpy
+except ImportError:  # DistanceVector then runs in pure Python
+    numpy = None
+
+# Most candidate distances held at once by a vectorised round
+BLOCK_ELEMENTS = 1 << 22
+
+# Summary of one round of updates
+RoundMetrics = collections.namedtuple(
+    'RoundMetrics',
+    ['round', 'updated', 'changed', 'messages', 'unreachable',
+     'counted_to_infinity'])
+
+
+def _ufuncs(plus, less):
+    """
+    NumPy equivalents ``(combine, choose)`` of the semiring of
+    dijkstra_generalized, for the shortest and widest path problems, or
+    None. The callables are often lambdas, so they are recognised by their
+    values rather than their identity.
+    """
+    if numpy is None:
+        return None
+    try:
+        if plus(2, 3) == 5 and plus(7, 0) == 7:
+            combine = numpy.add
+        elif plus(2, 3) == 2 and plus(7, 1) == 1:
+            combine = numpy.minimum
+        else:
+            return None
+        if less(1, 2) and not less(2, 1) and not less(1, 1):
+            choose = numpy.minimum
+        elif less(2, 1) and not less(1, 2) and not less(1, 1):
+            choose = numpy.maximum
+        else:
+            return None
+    except TypeError:
+        return None
+    return combine, choose
+
+
+class DistanceVector(object):
+    """
+    Distance-vector (Bellman-Ford) routing, simulated for every node at
+    once: row ``u`` of the matrix ``D`` is node u's distance vector, and
+    ``H[u][d]`` is the id of its next hop towards d (-1 for none).
+
+    In each round, the nodes updated recompute their vectors from their
+    neighbours' advertised vectors, D(u, d) = min over neighbours v of
+    c(u, v) + D(v, d), in the semiring of dijkstra_generalized (``plus``,
+    ``less``, ``infinity`` and ``sourcedist``; e.g. widest paths, too).
+    As there, a neighbour's own entry is just the link cost c(u, v).
+    For the shortest and widest path problems, when NumPy is available, a
+    round is a vectorised min-plus (or max-min) product of the link costs
+    and the matrix.
+
+    With ``poisoned_reverse``, a node advertises an infinite distance to
+    the neighbour through which it routes. Distances not ``less`` than
+    ``max_metric`` are treated as infinite, as in RIP; for additive costs,
+    it defaults to just over the sum of all link costs, which no loop-free
+    path can exceed, so that counting to infinity is detected and cut
+    short. Widest paths have no such bound: a link that gets narrower or
+    goes down can leave stale routes in a loop.
+
+    Directed graphs are supported: a node's vector depends on those of its
+    successors, so it is its predecessors that hear of its changes. A
+    CSRGraph counts as directed unless every link has a reverse of the
+    same cost.
+    """
+
+    def __init__(self, graph, weight='cost', infinity=math.inf,
+                 plus=operator.add, less=operator.lt, sourcedist=0,
+                 poisoned_reverse=False, max_metric=None, vectorise=True):
+        directed = None
+        if not isinstance(graph, CSRGraph):
+            directed = graph.is_directed()
+            graph = CSRGraph.from_graph(graph, weight=weight)
+        elif weight != graph.weight:
+            raise ValueError('CSRGraph holds {!r}, not {!r}'.format(
+                graph.weight, weight))
+        self.labels = graph.labels
+        self.index = graph.index
+        self.infinity = infinity
+        self.plus = plus
+        self.less = less
+        self.sourcedist = sourcedist
+        self.poisoned_reverse = poisoned_reverse
+        self.ufuncs = _ufuncs(plus, less) if vectorise else None
+        self.integral = graph.weights.typecode == 'q'
+
+        # Links, as a dict of dicts of costs by source (an undirected link
+        # in both directions), and the sources of the links into each node
+        self.links = {}
+        self.inbound = {u: set() for u in range(len(self.labels))}
+        for u in range(len(self.labels)):
+            self.links[u] = {v: cost for v, cost in graph.neighbourhood(u)}
+            for v in self.links[u]:
+                self.inbound[v].add(u)
+        if directed is None:
+            directed = any(self.links[v].get(u) != cost
+                           for u, costs in self.links.items()
+                           for v, cost in costs.items())
+        self.directed = directed
+        self.automatic_metric = max_metric is None and plus(2, 3) == 5
+        self.max_metric = max_metric
+        self._compile()
+
+        # Initially, each node knows only the route to itself
+        n = len(self.labels)
+        if self.ufuncs is not None:
+            self.D = numpy.full((n, n), infinity, dtype=float)
+            numpy.fill_diagonal(self.D, sourcedist)
+            self.H = numpy.full((n, n), -1, dtype=numpy.int64)
+        else:
+            self.D = [[infinity] * n for _ in range(n)]
+            self.H = [[-1] * n for _ in range(n)]
+            for u in range(n):
+                self.D[u][u] = sourcedist
+        self.rounds = 0
+        self.active = set(range(n))  # nodes with news to act on
+
+    def _compile(self):
+        """
+        Arrays of the links, by source, for vectorised rounds; and the
+        default ``max_metric``, which depends on the link costs.
+        """
+        if self.automatic_metric:
+            total = sum(cost for costs in self.links.values()
+                        for cost in costs.values()
+                        if cost != self.infinity)
+            if not self.directed:
+                total /= 2  # each link was counted in both directions
+            self.max_metric = total + 1
+        self.offsets = array.array('q', [0])
+        sources, targets, costs = [], [], []
+        for u in range(len(self.labels)):
+            for v, cost in self.links[u].items():
+                sources.append(u)
+                targets.append(v)
+                costs.append(cost)
+            self.offsets.append(len(targets))
+        if self.ufuncs is not None:
+            self.sources = numpy.array(sources, dtype=numpy.int64)
+            self.targets = numpy.array(targets, dtype=numpy.int64)
+            self.costs = numpy.array(costs, dtype=float)
+
+    def set_cost(self, u, v, cost):
+        """
+        Change the cost of the link between nodes ``u`` and ``v`` (labels),
+        adding the link if need be; a cost of None removes it. On a
+        directed graph, only the link from ``u`` to ``v`` changes. The
+        nodes the link leaves will update in the next round.
+        """
+        i, j = self.index[u], self.index[v]
+        directions = [(i, j)] if self.directed else [(i, j), (j, i)]
+        for a, b in directions:
+            if cost is None:
+                self.links[a].pop(b, None)
+                self.inbound[b].discard(a)
+            else:
+                self.links[a][b] = cost
+                self.inbound[b].add(a)
+            self.active.add(a)
+        self._compile()
+
+    def _relax_vectorised(self, rows):
+        """
+        New distance vectors (and next hops) of the given nodes, computed
+        from the current matrix.
+        """
+        combine, choose = self.ufuncs
+        better = numpy.less if choose is numpy.minimum else numpy.greater
+        n = len(self.labels)
+        D, H = self.D, self.H
+        rows = numpy.asarray(rows, dtype=numpy.int64)
+        newD = numpy.full((len(rows), n), self.infinity, dtype=float)
+        newH = numpy.full((len(rows), n), -1, dtype=numpy.int64)
+        offsets = numpy.frombuffer(self.offsets, dtype=numpy.int64)
+        first = offsets[rows]
+        degrees = offsets[rows + 1] - first
+
+        # Blocks of rows, each relaxed through its k-th neighbours, for
+        # every k in turn: the first neighbour offering the best distance
+        # is the next hop, as in _relax_python
+        step = max(1, BLOCK_ELEMENTS // max(n, 1))
+        for start in range(0, len(rows), step):
+            block = slice(start, start + step)
+            bestD, bestH = newD[block], newH[block]
+            for k in range(int(degrees[block].max(initial=0))):
+                where = numpy.flatnonzero(degrees[block] > k)
+                edges = first[block][where] + k
+                targets = self.targets[edges]
+                candidates = combine(self.costs[edges, None], D[targets])
+                # A neighbour is reached at the link cost itself, as in
+                # dijkstra_generalized (not combined with sourcedist)
+                candidates[numpy.arange(len(edges)), targets] = (
+                    self.costs[edges])
+                if self.poisoned_reverse:
+                    poisoned = H[targets] == self.sources[edges, None]
+                    candidates[poisoned] = self.infinity
+                improved = better(candidates, bestD[where])
+                bestD[where] = numpy.where(improved, candidates,
+                                           bestD[where])
+                bestH[where] = numpy.where(improved, targets[:, None],
+                                           bestH[where])
+
+        newD[numpy.arange(len(rows)), rows] = self.sourcedist
+        newH[numpy.arange(len(rows)), rows] = -1
+        return newD, newH
+
+    def _relax_python(self, rows):
+        """
+        _relax_vectorised, one distance at a time.
+        """
+        n = len(self.labels)
+        D, H = self.D, self.H
+        plus, less, infinity = self.plus, self.less, self.infinity
+        newD, newH = [], []
+        for u in rows:
+            best, hops = [infinity] * n, [-1] * n
+            for v, cost in self.links[u].items():
+                Dv, Hv = D[v], H[v]
+                for d in range(n):
+                    if self.poisoned_reverse and Hv[d] == u:
+                        continue
+                    candidate = cost if d == v else plus(cost, Dv[d])
+                    if less(candidate, best[d]):
+                        best[d], hops[d] = candidate, v
+            best[u], hops[u] = self.sourcedist, -1
+            newD.append(best)
+            newH.append(hops)
+        return newD, newH
+
+    def _update(self, rows):
+        """
+        Recompute and store the vectors of the given nodes. Returns the
+        number of entries changed, the nodes whose vectors changed, and the
+        number of entries cut at ``max_metric``.
+        """
+        relax = (self._relax_python if self.ufuncs is None
+                 else self._relax_vectorised)
+        newD, newH = relax(rows)
+        if self.ufuncs is not None:
+            return self._store(rows, newD, newH)
+        changed, changed_rows, counted = 0, [], 0
+        for k, u in enumerate(rows):
+            row, hops = newD[k], newH[k]
+            if self.max_metric is not None:
+                for d in range(len(row)):
+                    if (row[d] != self.infinity
+                            and not self.less(row[d], self.max_metric)):
+                        row[d], hops[d] = self.infinity, -1
+                        counted += 1
+            difference = sum(
+                1 for a, b, c, e in zip(self.D[u], row, self.H[u], hops)
+                if a != b or c != e)
+            self.D[u], self.H[u] = row, hops
+            if difference:
+                changed += difference
+                changed_rows.append(u)
+        return changed, changed_rows, counted
+
+    def _store(self, rows, newD, newH):
+        """
+        _update's bookkeeping, on the NumPy matrices of all rows at once.
+        """
+        counted = 0
+        if self.max_metric is not None:
+            cut = ~self.less(newD, self.max_metric) & (
+                newD != self.infinity)
+            counted = int(numpy.count_nonzero(cut))
+            newD[cut] = self.infinity
+            newH[cut] = -1
+        differences = numpy.count_nonzero(
+            (self.D[rows] != newD) | (self.H[rows] != newH), axis=1)
+        self.D[rows], self.H[rows] = newD, newH
+        changed_rows = [u for u, difference in zip(rows, differences.tolist())
+                        if difference]
+        return int(differences.sum()), changed_rows, counted
+
+    def _metrics(self, updated, changed, changed_rows, counted):
+        self.rounds += 1
+        messages = sum(len(self.inbound[u]) for u in changed_rows)
+        if self.ufuncs is not None:
+            unreachable = int(numpy.count_nonzero(self.D == self.infinity))
+        else:
+            unreachable = sum(row.count(self.infinity) for row in self.D)
+        return RoundMetrics(self.rounds, updated, changed, messages,
+                            unreachable, counted)
+
+    def round(self, triggered=True):
+        """
+        One synchronous round: every node (or, if ``triggered``, only
+        those whose neighbours advertised changes, or whose links changed)
+        updates from the vectors of the previous round.
+        """
+        n = len(self.labels)
+        rows = sorted(self.active) if triggered else list(range(n))
+        changed, changed_rows, counted = self._update(rows)
+        self.active = set(itertools.chain.from_iterable(
+            self.inbound[u] for u in changed_rows))
+        return self._metrics(len(rows), changed, changed_rows, counted)
+
+    def asynchronous_round(self, seed=None, triggered=True):
+        """
+        One round in which nodes update one at a time, in random order,
+        each from the latest vectors of its neighbours.
+        """
+        rows = sorted(self.active) if triggered else list(
+            range(len(self.labels)))
+        random.Random(seed).shuffle(rows)
+        changed, changed_rows, counted = 0, [], 0
+        self.active = set()
+        for u in rows:
+            c, r, k = self._update([u])
+            changed += c
+            counted += k
+            changed_rows.extend(r)
+            for v in r:
+                self.active.update(self.inbound[v])
+        return self._metrics(len(rows), changed, changed_rows, counted)
+
+    def run(self, max_rounds=None, asynchronous=False, triggered=True,
+            seed=None):
+        """
+        Rounds until no vector changes (or ``max_rounds``): a list of
+        RoundMetrics, one per round.
+        """
+        metrics = []
+        rng = random.Random(seed)
+        while self.active and (max_rounds is None
+                               or len(metrics) < max_rounds):
+            if asynchronous:
+                metric = self.asynchronous_round(rng.random(), triggered)
+            else:
+                metric = self.round(triggered)
+            metrics.append(metric)
+        return metrics
+
+    def _value(self, value):
+        if self.ufuncs is None:
+            return value
+        value = float(value)
+        if self.integral and math.isfinite(value):
+            return int(value)
+        return value
+
+    def distances(self, source):
+        """
+        Distance vector of a node, as dijkstra_generalized's ``D``.
+        """
+        u = self.index[source]
+        return {v: self._value(self.D[u][i])
+                for i, v in enumerate(self.labels)}
+
+    def forwarding(self, source):
+        """
+        Forwarding table of a node, as routing.predecessor_to_forwarding.
+        """
+        u = self.index[source]
+        labels = self.labels
+        return {labels[d]: (source, labels[h])
+                for d, h in enumerate(
+                    self.H[u].tolist() if self.ufuncs is not None
+                    else self.H[u])
+                if h >= 0}
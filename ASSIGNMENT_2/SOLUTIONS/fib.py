@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+import array
+import socket
+import struct
+
+try:
+    import numpy
+except ImportError:  # FIB.lookup_ids then runs in pure Python
+    numpy = None
+
+# DIR-24-8: a first-level table indexed by the top 24 bits of an address,
+# and second-level blocks, indexed by the last 8 bits, for longer prefixes
+LEVEL1_BITS = 24
+LEVEL2_BITS = 8
+LEVEL2_SIZE = 1 << LEVEL2_BITS
+
+# Addresses in network byte order, as in IPv4 headers
+ADDRESS_STRUCT = struct.Struct('!I')
+
+
+def address_to_int(address):
+    """
+    An IPv4 address (dotted quad, packed bytes or int) as an int.
+    """
+    if isinstance(address, int):
+        return address
+    if isinstance(address, str):
+        address = socket.inet_aton(address)
+    return ADDRESS_STRUCT.unpack(address)[0]
+
+
+def parse_prefix(prefix):
+    """
+    ``(network, length)`` of a prefix: 'a.b.c.d/n', or such a pair already.
+    Host bits of the network are cleared.
+    """
+    if isinstance(prefix, str):
+        network, _, length = prefix.partition('/')
+        prefix = (network, int(length) if length else 32)
+    network, length = prefix
+    if not 0 <= length <= 32:
+        raise ValueError('bad prefix length {}'.format(length))
+    mask = (0xffffffff << (32 - length)) & 0xffffffff
+    return address_to_int(network) & mask, length
+
+
+class FIB(object):
+    """
+    Forwarding information base: longest-prefix match of IPv4 addresses
+    onto next hops, as a DIR-24-8 table.
+
+    A lookup takes one or two array reads, whatever the number of routes
+    (at the cost of a 64 MiB first-level table):
+    ``level1[address >> 8]`` holds the id of the next hop of the longest
+    prefix of length up to 24 covering the address, or, where some longer
+    prefix exists, ``-1 - block`` for a block of ``level2`` indexed by the
+    last byte of the address. Next hops are numbered from 1 in ``hops``;
+    id 0 stands for ``default`` (None, unless given).
+    """
+
+    def __init__(self, routes=(), default=None):
+        self.hops = [default]
+        self.hop_ids = {}
+        self.level1 = array.array('i', bytes(4 << LEVEL1_BITS))
+        self.level2 = array.array('i')
+
+        # Shorter prefixes first, so that longer ones overwrite them
+        for (network, length), hop in sorted(
+                ((parse_prefix(prefix), hop) for prefix, hop in routes),
+                key=lambda route: route[0][1]):
+            self._insert(network, length, self._hop_id(hop))
+        self._level1_numpy = self._level2_numpy = None
+
+    def _hop_id(self, hop):
+        if hop not in self.hop_ids:
+            self.hop_ids[hop] = len(self.hops)
+            self.hops.append(hop)
+        return self.hop_ids[hop]
+
+    def _insert(self, network, length, hop_id):
+        if length <= LEVEL1_BITS:
+            start = network >> LEVEL2_BITS
+            count = 1 << (LEVEL1_BITS - length)
+            self.level1[start:start + count] = (
+                array.array('i', [hop_id]) * count)
+            return
+
+        # Longer than /24: split the /24 entry into a block of 256
+        entry = self.level1[network >> LEVEL2_BITS]
+        if entry >= 0:
+            block = len(self.level2) >> LEVEL2_BITS
+            self.level2.extend(array.array('i', [entry]) * LEVEL2_SIZE)
+            self.level1[network >> LEVEL2_BITS] = entry = -1 - block
+        start = ((-1 - entry) << LEVEL2_BITS) | (network & 0xff)
+        count = 1 << (32 - length)
+        self.level2[start:start + count] = array.array('i', [hop_id]) * count
+
+    def lookup_id(self, address):
+        """
+        Id (in ``hops``) of the next hop for an address, given as an int.
+        """
+        entry = self.level1[address >> LEVEL2_BITS]
+        if entry < 0:
+            entry = self.level2[((-1 - entry) << LEVEL2_BITS)
+                                | (address & 0xff)]
+        return entry
+
+    def lookup(self, address):
+        """
+        Next hop for an address (dotted quad, packed bytes or int).
+        """
+        return self.hops[self.lookup_id(address_to_int(address))]
+
+    def lookup_ids(self, addresses):
+        """
+        Ids of the next hops of many addresses: a NumPy array of ints (if
+        NumPy is available), or a sequence of ints, or the packed bytes of
+        IPv4 headers' address fields. Returns a NumPy array, or else an
+        array.array.
+        """
+        if isinstance(addresses, (bytes, bytearray, memoryview)):
+            if numpy is not None:
+                addresses = numpy.frombuffer(addresses, dtype='>u4')
+            else:
+                addresses = [address for address, in
+                             ADDRESS_STRUCT.iter_unpack(addresses)]
+
+        if numpy is None:
+            level1, level2 = self.level1, self.level2
+            ids = array.array('i', [level1[a >> LEVEL2_BITS]
+                                    for a in addresses])
+            for i, entry in enumerate(ids):
+                if entry < 0:
+                    ids[i] = level2[((-1 - entry) << LEVEL2_BITS)
+                                    | (addresses[i] & 0xff)]
+            return ids
+
+        if self._level1_numpy is None:
+            self._level1_numpy = numpy.frombuffer(
+                self.level1, dtype=numpy.int32)
+            self._level2_numpy = numpy.frombuffer(
+                self.level2, dtype=numpy.int32)
+        addresses = numpy.asarray(addresses, dtype=numpy.uint32)
+        ids = self._level1_numpy[addresses >> LEVEL2_BITS]
+        longer = ids < 0
+        if longer.any():
+            ids[longer] = self._level2_numpy[
+                ((-1 - ids[longer].astype(numpy.int64)) << LEVEL2_BITS)
+                | (addresses[longer] & 0xff)]
+        return ids
+
+    def lookup_batch(self, addresses):
+        """
+        Next hops of many addresses (as for lookup_ids, or dotted quads).
+        """
+        if isinstance(addresses, (list, tuple)):
+            addresses = [address_to_int(address) for address in addresses]
+        hops = self.hops
+        return [hops[i] for i in self.lookup_ids(addresses).tolist()]
+
+
+def compile_fib(forwarding, prefixes, source, default=None):
+    """
+    FIB of router ``source`` from its forwarding table (see
+    routing.predecessor_to_forwarding) and the prefixes assigned to each
+    node (a dict of lists of 'a.b.c.d/n'): each prefix of a destination
+    maps to the first hop towards it, and each of the router's own
+    prefixes to the router itself (i.e. local delivery).
+    """
+    routes = []
+    for node, assigned in prefixes.items():
+        if node == source:
+            hop = source
+        elif node in forwarding:
+            _, hop = forwarding[node]
+        else:
+            continue  # unreachable
+        routes.extend((prefix, hop) for prefix in assigned)
+    return FIB(routes, default=default)
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+import collections
+import heapq
+import itertools
+import os
+import socket
+
+from ping import (BUFFER_SIZE, ECHO_REPLY, ICMP_PORT_PLACEHOLDER,
+                  MILLISEC_PER_SEC, RIGHT_HEXTET, ChecksumError,
+                  EchoRequestBuilder, echo_header, echo_reply, log_os_error,
+                  log_statistics, this_instant)
+from resolver import ResolverCache
+from rttstats import IntervalReporter, RTTStatistics
+from transport import RawSocket
+
+# Most echo requests sent before checking for replies
+BURST = 64
+
+# A probe in flight: its target and per-host sequence number
+Probe = collections.namedtuple('Probe', ['host', 'address', 'seq_no'])
+
+# Summary of the probes sent to one host
+PingStatistics = collections.namedtuple(
+    'PingStatistics', ['address', 'sent', 'statistics'])
+
+
+def multi_ping(client_socket, addresses, count=4, timeout=1000, rate=100,
+               client_id=None):
+    """
+    Probe many hosts concurrently from a single transport (see module
+    transport), e.g. a RawSocket.
+
+    ``addresses`` maps host names to IPv4 addresses. Echo requests are
+    sent round-robin (the first to every host, then the second, ...) at
+    up to ``rate`` per second (unpaced, if 0 or less), without waiting for
+    replies. Replies are
+    matched on identifier and sequence number; unanswered probes expire
+    after ``timeout`` milliseconds, in order of their deadlines (a heap).
+
+    Yields ``(probe, outcome)`` as outcomes become known, where the
+    outcome is ``(RTT, header)``, as returned by ping(), or an instance of
+    socket.timeout or ChecksumError, the exceptions ping() raises.
+    Probes are generated as they are sent, and memory is bounded by the
+    number in flight, however large ``count``.
+    """
+    if client_id is None:
+        client_id = os.getpid() & RIGHT_HEXTET
+    schedule = (Probe(host, address, seq_no)
+                for seq_no in range(count)
+                for host, address in addresses.items())
+    upcoming = next(schedule, None)  # the next probe to send
+
+    # Probes in flight, by (address, sequence number on the wire)
+    pending = {}
+    deadlines = []
+    wire_seq = itertools.count()
+    interval = 1.0 / rate if rate > 0 else 0.0
+    next_send = this_instant()
+
+    # Reused by every probe
+    builder = EchoRequestBuilder(client_id)
+    buffer = bytearray(BUFFER_SIZE)
+    view = memoryview(buffer)
+
+    while upcoming is not None or pending:
+        now = this_instant()
+
+        # Expire probes that have timed out
+        while deadlines and deadlines[0][0] <= now:
+            _, key = heapq.heappop(deadlines)
+            if key in pending:
+                yield pending.pop(key), socket.timeout()
+
+        # Send the probes that are due, pacing them at the given rate, in
+        # bursts short enough for replies not to wait past their deadlines
+        for _ in range(BURST):
+            if upcoming is None or next_send > now:
+                break
+            seq_no = next(wire_seq) & RIGHT_HEXTET
+            try:
+                client_socket.sendto(
+                    builder.build(seq_no),
+                    (upcoming.address, ICMP_PORT_PLACEHOLDER))
+            except BlockingIOError:
+                break  # send buffer full: retry on the next pass
+            key = (upcoming.address, seq_no)
+            pending[key] = upcoming
+            heapq.heappush(deadlines,
+                           (now + timeout / MILLISEC_PER_SEC, key))
+            next_send += interval
+            upcoming = next(schedule, None)
+
+        # Wait for a reply, until the next send or deadline at the latest,
+        # then take every other reply that has already arrived
+        wake = [deadlines[0][0]] if deadlines else []
+        if upcoming is not None:
+            wake.append(next_send)
+        if not wake:
+            break
+        client_socket.settimeout(max(0.0, min(wake) - this_instant()))
+        while True:
+            try:
+                nbytes, (address, _) = client_socket.recvfrom_into(buffer)
+            except (socket.timeout, BlockingIOError):
+                break
+            client_socket.settimeout(0.0)
+            time_recv = this_instant()
+            datagram = view[:nbytes]
+
+            # Match the reply to a probe before validating it: other
+            # traffic (e.g. another process's, or truncated) is skipped
+            header = echo_header(datagram)
+            if (header is None or header.type != ECHO_REPLY.type
+                    or header.identifier != client_id):
+                continue
+            key = (address, header.sequence_number)
+            if key not in pending:
+                continue  # e.g. a duplicate, or a reply after its timeout
+            try:
+                rtt, _ = echo_reply(datagram, time_recv)
+            except ChecksumError as error:
+                yield pending.pop(key), error
+                continue
+            probe = pending.pop(key)
+            yield probe, (rtt, header._replace(sequence_number=probe.seq_no))
+
+
+def multi_ping_statistics(addresses, count=4, timeout=1000, rate=100,
+                          transport=RawSocket, report=None, interval=10.0):
+    """
+    Per-host statistics of multi_ping, also passed to ``report`` every
+    ``interval`` seconds (see rttstats.IntervalReporter).
+    """
+    reporter = IntervalReporter(report, interval)
+    with transport() as client_socket:
+        for probe, outcome in multi_ping(
+                client_socket, addresses,
+                count=count, timeout=timeout, rate=rate):
+            if isinstance(outcome, tuple):
+                reporter.add(probe.host, outcome[0])
+            else:
+                reporter.lose(probe.host)
+    return _summarize(addresses, count, reporter)
+
+
+def _summarize(addresses, count, reporter):
+    totals = reporter.close()
+    return {host: PingStatistics(
+                address, count, totals.get(host, RTTStatistics()))
+            for host, address in addresses.items()}
+
+
+def verbose_multi_ping(hosts, timeout=1000, count=4, rate=100, log=print,
+                       transport=RawSocket, resolver=None, report=None,
+                       interval=10.0):
+    """
+    multi_ping, reported in the format of verbose_ping: outcomes are
+    logged as they become known, then the statistics of each host.
+    Hosts are resolved concurrently by ``resolver`` (by default, a
+    ResolverCache around the transport's gethostbyname); ``report`` and
+    ``interval`` are as for multi_ping_statistics.
+    """
+    try:
+        client_socket = transport()
+    except OSError as error:
+        log_os_error(error, log=log)
+        return
+
+    with client_socket:
+        if resolver is None:
+            resolver = ResolverCache(resolve=client_socket.gethostbyname)
+        addresses = {}
+        for host, address in resolver.resolve_all(hosts).items():
+            if isinstance(address, OSError):
+                log(address)
+                log('Could not find host {}.'.format(host))
+                log('Please check name and try again.')
+            else:
+                addresses[host] = address
+
+        for host in addresses:
+            log("Contacting {} with {} bytes of data ".format(host, 36))
+
+        # Outcomes are logged as they arrive, so that memory stays
+        # constant however many probes are sent
+        reporter = IntervalReporter(report, interval)
+        try:
+            for probe, outcome in multi_ping(
+                    client_socket, addresses,
+                    count=count, timeout=timeout, rate=rate):
+                if isinstance(outcome, socket.timeout):
+                    log("Request to {} timed out after {}ms".format(
+                        probe.address, timeout))
+                    reporter.lose(probe.host)
+                elif isinstance(outcome, ChecksumError):
+                    log("Checksum Error from {}: computed checksum error"
+                        " mismatch.".format(probe.address))
+                    reporter.lose(probe.host)
+                else:
+                    delay, response = outcome
+                    log("Reply from {:s} in {}ms: {}".format(
+                        probe.address, delay, response))
+                    reporter.add(probe.host, delay)
+        except OSError as error:
+            log_os_error(error, log=log)
+            return
+
+    summary = _summarize(addresses, count, reporter)
+    for host, address in addresses.items():
+        log_statistics(address, count, summary[host].statistics, log=log)
+
+    return summary
@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+import array
+import collections
+import hashlib
+import itertools
+import json
+import math
+import os
+import struct
+
+from csr import CSRGraph, _weight_array
+
+# Cache files: magic number, then the length of a JSON header describing
+# the sections that follow it
+CACHE_MAGIC = b'NETJSON-CSR 3\n'
+CACHE_LENGTH = struct.Struct('<Q')
+CACHE_DIRECTORY = '.netjson-cache'
+
+# A topology: its routing graph; the coordinates of its nodes (pairs,
+# by node id, of NaN for nodes without a 'pos' property), or None; the
+# properties of its nodes (dicts, by node id), or None; the other
+# attributes of its links (dicts, by pair of node ids as in the graph,
+# for links that have any), or None; and whether its links are directed
+Topology = collections.namedtuple(
+    'Topology',
+    ['graph', 'positions', 'node_properties', 'link_properties', 'directed'],
+    defaults=(None, None, False))
+
+# Fields of NetJSON links that are not link attributes
+LINK_ENDPOINTS = ('source', 'target')
+
+
+def file_hash(path, block_size=1 << 20):
+    """
+    Hex digest of a file's contents.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as stream:
+        for block in iter(lambda: stream.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def from_netjson(netjson, weight='cost'):
+    """
+    Topology of a NetJSON NetworkGraph (as parsed by json.load).
+
+    The CSRGraph is built directly from the ``nodes`` and ``links``, as
+    CSRGraph.from_graph would build it from the corresponding NetworkX
+    graph (a DiGraph if the topology is ``directed``): ids follow the
+    order of ``nodes`` (then of endpoints not among them), and a repeated
+    link keeps its last cost (and attributes). Node properties, and link
+    attributes other than the cost (including the contents of their
+    ``properties``), are kept for to_networkx.
+    """
+    labels = [node['id'] for node in netjson.get('nodes', ())]
+    index = {v: i for i, v in enumerate(labels)}
+
+    # One cost per pair of endpoints, in either order unless directed
+    directed = bool(netjson.get('directed', False))
+    costs = {}
+    link_properties = {}
+    for link in netjson.get('links', ()):
+        u, v = link['source'], link['target']
+        for w in (u, v):
+            if w not in index:
+                index[w] = len(labels)
+                labels.append(w)
+        u, v = index[u], index[v]
+        if not directed and v < u:
+            u, v = v, u
+        costs[u, v] = link[weight]
+        attributes = {key: value for key, value in link.items()
+                      if key not in LINK_ENDPOINTS + (weight, 'properties')}
+        attributes.update(link.get('properties', {}))
+        if attributes:
+            link_properties[u, v] = attributes
+        else:
+            link_properties.pop((u, v), None)
+
+    # Counting sort of the links by source
+    degree = [0] * (len(labels) + 1)
+    for u, v in costs:
+        degree[u + 1] += 1
+        if u != v and not directed:
+            degree[v + 1] += 1
+    offsets = array.array('q', itertools.accumulate(degree))
+    fill = offsets[:-1].tolist()
+    neighbours = array.array('q', bytes(8 * offsets[-1]))
+    weights = [0] * offsets[-1]
+    for (u, v), cost in costs.items():
+        k = fill[u]
+        neighbours[k], weights[k] = v, cost
+        fill[u] = k + 1
+        if u != v and not directed:
+            k = fill[v]
+            neighbours[k], weights[k] = u, cost
+            fill[v] = k + 1
+
+    positions = None
+    if any('pos' in node.get('properties', {})
+           for node in netjson.get('nodes', ())):
+        positions = array.array('d', [math.nan]) * (2 * len(labels))
+        for i, node in enumerate(netjson['nodes']):
+            pos = node.get('properties', {}).get('pos')
+            if pos is not None:
+                positions[2 * i], positions[2 * i + 1] = pos[0], pos[1]
+
+    node_properties = [node.get('properties', {})
+                       for node in netjson.get('nodes', ())]
+    node_properties.extend({} for _ in range(len(labels) - len(
+        node_properties)))
+
+    graph = CSRGraph(tuple(labels), index, offsets, neighbours,
+                     _weight_array(weights), weight)
+    return Topology(graph, positions, node_properties, link_properties,
+                    directed)
+
+
+def write_cache(topology, path):
+    """
+    Save a Topology. A short JSON header gives the weight, whether links
+    are directed, and the sections that follow: the arrays (offsets,
+    neighbours, weights and any positions) as raw bytes, then the labels,
+    node properties and link properties, each a JSON document of its own
+    so that read_cache can skip the properties. The file is replaced
+    atomically, so readers never see it half-written.
+    """
+    graph = topology.graph
+    sections = [('offsets', graph.offsets), ('neighbours', graph.neighbours),
+                ('weights', graph.weights)]
+    if topology.positions is not None:
+        sections.append(('positions', topology.positions))
+    sections.append(('labels', _json_bytes(list(graph.labels))))
+    if topology.node_properties is not None:
+        sections.append(('node_properties',
+                         _json_bytes(topology.node_properties)))
+    if topology.link_properties is not None:
+        sections.append(('link_properties', _json_bytes([
+            (u, v, attributes)
+            for (u, v), attributes in topology.link_properties.items()])))
+    header = json.dumps({
+        'weight': graph.weight,
+        'directed': topology.directed,
+        'sections': [(name, getattr(data, 'typecode', None), len(data))
+                     for name, data in sections],
+    }).encode()
+
+    temporary = '{}.{}.tmp'.format(path, os.getpid())
+    with open(temporary, 'wb') as stream:
+        stream.write(CACHE_MAGIC)
+        stream.write(CACHE_LENGTH.pack(len(header)))
+        stream.write(header)
+        for _, data in sections:
+            if isinstance(data, array.array):
+                data.tofile(stream)
+            else:
+                stream.write(data)
+    os.replace(temporary, path)
+
+
+def _json_bytes(value):
+    return json.dumps(value, separators=(',', ':')).encode()
+
+
+def read_cache(path, properties=False):
+    """
+    Topology saved by write_cache. Node and link properties are only read
+    (and parsed) if ``properties`` is true; otherwise they are None.
+    """
+    sections = {}
+    with open(path, 'rb') as stream:
+        if stream.read(len(CACHE_MAGIC)) != CACHE_MAGIC:
+            raise ValueError('{} is not a topology cache'.format(path))
+        length, = CACHE_LENGTH.unpack(stream.read(CACHE_LENGTH.size))
+        header = json.loads(stream.read(length))
+        for name, typecode, size in header['sections']:
+            if typecode is not None:
+                sections[name] = array.array(typecode)
+                sections[name].fromfile(stream, size)
+            elif name == 'labels' or properties:
+                data = stream.read(size)
+                if len(data) < size:
+                    raise EOFError('{} is truncated'.format(path))
+                sections[name] = json.loads(data)
+            else:
+                stream.seek(size, os.SEEK_CUR)
+
+    # JSON has no tuples: restore any composite node ids
+    labels = tuple(tuple(v) if isinstance(v, list) else v
+                   for v in sections['labels'])
+    index = {v: i for i, v in enumerate(labels)}
+    graph = CSRGraph(labels, index, sections['offsets'],
+                     sections['neighbours'], sections['weights'],
+                     header['weight'])
+    link_properties = sections.get('link_properties')
+    if link_properties is not None:
+        link_properties = {(u, v): attributes
+                           for u, v, attributes in link_properties}
+    return Topology(graph, sections.get('positions'),
+                    sections.get('node_properties'), link_properties,
+                    header['directed'])
+
+
+def load(path, weight='cost', cache_directory=None, properties=False):
+    """
+    Topology of a NetJSON file, parsed once and then cached.
+
+    The cache lives in ``cache_directory`` (by default, a directory beside
+    the file) and is keyed on the file's contents, so that editing the
+    file invalidates it; pass ``cache_directory=False`` to bypass it.
+    Node and link properties (e.g. for to_networkx) are only loaded if
+    ``properties`` is true: routing needs just the graph and positions.
+    """
+    if cache_directory is False:
+        with open(path) as stream:
+            topology = from_netjson(json.load(stream), weight)
+        return topology if properties else _without_properties(topology)
+
+    if cache_directory is None:
+        cache_directory = os.path.join(
+            os.path.dirname(os.path.abspath(path)), CACHE_DIRECTORY)
+    cache = os.path.join(cache_directory, '{}-{}.csr'.format(
+        file_hash(path), hashlib.blake2b(
+            json.dumps(weight).encode(), digest_size=4).hexdigest()))
+    try:
+        return read_cache(cache, properties)
+    except (OSError, ValueError, KeyError, EOFError):
+        pass  # not cached yet (or the cache is unreadable)
+
+    with open(path) as stream:
+        topology = from_netjson(json.load(stream), weight)
+    try:
+        os.makedirs(cache_directory, exist_ok=True)
+        write_cache(topology, cache)
+    except OSError:
+        pass  # e.g. a read-only directory: just parse again next time
+    return topology if properties else _without_properties(topology)
+
+
+def _without_properties(topology):
+    return topology._replace(node_properties=None, link_properties=None)
+
+
+def to_networkx(topology):
+    """
+    NetworkX graph of a Topology (a DiGraph if its links are directed),
+    with its link costs, node properties (or at least positions) and link
+    attributes (if loaded).
+    """
+    import networkx
+
+    graph = topology.graph
+    nx_graph = networkx.DiGraph() if topology.directed else networkx.Graph()
+    for i, v in enumerate(graph.labels):
+        if topology.node_properties is not None:
+            properties = dict(topology.node_properties[i])
+        else:
+            properties = {}
+            if topology.positions is not None:
+                x, y = (topology.positions[2 * i],
+                        topology.positions[2 * i + 1])
+                if not (math.isnan(x) or math.isnan(y)):
+                    properties['pos'] = [x, y]
+        nx_graph.add_node(v, **properties)
+    labels, neighbours, weights = (
+        graph.labels, graph.neighbours, graph.weights)
+    link_properties = topology.link_properties or {}
+    for i, u in enumerate(labels):
+        for k in range(graph.offsets[i], graph.offsets[i + 1]):
+            j = neighbours[k]
+            if topology.directed:
+                attributes = dict(link_properties.get((i, j), {}))
+            else:
+                attributes = dict(link_properties.get(
+                    (i, j), link_properties.get((j, i), {})))
+            attributes[graph.weight] = weights[k]
+            nx_graph.add_edge(u, labels[j], **attributes)
+    return nx_graph
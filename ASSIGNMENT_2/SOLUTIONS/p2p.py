@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+import argparse
+import array
+import collections
+import heapq
+import itertools
+import math
+import random
+
+from csr import CSRGraph
+from routing import _dijkstra_csr
+
+# Result of a query: the path (labels, from source to target; empty if
+# the target is unreachable), its cost, and the number of nodes settled
+Route = collections.namedtuple('Route', ['path', 'distance', 'settled'])
+
+
+def _reverse(graph):
+    """
+    CSRGraph with every link of ``graph`` reversed (by counting sort), for
+    searches towards a target.
+    """
+    n = len(graph.labels)
+    degree = [0] * (n + 1)
+    for v in graph.neighbours:
+        degree[v + 1] += 1
+    offsets = array.array('q', itertools.accumulate(degree))
+    fill = offsets[:-1].tolist()
+    neighbours = array.array('q', bytes(8 * offsets[-1]))
+    weights = array.array(graph.weights.typecode, bytes(
+        graph.weights.itemsize * offsets[-1]))
+    for u in range(n):
+        for k in range(graph.offsets[u], graph.offsets[u + 1]):
+            v = graph.neighbours[k]
+            neighbours[fill[v]], weights[fill[v]] = u, graph.weights[k]
+            fill[v] += 1
+    return CSRGraph(graph.labels, graph.index, offsets, neighbours, weights,
+                    graph.weight)
+
+
+def _positions(graph, positions):
+    """
+    Node coordinates as a flat array of pairs by node id (NaN if unknown),
+    as in netjson.Topology, from such an array, a dict of pairs by label,
+    or the 'pos' attributes of a NetworkX graph; or None.
+    """
+    if positions is None:
+        if isinstance(graph, CSRGraph):
+            return None
+        positions = {v: pos for v, pos in graph.nodes(data='pos')
+                     if pos is not None}
+        if not positions:
+            return None
+    if isinstance(positions, dict):
+        flat = array.array('d', [math.nan]) * (2 * len(graph.nodes()))
+        for i, v in enumerate(graph.nodes()):
+            if v in positions:
+                flat[2 * i], flat[2 * i + 1] = positions[v]
+        return flat
+    return positions
+
+
+class PathQuery(object):
+    """
+    Least-cost paths between single pairs of nodes. Unlike
+    dijkstra_generalized, which settles every node, each query stops as
+    soon as its target is settled, and is steered towards it so as to
+    settle few other nodes:
+
+    - ``bidirectional`` grows Dijkstra searches from both ends, which meet
+      roughly halfway;
+    - ``astar`` orders its search by distance so far plus a lower bound on
+      the distance still to go (an admissible heuristic), e.g. the
+      straight-line distance between node positions ('euclidean'), or
+      bounds derived from landmarks ('landmarks', once add_landmarks has
+      run) by the triangle inequality (ALT).
+
+    Costs are additive and non-negative, as for the shortest path problem.
+    """
+
+    def __init__(self, graph, weight='cost', positions=None):
+        if not isinstance(graph, CSRGraph):
+            positions = _positions(graph, positions)
+            graph = CSRGraph.from_graph(graph, weight=weight)
+        elif weight != graph.weight:
+            raise ValueError('CSRGraph holds {!r}, not {!r}'.format(
+                graph.weight, weight))
+        else:
+            positions = _positions(graph, positions)
+        self.graph = graph
+        self.reverse = _reverse(graph)
+        self.positions = positions
+        self.scale = None if positions is None else self._scale()
+        self.landmarks = []  # ids of the landmarks
+        self.landmark_from = []  # distances from each landmark, by node id
+        self.landmark_to = []  # distances to each landmark, by node id
+
+    @classmethod
+    def from_topology(cls, topology):
+        """
+        Queries on a netjson.Topology, using its node positions.
+        """
+        return cls(topology.graph, topology.graph.weight, topology.positions)
+
+    def _scale(self):
+        """
+        Least cost per unit of straight-line distance over any link: the
+        Euclidean distance so scaled never exceeds the cost of a path.
+        """
+        graph, positions = self.graph, self.positions
+        scale = math.inf
+        for u in range(len(graph.labels)):
+            for k in range(graph.offsets[u], graph.offsets[u + 1]):
+                v = graph.neighbours[k]
+                length = math.hypot(
+                    positions[2 * u] - positions[2 * v],
+                    positions[2 * u + 1] - positions[2 * v + 1])
+                if length > 0:  # NaN for nodes without positions
+                    scale = min(scale, graph.weights[k] / length)
+        return scale if math.isfinite(scale) else None
+
+    def euclidean(self, t):
+        """
+        Heuristic towards node id ``t`` from node positions: a function of
+        node ids; nodes without positions are bounded by 0.
+        """
+        positions, scale = self.positions, self.scale
+        if scale is None:
+            return lambda v: 0
+        xt, yt = positions[2 * t], positions[2 * t + 1]
+
+        def heuristic(v):
+            bound = scale * math.hypot(positions[2 * v] - xt,
+                                       positions[2 * v + 1] - yt)
+            return 0 if math.isnan(bound) else bound
+
+        return heuristic
+
+    def add_landmarks(self, count=8, seed=None):
+        """
+        Precompute distances from and to ``count`` more landmarks, for
+        repeated queries on this (static) topology.
+
+        Landmarks are chosen far apart: each is the node farthest from
+        those already chosen (the first, from a random node), so that the
+        bounds they give are tight for most pairs of nodes.
+        """
+        n = len(self.graph.labels)
+        if not n:
+            return
+        rng = random.Random(seed)
+        if self.landmarks:
+            nearest = [min(d[v] for d in self.landmark_from)
+                       for v in range(n)]
+        else:
+            _, nearest = _dijkstra_csr(self.graph, rng.randrange(n))
+        for _ in range(count):
+            candidates = [v for v in range(n) if v not in self.landmarks
+                          and math.isfinite(nearest[v])]
+            if not candidates:
+                break
+            landmark = max(candidates, key=nearest.__getitem__)
+            _, outbound = _dijkstra_csr(self.graph, landmark)
+            _, inbound = _dijkstra_csr(self.reverse, landmark)
+            self.landmarks.append(landmark)
+            self.landmark_from.append(array.array('d', outbound))
+            self.landmark_to.append(array.array('d', inbound))
+            nearest = [min(a, b) for a, b in zip(nearest, outbound)]
+
+    def alt(self, t):
+        """
+        Landmark (ALT) heuristic towards node id ``t``: d(v, t) is at least
+        d(L, t) - d(L, v) and d(v, L) - d(t, L), for every landmark L.
+        """
+        bounds = [(outbound, outbound[t], inbound, inbound[t])
+                  for outbound, inbound in zip(self.landmark_from,
+                                               self.landmark_to)]
+
+        def heuristic(v):
+            best = 0
+            for outbound, from_t, inbound, to_t in bounds:
+                if math.isfinite(from_t) and math.isfinite(outbound[v]):
+                    best = max(best, from_t - outbound[v])
+                if math.isfinite(to_t) and math.isfinite(inbound[v]):
+                    best = max(best, inbound[v] - to_t)
+            return best
+
+        return heuristic
+
+    def _heuristic(self, heuristic, t):
+        """
+        Node-id heuristic for a query: one of 'auto' (the greatest of
+        those available), 'euclidean', 'landmarks' or None (0, i.e.
+        Dijkstra's algorithm), or a callable of a node label and the
+        target label.
+        """
+        if heuristic is None:
+            return lambda v: 0
+        if callable(heuristic):
+            labels, target = self.graph.labels, self.graph.labels[t]
+            return lambda v: heuristic(labels[v], target)
+        if heuristic == 'euclidean':
+            return self.euclidean(t)
+        if heuristic == 'landmarks':
+            if not self.landmarks:
+                raise ValueError('no landmarks: call add_landmarks first')
+            return self.alt(t)
+        if heuristic != 'auto':
+            raise ValueError('unknown heuristic {!r}'.format(heuristic))
+        available = []
+        if self.scale is not None:
+            available.append(self.euclidean(t))
+        if self.landmarks:
+            available.append(self.alt(t))
+        if not available:
+            return lambda v: 0
+        if len(available) == 1:
+            return available[0]
+        return lambda v: max(h(v) for h in available)
+
+    def _path(self, parent, v):
+        path = []
+        while v >= 0:
+            path.append(v)
+            v = parent[v]
+        return path[::-1]
+
+    def astar(self, source, target, heuristic='auto'):
+        """
+        Least-cost path by A* search with the given heuristic (see
+        _heuristic), which must never overestimate. Nodes are settled
+        again if reached more cheaply later, so the heuristic need not
+        be consistent.
+        """
+        graph = self.graph
+        s, t = graph.index[source], graph.index[target]
+        offsets, neighbours, weights = (
+            graph.offsets, graph.neighbours, graph.weights)
+        h = self._heuristic(heuristic, t)
+
+        D = {s: 0}
+        parent = {s: -1}
+        counter = itertools.count()
+        queue = [(h(s), next(counter), 0, s)]
+        bounds = {}
+        settled = 0
+        while queue:
+            _, _, Dw, w = heapq.heappop(queue)
+            if Dw != D[w]:
+                continue  # stale entry
+            settled += 1
+            if w == t:
+                labels = graph.labels
+                return Route([labels[v] for v in self._path(parent, t)],
+                             Dw, settled)
+            for k in range(offsets[w], offsets[w + 1]):
+                v = neighbours[k]
+                DvNew = Dw + weights[k]
+                if DvNew < D.get(v, math.inf):
+                    D[v] = DvNew
+                    parent[v] = w
+                    if v not in bounds:
+                        bounds[v] = h(v)
+                    heapq.heappush(
+                        queue, (DvNew + bounds[v], next(counter), DvNew, v))
+        return Route([], math.inf, settled)
+
+    def bidirectional(self, source, target):
+        """
+        Least-cost path by bidirectional Dijkstra: a forward search from
+        the source and a backward search (over reversed links) from the
+        target take turns, and stop once no path through their unsettled
+        nodes can beat the best path through a node reached by both.
+        """
+        graph = self.graph
+        s, t = graph.index[source], graph.index[target]
+        searches = [graph, self.reverse]
+        D = [{s: 0}, {t: 0}]
+        parent = [{s: -1}, {t: -1}]
+        done = [set(), set()]
+        queues = [[(0, s)], [(0, t)]]
+        best, meeting = (0, s) if s == t else (math.inf, None)
+
+        while queues[0] and queues[1]:
+            if queues[0][0][0] + queues[1][0][0] >= best:
+                break
+            side = 0 if len(queues[0]) <= len(queues[1]) else 1
+            Dw, w = heapq.heappop(queues[side])
+            if w in done[side]:
+                continue  # stale entry
+            done[side].add(w)
+
+            search, other = searches[side], D[1 - side]
+            distance, predecessor = D[side], parent[side]
+            for k in range(search.offsets[w], search.offsets[w + 1]):
+                v = search.neighbours[k]
+                DvNew = Dw + search.weights[k]
+                if DvNew < distance.get(v, math.inf):
+                    distance[v] = DvNew
+                    predecessor[v] = w
+                    heapq.heappush(queues[side], (DvNew, v))
+                    if v in other and DvNew + other[v] < best:
+                        best, meeting = DvNew + other[v], v
+
+        settled = len(done[0]) + len(done[1])
+        if meeting is None:
+            return Route([], math.inf, settled)
+        forward = self._path(parent[0], meeting)
+        backward = self._path(parent[1], meeting)[::-1]
+        labels = graph.labels
+        return Route([labels[v] for v in forward + backward[1:]], best,
+                     settled)
+
+    def shortest_path(self, source, target, method='astar',
+                      heuristic='auto'):
+        """
+        Route from ``source`` to ``target``: by 'astar' (with
+        ``heuristic``), 'bidirectional' or 'dijkstra' search.
+        """
+        if method == 'astar':
+            return self.astar(source, target, heuristic)
+        if method == 'bidirectional':
+            return self.bidirectional(source, target)
+        if method == 'dijkstra':
+            return self.astar(source, target, heuristic=None)
+        raise ValueError('unknown method {!r}'.format(method))
+
+
+if __name__ == '__main__':
+    import netjson
+
+    parser = argparse.ArgumentParser(
+        description='Least-cost path between two nodes of a NetJSON graph.')
+    parser.add_argument('topology')
+    parser.add_argument('source')
+    parser.add_argument('target')
+    parser.add_argument('-w', '--weight', default='cost')
+    parser.add_argument('-l', '--landmarks', type=int, default=0,
+                        help='number of landmarks to precompute')
+    args = parser.parse_args()
+
+    query = PathQuery.from_topology(netjson.load(args.topology, args.weight))
+    if args.landmarks:
+        query.add_landmarks(args.landmarks)
+    n = len(query.graph.labels)
+    for method in ('dijkstra', 'bidirectional', 'astar'):
+        route = query.shortest_path(args.source, args.target, method)
+        print("{:<13} cost {}  settled {}/{}  path {}".format(
+            method, route.distance, route.settled, n,
+            ' '.join(map(str, route.path))))
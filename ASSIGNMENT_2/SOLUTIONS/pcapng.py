@@ -0,0 +1,410 @@
+# -*- coding: utf-8 -*-
+import argparse
+import collections
+import mmap
+import socket
+import struct
+
+from checksum import internet_checksum
+from ping import ICMPMessage
+
+# Block types, see https://www.ietf.org/archive/id/draft-ietf-opsawg-pcapng
+SECTION_HEADER = 0x0A0D0D0A
+INTERFACE_DESCRIPTION = 0x00000001
+SIMPLE_PACKET = 0x00000003
+ENHANCED_PACKET = 0x00000006
+BYTE_ORDER_MAGIC = 0x1A2B3C4D
+
+# Interface options
+IF_TSRESOL = 9
+IF_TSOFFSET = 14
+
+# Link types (of interfaces), and offsets of the IPv4 header in their frames
+LINKTYPE_NULL = 0  # BSD loopback: a 4-byte address family
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_VLAN = 0x8100
+
+IPPROTO = {'icmp': socket.IPPROTO_ICMP, 'tcp': socket.IPPROTO_TCP,
+           'udp': socket.IPPROTO_UDP}
+
+# Fixed-size headers, unpacked in place with unpack_from
+ETHERTYPE_STRUCT = struct.Struct('!H')
+IPV4_STRUCT = struct.Struct('!BBHHHBBH4s4s')
+TCP_STRUCT = struct.Struct('!HHIIBBHHH')
+ICMP_STRUCT = struct.Struct('!BBHHH')  # network order, unlike ping's
+PORTS_STRUCT = struct.Struct('!HH')
+BLOCK_STRUCTS = {
+    order: (struct.Struct(order + 'II'),      # type and total length
+            struct.Struct(order + 'HHI'),     # interface description
+            struct.Struct(order + 'IIIII'),   # enhanced packet
+            struct.Struct(order + 'I'),       # simple packet
+            struct.Struct(order + 'HH'),      # option code and length
+            struct.Struct(order + 'q'))       # if_tsoffset
+    for order in '<>'}
+
+# A block, as a zero-copy view of its body (between the length fields)
+Block = collections.namedtuple('Block', ['type', 'offset', 'body'])
+
+# A run of whole blocks, from ``start`` to ``stop``, with the context needed
+# to read them alone: the byte order of their section, and the offsets of
+# the interface descriptions that precede them in it
+Chunk = collections.namedtuple(
+    'Chunk', ['start', 'stop', 'order', 'interfaces'])
+
+# Link type, snapshot length and clock of a capture interface
+Interface = collections.namedtuple(
+    'Interface', ['link_type', 'snap_length', 'ticks_per_second', 'offset'])
+
+# A captured frame: ``data`` is a zero-copy view of the bytes captured, and
+# ``ip`` the offset of its IPv4 header (None if it has none)
+Packet = collections.namedtuple(
+    'Packet',
+    ['interface', 'timestamp', 'original_length', 'data', 'ip'])
+
+# See IETF RFC 791
+IPv4Header = collections.namedtuple(
+    'IPv4Header',
+    ['version_ihl', 'tos', 'total_length', 'identification',
+     'flags_fragment', 'ttl', 'protocol', 'checksum', 'source',
+     'destination'])
+
+# See IETF RFC 793
+TCPHeader = collections.namedtuple(
+    'TCPHeader',
+    ['source_port', 'destination_port', 'sequence', 'acknowledgement',
+     'data_offset', 'flags', 'window', 'checksum', 'urgent'])
+
+
+class PcapngReader(object):
+    """
+    Reader of pcapng captures, which maps the file into memory rather than
+    reading it: blocks and packets are produced lazily, as memoryviews of
+    the mapping, so that the operating system pages the capture in (and
+    out) as it is scanned, and captures larger than memory can be read.
+
+    Views must be released (or dropped) before close(); until then, the
+    mapping stays open.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0,
+                                 access=mmap.ACCESS_READ)
+        except ValueError:  # an empty file
+            self.map = b''
+        self.view = memoryview(self.map)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.view.release()
+        try:
+            if isinstance(self.map, mmap.mmap):
+                self.map.close()
+        except BufferError:
+            pass  # views still in use: unmapped once they are dropped
+        self.file.close()
+
+    def blocks(self, start=0, stop=None, order=None):
+        """
+        Blocks of the capture, in order, with the byte order of their
+        section. Blocks are taken from ``start`` (the offset of a section
+        header block, unless the byte ``order`` of the section is given)
+        to the first that begins at or after ``stop``.
+        Yields ``(block, order)``, where ``order`` is '<' or '>'.
+        """
+        data = self.map
+        stop = len(data) if stop is None else min(stop, len(data))
+        offset = start
+        while offset < stop:
+            if offset + 12 > len(data):
+                raise ValueError('truncated block at {}'.format(offset))
+            if order is None or data[offset:offset + 4] == b'\n\r\r\n':
+                # Section header: its magic number gives the byte order
+                magic = data[offset + 8:offset + 12]
+                if magic == b'\x4d\x3c\x2b\x1a':
+                    order = '<'
+                elif magic == b'\x1a\x2b\x3c\x4d':
+                    order = '>'
+                else:
+                    raise ValueError(
+                        'no section header at {}'.format(offset))
+            header = BLOCK_STRUCTS[order][0]
+            block_type, length = header.unpack_from(data, offset)
+            if length < 12 or length % 4 or offset + length > len(data):
+                raise ValueError(
+                    'bad block length {} at {}'.format(length, offset))
+            yield (Block(block_type, offset,
+                         self.view[offset + 8:offset + length - 4]),
+                   order)
+            offset += length
+
+    def chunks(self, size):
+        """
+        Split the capture into Chunks of about ``size`` bytes, which can
+        be read independently (e.g. in parallel) with packets(chunk=...).
+        Only block headers are read.
+        """
+        start, interfaces = 0, []
+        for block, order in self.blocks():
+            if block.type == SECTION_HEADER:
+                if block.offset > start:
+                    yield Chunk(start, block.offset, order, interfaces)
+                start, interfaces = block.offset, []
+            elif block.type == INTERFACE_DESCRIPTION:
+                interfaces = interfaces + [block.offset]
+            elif block.offset - start >= size:
+                yield Chunk(start, block.offset, order, interfaces)
+                start = block.offset
+        if start < len(self.map):
+            yield Chunk(start, len(self.map), order, interfaces)
+
+    def packets(self, match=None, chunk=None):
+        """
+        Packets of the capture (or of one chunk of it), as Packet records,
+        with timestamps in seconds (None for simple packet blocks). If
+        given, ``match`` (see packet_filter) is applied to each packet's
+        IPv4 header, and packets it rejects are skipped without being
+        decoded further.
+        """
+        interfaces = []
+        start, stop, order = 0, None, None
+        if chunk is not None:
+            start, stop, order = chunk.start, chunk.stop, chunk.order
+            for offset in chunk.interfaces:
+                if offset < start:
+                    block, _ = next(self.blocks(offset, order=order))
+                    interfaces.append(
+                        _interface(block.body, BLOCK_STRUCTS[order]))
+        for block, order in self.blocks(start, stop, order):
+            structs = BLOCK_STRUCTS[order]
+            block_type = block.type
+            if block_type == ENHANCED_PACKET:
+                (interface, high, low, captured,
+                 original) = structs[2].unpack_from(block.body)
+                link = interfaces[interface]
+                data = block.body[20:20 + captured]
+                ticks = (high << 32) | low
+                timestamp = ticks / link.ticks_per_second + link.offset
+            elif block_type == SIMPLE_PACKET:
+                interface, link = 0, interfaces[0]
+                original, = structs[3].unpack_from(block.body)
+                captured = original
+                if link.snap_length:
+                    captured = min(original, link.snap_length)
+                data = block.body[4:4 + captured]
+                timestamp = None
+            elif block_type == INTERFACE_DESCRIPTION:
+                interfaces.append(_interface(block.body, structs))
+                continue
+            elif block_type == SECTION_HEADER:
+                interfaces = []  # interface numbers restart per section
+                continue
+            else:
+                continue
+
+            ip = ipv4_offset(data, link.link_type)
+            if match is not None and (ip is None or not match(data, ip)):
+                continue
+            yield Packet(interface, timestamp, original, data, ip)
+
+
+def _interface(body, structs):
+    """
+    Interface of an interface description block.
+    """
+    link_type, _, snap_length = structs[1].unpack_from(body)
+    ticks_per_second, offset = 10 ** 6, 0
+    position = 8
+    while position + 4 <= len(body):
+        code, length = structs[4].unpack_from(body, position)
+        value = body[position + 4:position + 4 + length]
+        if code == 0:  # opt_endofopt
+            break
+        if code == IF_TSRESOL and length >= 1:
+            resolution = value[0]
+            if resolution & 0x80:
+                ticks_per_second = 2 ** (resolution & 0x7f)
+            else:
+                ticks_per_second = 10 ** resolution
+        elif code == IF_TSOFFSET and length >= 8:
+            offset, = structs[5].unpack_from(value)
+        position += 4 + (length + 3) // 4 * 4
+    return Interface(link_type, snap_length, ticks_per_second, offset)
+
+
+def ipv4_offset(data, link_type):
+    """
+    Offset of the IPv4 header in a frame of the given link type, or None
+    if the frame does not carry IPv4.
+    """
+    if link_type == LINKTYPE_ETHERNET:
+        if len(data) < 34:
+            return None
+        ethertype, = ETHERTYPE_STRUCT.unpack_from(data, 12)
+        offset = 14
+        if ethertype == ETHERTYPE_VLAN:
+            ethertype, = ETHERTYPE_STRUCT.unpack_from(data, 16)
+            offset = 18
+        if ethertype != ETHERTYPE_IPV4:
+            return None
+    elif link_type == LINKTYPE_NULL:
+        # The address family is in the byte order of the capturing host
+        if bytes(data[:4]) not in (b'\x02\x00\x00\x00', b'\x00\x00\x00\x02'):
+            return None
+        offset = 4
+    elif link_type in (LINKTYPE_RAW, LINKTYPE_IPV4):
+        offset = 0
+    elif link_type == LINKTYPE_LINUX_SLL:
+        if len(data) < 16 or ETHERTYPE_STRUCT.unpack_from(data, 14)[0] != (
+                ETHERTYPE_IPV4):
+            return None
+        offset = 16
+    else:
+        return None
+    if len(data) < offset + 20 or data[offset] >> 4 != 4:
+        return None
+    return offset
+
+
+def ipv4_header(data, ip):
+    return IPv4Header._make(IPV4_STRUCT.unpack_from(data, ip))
+
+
+def transport_offset(data, ip):
+    """
+    Offset of the TCP/UDP/ICMP header after an IPv4 header, or None for
+    fragments other than the first (which carry no such header).
+    """
+    if IPV4_STRUCT.unpack_from(data, ip)[4] & 0x1fff:
+        return None
+    return ip + 4 * (data[ip] & 0x0f)
+
+
+def tcp_header(data, ip):
+    return TCPHeader._make(
+        TCP_STRUCT.unpack_from(data, transport_offset(data, ip)))
+
+
+def icmp_header(data, ip):
+    return ICMPMessage._make(
+        ICMP_STRUCT.unpack_from(data, transport_offset(data, ip)))
+
+
+def packet_filter(protocol=None, source=None, destination=None, host=None,
+                  source_port=None, destination_port=None, port=None,
+                  icmp_type=None):
+    """
+    Predicate ``match(data, ip)`` on the IPv4 packet at offset ``ip`` of a
+    frame, in the manner of a BPF program: e.g. the equivalent of
+    ``icmp and host 10.0.0.1`` is
+    ``packet_filter(protocol='icmp', host='10.0.0.1')``.
+
+    Every criterion given must hold. Each compiles to a comparison of
+    bytes at fixed offsets from the IPv4 or transport header, so that
+    packets are rejected without decoding their headers.
+    """
+    checks = []
+    if isinstance(protocol, str):
+        protocol = IPPROTO[protocol.lower()]
+    if protocol is not None:
+        checks.append(lambda data, ip: data[ip + 9] == protocol)
+    if source is not None:
+        source = socket.inet_aton(source)
+        checks.append(lambda data, ip: data[ip + 12:ip + 16] == source)
+    if destination is not None:
+        destination = socket.inet_aton(destination)
+        checks.append(
+            lambda data, ip: data[ip + 16:ip + 20] == destination)
+    if host is not None:
+        host = socket.inet_aton(host)
+        checks.append(lambda data, ip: (data[ip + 12:ip + 16] == host
+                                        or data[ip + 16:ip + 20] == host))
+
+    def ports(data, ip):
+        if data[ip + 9] not in (socket.IPPROTO_TCP, socket.IPPROTO_UDP):
+            return None
+        offset = transport_offset(data, ip)
+        if offset is None or len(data) < offset + 4:
+            return None
+        return PORTS_STRUCT.unpack_from(data, offset)
+
+    if source_port is not None:
+        checks.append(lambda data, ip: (ports(data, ip) or (None,))[0]
+                      == source_port)
+    if destination_port is not None:
+        checks.append(lambda data, ip: (ports(data, ip) or (None, None))[1]
+                      == destination_port)
+    if port is not None:
+        checks.append(lambda data, ip: port in (ports(data, ip) or ()))
+    if icmp_type is not None:
+        def icmp(data, ip):
+            if data[ip + 9] != socket.IPPROTO_ICMP:
+                return False
+            offset = transport_offset(data, ip)
+            return (offset is not None and offset < len(data)
+                    and data[offset] == icmp_type)
+        checks.append(icmp)
+
+    def match(data, ip):
+        for check in checks:
+            if not check(data, ip):
+                return False
+        return True
+    return match
+
+
+def verify_checksums(data, ip):
+    """
+    Whether the IPv4 header checksum and, for ICMP, the message checksum
+    of the packet at offset ``ip`` hold. Returns None for the latter if the
+    capture is truncated. NB: packets captured on the sending host may
+    carry unfilled checksums, computed later by the network card.
+    """
+    ihl = 4 * (data[ip] & 0x0f)
+    header_ok = internet_checksum(data[ip:ip + ihl]) == 0
+    if data[ip + 9] != socket.IPPROTO_ICMP:
+        return header_ok
+    total_length = IPV4_STRUCT.unpack_from(data, ip)[2]
+    if len(data) < ip + total_length:
+        return None if header_ok else False
+    return header_ok and internet_checksum(
+        data[ip + ihl:ip + total_length]) == 0
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description='List the IPv4 packets of a pcapng capture.')
+    parser.add_argument('capture')
+    parser.add_argument('-p', '--protocol', choices=sorted(IPPROTO))
+    parser.add_argument('--host')
+    parser.add_argument('--port', type=int)
+    parser.add_argument('--verify', action='store_true',
+                        help='check IPv4 and ICMP checksums')
+    args = parser.parse_args()
+
+    match = packet_filter(protocol=args.protocol, host=args.host,
+                          port=args.port)
+    with PcapngReader(args.capture) as reader:
+        for packet in reader.packets(match):
+            header = ipv4_header(packet.data, packet.ip)
+            line = '{:.6f} {} > {} proto {} length {}'.format(
+                packet.timestamp or 0.0,
+                socket.inet_ntoa(header.source),
+                socket.inet_ntoa(header.destination),
+                header.protocol, header.total_length)
+            if args.verify:
+                ok = verify_checksums(packet.data, packet.ip)
+                line += {True: '', False: ' [bad checksum]',
+                         None: ' [truncated]'}[ok]
+            print(line)
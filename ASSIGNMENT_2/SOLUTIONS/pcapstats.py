@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+import argparse
+import concurrent.futures
+import os
+import socket
+
+from pcapng import (ICMP_STRUCT, IPV4_STRUCT, PORTS_STRUCT, TCP_STRUCT,
+                    PcapngReader, icmp_header, transport_offset)
+from ping import ECHO_REPLY, ECHO_REQUEST, MILLISEC_PER_SEC, log_statistics
+from rttstats import RTTStatistics
+
+# Bytes of capture analysed by each task of the process pool
+CHUNK_SIZE = 64 << 20
+
+# TCP flags
+SYN = 0x02
+ACK = 0x10
+
+
+class Flow(object):
+    """
+    Totals of one TCP connection (both directions), and the instants of
+    its handshake: the first SYN, and the first SYN/ACK after it. A
+    SYN/ACK seen before any SYN is kept apart (``early_syn_ack``), for
+    merge() to pair with a SYN in an earlier part of the capture.
+    """
+
+    __slots__ = ('packets', 'bytes', 'first', 'last', 'syn', 'syn_ack',
+                 'early_syn_ack')
+
+    def __init__(self):
+        self.packets = 0
+        self.bytes = 0
+        self.first = self.last = self.syn = self.syn_ack = None
+        self.early_syn_ack = None
+
+    def add(self, timestamp, length, flags):
+        self.packets += 1
+        self.bytes += length
+        if timestamp is None:
+            return
+        if self.first is None:
+            self.first = timestamp
+        self.last = timestamp
+        if flags & (SYN | ACK) == SYN and self.syn is None:
+            self.syn = timestamp
+        elif flags & (SYN | ACK) == SYN | ACK:
+            if self.syn is None:
+                if self.early_syn_ack is None:
+                    self.early_syn_ack = timestamp
+            elif self.syn_ack is None:
+                self.syn_ack = timestamp
+
+    def merge(self, other):
+        """
+        Combine with the totals of a later part of the capture.
+        """
+        self.packets += other.packets
+        self.bytes += other.bytes
+        if self.first is None:
+            self.first = other.first
+        if other.last is not None:
+            self.last = other.last
+        if self.syn is None:
+            self.syn, self.syn_ack = other.syn, other.syn_ack
+            if self.early_syn_ack is None:
+                self.early_syn_ack = other.early_syn_ack
+        elif self.syn_ack is None:
+            # The other part's first SYN/ACK answers this part's SYN
+            if other.early_syn_ack is not None:
+                self.syn_ack = other.early_syn_ack
+            else:
+                self.syn_ack = other.syn_ack
+
+    @property
+    def handshake_rtt(self):
+        """
+        Milliseconds from the SYN to the SYN/ACK, if both were captured.
+        """
+        if self.syn is None or self.syn_ack is None:
+            return None
+        return (self.syn_ack - self.syn) * MILLISEC_PER_SEC
+
+
+class CaptureSummary(object):
+    """
+    Results of analysing (part of) a capture: a flow table, keyed by
+    ``(address, port, address, port)`` in the direction of the first packet
+    seen, and per-host statistics of ICMP echo round trips.
+
+    Echo requests and replies are paired as in ping.ping, on the host and
+    the identifier and sequence number of the echo. Those left unpaired
+    are kept, by key, for merge() to pair with the rest of the capture.
+    """
+
+    def __init__(self):
+        self.flows = {}
+        self.echoes = {}    # host -> RTTStatistics
+        self.requests = {}  # (host, identifier, sequence) -> timestamp
+        self.replies = {}   # (host, identifier, sequence) -> timestamp
+
+    def add_tcp(self, data, ip, timestamp, source, destination, length):
+        offset = transport_offset(data, ip)
+        if offset is None or len(data) < offset + TCP_STRUCT.size:
+            return
+        source_port, destination_port = PORTS_STRUCT.unpack_from(
+            data, offset)
+        flags = data[offset + 13]
+        key = (source, source_port, destination, destination_port)
+        flow = self.flows.get(key)
+        if flow is None:
+            reverse = (destination, destination_port, source, source_port)
+            flow = self.flows.get(reverse)
+            if flow is None:
+                flow = self.flows[key] = Flow()
+        flow.add(timestamp, length, flags)
+
+    def add_icmp(self, data, ip, timestamp, source, destination):
+        if timestamp is None:
+            return
+        header = icmp_header(data, ip)
+        if (header.type, header.code) == ECHO_REQUEST:
+            self.requests[(destination, header.identifier,
+                           header.sequence_number)] = timestamp
+        elif (header.type, header.code) == ECHO_REPLY:
+            key = (source, header.identifier, header.sequence_number)
+            sent = self.requests.pop(key, None)
+            if sent is None:
+                self.replies.setdefault(key, timestamp)
+            else:
+                self._echo(source, (timestamp - sent) * MILLISEC_PER_SEC)
+
+    def _echo(self, host, rtt):
+        statistics = self.echoes.get(host)
+        if statistics is None:
+            statistics = self.echoes[host] = RTTStatistics()
+        statistics.add(rtt)
+
+    def merge(self, other):
+        """
+        Combine with the summary of the part of the capture that follows.
+        """
+        for key, flow in other.flows.items():
+            reverse = (key[2], key[3], key[0], key[1])
+            if key in self.flows:
+                self.flows[key].merge(flow)
+            elif reverse in self.flows:
+                self.flows[reverse].merge(flow)
+            else:
+                self.flows[key] = flow
+
+        # Replies to requests in earlier parts of the capture
+        for key, timestamp in other.replies.items():
+            sent = self.requests.pop(key, None)
+            if sent is None:
+                self.replies.setdefault(key, timestamp)
+            else:
+                self._echo(key[0], (timestamp - sent) * MILLISEC_PER_SEC)
+        for host, statistics in other.echoes.items():
+            if host in self.echoes:
+                self.echoes[host].merge(statistics)
+            else:
+                self.echoes[host] = statistics
+        self.requests.update(other.requests)
+
+    def ping_statistics(self):
+        """
+        Per-host RTTStatistics of the echoes, as verbose_ping would have
+        reported them: requests never answered count as lost.
+        """
+        statistics = {}
+        for host, echoes in self.echoes.items():
+            statistics[host] = RTTStatistics()
+            statistics[host].merge(echoes)
+        for host, _, _ in self.requests:
+            statistics.setdefault(host, RTTStatistics()).lose()
+        return statistics
+
+
+def analyse_chunk(path, chunk=None):
+    """
+    CaptureSummary of one chunk of a capture (or of all of it).
+    """
+    summary = CaptureSummary()
+    with PcapngReader(path) as reader:
+        for packet in reader.packets(chunk=chunk):
+            data, ip = packet.data, packet.ip
+            if ip is None:
+                continue
+            (_, _, length, _, _, _, protocol, _,
+             source, destination) = IPV4_STRUCT.unpack_from(data, ip)
+            source = socket.inet_ntoa(source)
+            destination = socket.inet_ntoa(destination)
+            if protocol == socket.IPPROTO_TCP:
+                summary.add_tcp(data, ip, packet.timestamp, source,
+                                destination, length)
+            elif protocol == socket.IPPROTO_ICMP:
+                offset = transport_offset(data, ip)
+                if (offset is not None
+                        and len(data) >= offset + ICMP_STRUCT.size):
+                    summary.add_icmp(data, ip, packet.timestamp, source,
+                                     destination)
+    return summary
+
+
+def analyse(path, chunk_size=CHUNK_SIZE, max_workers=None):
+    """
+    CaptureSummary of a whole capture. The capture is split into chunks
+    of about ``chunk_size`` bytes, analysed in a pool of processes, and
+    their summaries merged in order.
+    """
+    with PcapngReader(path) as reader:
+        chunks = list(reader.chunks(chunk_size))
+    if len(chunks) <= 1 or max_workers == 1:
+        summary = CaptureSummary()
+        for chunk in chunks:
+            summary.merge(analyse_chunk(path, chunk))
+        return summary
+
+    summary = CaptureSummary()
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers or os.cpu_count()) as pool:
+        for part in pool.map(analyse_chunk, [path] * len(chunks), chunks):
+            summary.merge(part)
+    return summary
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description='TCP flows and ICMP echo statistics of a capture.')
+    parser.add_argument('capture')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help='bytes of capture per parallel task')
+    parser.add_argument('-j', '--workers', type=int, default=None)
+    parser.add_argument('-n', '--flows', type=int, default=20,
+                        help='number of flows to list (largest first)')
+    args = parser.parse_args()
+
+    summary = analyse(args.capture, args.chunk_size, args.workers)
+
+    print("{} TCP flows".format(len(summary.flows)))
+    flows = sorted(summary.flows.items(), key=lambda item: -item[1].bytes)
+    for (source, source_port, destination, destination_port), flow in (
+            flows[:args.flows]):
+        rtt = flow.handshake_rtt
+        print("\t{}:{} <-> {}:{}  packets {}  bytes {}  handshake {}".format(
+            source, source_port, destination, destination_port,
+            flow.packets, flow.bytes,
+            'n/a' if rtt is None else '{:.3f}ms'.format(rtt)))
+
+    for host, statistics in sorted(summary.ping_statistics().items()):
+        log_statistics(host, statistics.sent, statistics)
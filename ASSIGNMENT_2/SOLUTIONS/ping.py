@@ -6,7 +6,10 @@ import struct
 import time
 
 import collections
-from checksum import internet_checksum
+import functools
+from checksum import checksum_update, internet_checksum
+from rttstats import IntervalReporter, RTTStatistics
+from transport import LoopbackTransport, RawSocket
 
 assert 3 <= sys.version_info[0], 'Requires Python 3'
 
@@ -25,6 +28,16 @@ BUFFER_SIZE = 2 << 5
 ICMP_PORT_PLACEHOLDER = 1
 ICMP_HEADER_LENGTH = 28
 ICMP_STRUCT_FIELDS = "BBHHH"  # for use with struct.pack/unpack
+ICMP_PAYLOAD_LENGTH = 8  # a double-precision timestamp
+IP_HEADER_LENGTH = 20
+ICMP_SEQUENCE_OFFSET = 6  # sequence number, then payload, end the packet
+ECHO_DATAGRAM_LENGTH = IP_HEADER_LENGTH + 8 + ICMP_PAYLOAD_LENGTH
+
+# Precompiled for use with pack_into/unpack_from on reused buffers
+ICMP_STRUCT = struct.Struct(ICMP_STRUCT_FIELDS)
+CHECKSUM_STRUCT = struct.Struct('!H')
+SEQUENCE_STRUCT = struct.Struct('H')
+TIMESTAMP_STRUCT = struct.Struct('d')
 
 
 # Exception class to represent Checksum Errors
@@ -53,43 +66,77 @@ def this_instant():
     return time.perf_counter()
 
 
-def ping(client_socket, dest_host, client_id, seq_no=0):
+@functools.lru_cache(maxsize=None)
+def template_checksum(client_id):
     """
-   Sends echo request, receives response, and returns RTT.
+    Checksum of an echo request with zero sequence number and payload.
     """
+    template = struct.pack(ICMP_STRUCT_FIELDS, ECHO_REQUEST.type,
+                           ECHO_REQUEST.code, 0, client_id, 0)
+    return internet_checksum(template + bytes(ICMP_PAYLOAD_LENGTH))
 
-    def icmp_header(host_checksum):
-        message = ICMPMessage(
-                    type=ECHO_REQUEST.type,
-                    code=ECHO_REQUEST.code,
-                    checksum=socket.htons(host_checksum),
-                    identifier=client_id,
-                    sequence_number=seq_no)
-        return struct.pack(ICMP_STRUCT_FIELDS, *message)
 
-    #  Create payload for ICMP packet, being the time of its creation
-    icmp_payload = struct.pack('d', this_instant())  # double-precision float
-    #  Structure packet with checksum value initialised as zero
-    icmp_packet_without_checksum = icmp_header(0) + icmp_payload
-    #  Calculate checksum value to be used
-    checksum = internet_checksum(icmp_packet_without_checksum)
-    #  Create final packet to send, with checksum in header, and payload
-    icmp_packet = icmp_header(checksum) + icmp_payload
+class EchoRequestBuilder(object):
+    """
+    Echo request for one identifier, held in a preallocated buffer that is
+    rewritten in place for every probe: only the sequence number and
+    timestamp are packed, and the checksum is patched (RFC 1624).
+    """
 
-    #  Create variable of the IPv4 destination address, for future use
-    dest_host = socket.gethostbyname(dest_host)
+    def __init__(self, client_id):
+        self.packet = bytearray(8 + ICMP_PAYLOAD_LENGTH)
+        ICMP_STRUCT.pack_into(self.packet, 0, ECHO_REQUEST.type,
+                              ECHO_REQUEST.code, 0, client_id, 0)
+        self.variable = memoryview(self.packet)[ICMP_SEQUENCE_OFFSET:]
+        self.template = template_checksum(client_id)
+
+    def build(self, seq_no, timestamp=None):
+        """
+        The echo request with this sequence number, carrying the instant
+        of its creation. The buffer is reused by the next call.
+        """
+        if timestamp is None:
+            timestamp = this_instant()
+        SEQUENCE_STRUCT.pack_into(self.packet, ICMP_SEQUENCE_OFFSET, seq_no)
+        TIMESTAMP_STRUCT.pack_into(self.packet, 8, timestamp)
+        # The template holds zeros (summing to 0) in place of these fields
+        checksum = checksum_update(self.template, 0, self.variable)
+        CHECKSUM_STRUCT.pack_into(self.packet, 2, checksum)
+        return self.packet
+
+
+def echo_request(client_id, seq_no=0):
+    """
+    Serializes an echo request carrying the instant of its creation.
+    """
+    return bytes(EchoRequestBuilder(client_id).build(seq_no))
 
-    #  Send previously created ICMP packet, to dest host, via client socket
-    client_socket.sendto(icmp_packet, (dest_host, ICMP_PORT_PLACEHOLDER))
 
-    #  Blocking code, that waits for reply from the receiver of ICMP packet
-    datagram, address = client_socket.recvfrom(BUFFER_SIZE)
+def echo_header(datagram):
+    """
+    ICMP header of an IPv4 datagram, or None if it is too short to be an
+    echo reply to one of our requests (header and timestamp). Nothing is
+    validated, so that callers can discard other traffic cheaply.
+    """
+    if len(datagram) < ECHO_DATAGRAM_LENGTH:
+        return None
+    return ICMPMessage._make(
+        ICMP_STRUCT.unpack_from(datagram, IP_HEADER_LENGTH))
 
-    #  Store this_instant() at which datagram was received
-    time_recv = this_instant()
+
+def echo_reply(datagram, time_recv):
+    """
+    Validates and deserializes an IPv4 datagram carrying an echo reply,
+    and returns the RTT and ICMP header.
+    Callers should first check, with echo_header, that it answers them.
+    """
+
+    #  A datagram too short to carry our timestamp is not a valid reply
+    if len(datagram) < ECHO_DATAGRAM_LENGTH:
+        raise ChecksumError
 
     #  Strip IP header off of received datagram (to isolate ICMP packet)
-    icmp_packet = datagram[20:]
+    icmp_packet = memoryview(datagram)[IP_HEADER_LENGTH:]
 
     #  Use checksum to validate contents of ICMP packet
     checksum = internet_checksum(icmp_packet)
@@ -97,14 +144,11 @@ def ping(client_socket, dest_host, client_id, seq_no=0):
         raise ChecksumError
 
     #  Extract header information of response ICMP packet
-    icmp_header_response = ICMPMessage(
-        *struct.unpack(ICMP_STRUCT_FIELDS, icmp_packet[:8]))
-
-    #  Extract body of response of ICMP response packet
-    icmp_message_response = icmp_packet[8:]
+    icmp_header_response = ICMPMessage._make(
+        ICMP_STRUCT.unpack_from(icmp_packet))
 
     #  Unpack binary data to recover what time the packet was sent at
-    time_sent = struct.unpack('d', icmp_message_response)[0]
+    time_sent = TIMESTAMP_STRUCT.unpack_from(icmp_packet, 8)[0]
 
     #  Calculate round-trip time by finding the diff between time sent/received
     RTT = (time_recv - time_sent)*MILLISEC_PER_SEC
@@ -113,76 +157,164 @@ def ping(client_socket, dest_host, client_id, seq_no=0):
     return (RTT, icmp_header_response)
 
 
-def verbose_ping(host, timeout=2.0, count=4, log=print):
+def ping(client_socket, dest_host, client_id, seq_no=0,
+         builder=None, buffer=None):
+    """
+   Sends echo request, receives response, and returns RTT.
+    ``client_socket`` is a transport, such as a RawSocket. Callers sending
+    many probes should pass an IPv4 address, an EchoRequestBuilder and a
+    receive buffer (of BUFFER_SIZE bytes) to reuse across calls.
+    """
+    if builder is None:
+        builder = EchoRequestBuilder(client_id)
+    if buffer is None:
+        buffer = bytearray(BUFFER_SIZE)
+
+    #  Create variable of the IPv4 destination address, unless it is one
+    try:
+        socket.inet_aton(dest_host)
+    except OSError:
+        dest_host = client_socket.gethostbyname(dest_host)
+
+    #  Send ICMP packet, to dest host, via client socket
+    client_socket.sendto(builder.build(seq_no),
+                         (dest_host, ICMP_PORT_PLACEHOLDER))
+
+    #  One deadline for the whole probe, however much other traffic arrives
+    timeout = client_socket.gettimeout()
+    deadline = this_instant() + timeout if timeout else None
+
+    view = memoryview(buffer)
+    try:
+        while True:
+            if deadline is not None:
+                remaining = deadline - this_instant()
+                if remaining <= 0:
+                    raise socket.timeout('timed out')
+                client_socket.settimeout(remaining)
+
+            #  Blocking code, that waits for reply from the receiver of ICMP
+            #  packet
+            nbytes, address = client_socket.recvfrom_into(buffer)
+
+            #  Store this_instant() at which datagram was received
+            time_recv = this_instant()
+            datagram = view[:nbytes]
+
+            #  Skip other traffic on the socket before validating anything,
+            #  e.g. our own request (on the loopback interface), a late
+            #  reply to an earlier request, or another process's reply
+            header = echo_header(datagram)
+            if (header is None or header.type != ECHO_REPLY.type
+                    or header.identifier != client_id
+                    or header.sequence_number != seq_no):
+                continue
+
+            return echo_reply(datagram, time_recv)
+    finally:
+        if deadline is not None:
+            client_socket.settimeout(timeout)
+
+
+def verbose_ping(host, timeout=2.0, count=4, log=print, transport=RawSocket,
+                 resolver=None, report=None, interval=10.0):
     """
     Send ping and print session details to command prompt.
+    ``transport`` creates the socket-like object used for the session
+    (see module transport); ``resolver`` (e.g. a ResolverCache) resolves
+    the host in place of the transport. Statistics are kept in constant
+    memory, and passed to ``report`` every ``interval`` seconds as records
+    (see rttstats.IntervalReporter).
     """
     try:
-        host_ip = socket.gethostbyname(host)
+        client_socket = transport()
     except OSError as error:
-        log(error)
-        log('Could not find host {}.'.format(host))
-        log('Please check name and try again.')
+        log_os_error(error, log=log)
         return
 
-    # Log the host being contacted, and number of bytes being sent
-    log("Contacting {} with {} bytes of data ".format(host, 36))
+    with client_socket:
+        try:
+            host_ip = (resolver or client_socket).gethostbyname(host)
+        except OSError as error:
+            log(error)
+            log('Could not find host {}.'.format(host))
+            log('Please check name and try again.')
+            return
 
-    # Create set to hold round trip times of all packets sent
-    round_trip_times = []
+        # Log the host being contacted, and number of bytes being sent
+        log("Contacting {} with {} bytes of data ".format(host, 36))
 
-    for seq_no in range(count):
-        try:
-            #
-            with socket.socket(
-                    family=socket.AF_INET,
-                    type=socket.SOCK_RAW,  # <=="raw socket"
-                    proto=socket.getprotobyname('icmp')) as client_socket:
+        # Accumulate statistics of round trip times of all packets sent
+        reporter = IntervalReporter(report, interval)
 
-                # Set time-out duration (in seconds) on socket
-                client_socket.settimeout(timeout/MILLISEC_PER_SEC)
+        # Set time-out duration (in seconds) on socket
+        client_socket.settimeout(timeout/MILLISEC_PER_SEC)
 
-                client_id = os.getpid() & RIGHT_HEXTET
+        client_id = os.getpid() & RIGHT_HEXTET
 
+        # Reused by every probe
+        builder = EchoRequestBuilder(client_id)
+        buffer = bytearray(BUFFER_SIZE)
+
+        for seq_no in range(count):
+            try:
                 # Send ping to dest host, via client_socket, with header info
                 delay, response = ping(
                                 client_socket,
-                                host,
+                                host_ip,
                                 client_id=client_id,
-                                seq_no=seq_no)
+                                seq_no=seq_no,
+                                builder=builder,
+                                buffer=buffer)
 
-            # Print response info from destination host, and delay
-            log("Reply from {:s} in {}ms: {}".format(host_ip, delay, response))
+                # Print response info from destination host, and delay
+                log("Reply from {:s} in {}ms: {}".format(
+                    host_ip, delay, response))
 
-            # Add delay value to set of RTTs
-            round_trip_times.append(delay)
+                # Add delay value to statistics of RTTs
+                reporter.add(host, delay)
 
-        # Handle timeout error of socket, and print corresponding error message
-        except socket.timeout as ste:
-            log("Request timed out after {}ms".format(timeout))
+            # Handle timeout error of socket, and print error message
+            except socket.timeout as ste:
+                log("Request timed out after {}ms".format(timeout))
+                reporter.lose(host)
 
-        # Handle Checksum Error, and print message
-        except ChecksumError as cse:
-            log("Checksum Error: computed checksum error mismatch.")
+            # Handle Checksum Error, and print message
+            except ChecksumError as cse:
+                log("Checksum Error: computed checksum error mismatch.")
+                reporter.lose(host)
 
-        except OSError as error:
-            log("OS error: {}. Please check name.".format(error.strerror))
-            if isinstance(error, PermissionError):
-                # Display the likely explanation for
-                # TCP Socket Error Code "1 = Operation not permitted":
-                log("NB: On some sytems, ICMP messages can"
-                    " only be sent from processes running as root.")
-            break
+            except OSError as error:
+                log_os_error(error, log=log)
+                break
 
-    print('closing socket. woop woop')
-    client_socket.close()
+    statistics = reporter.close().get(host, RTTStatistics())
+    log_statistics(host_ip, count, statistics, log=log)
+
+
+def log_os_error(error, log=print):
+    """
+    Print the explanation of a socket error to command prompt.
+    """
+    log("OS error: {}. Please check name.".format(error.strerror))
+    if isinstance(error, PermissionError):
+        # Display the likely explanation for
+        # TCP Socket Error Code "1 = Operation not permitted":
+        log("NB: On some sytems, ICMP messages can"
+            " only be sent from processes running as root.")
+
+
+def log_statistics(host_ip, count, statistics, log=print):
+    """
+    Print the summary (RTTStatistics) of a ping session to command prompt.
+    """
 
     # Print ping header
     log("Ping statistics for {}:".format(host_ip))
 
     # Calculate relevant figures, to be printed
-    packets_lost = count - len(round_trip_times)
-    packets_recieved = len(round_trip_times)
+    packets_lost = count - statistics.received
+    packets_recieved = statistics.received
     percentage_loss = round((packets_lost/count)*100, 2)
 
     # Format/print all information
@@ -191,9 +323,9 @@ def verbose_ping(host, timeout=2.0, count=4, log=print):
 
     # Calculate/print RTT statistics
     if (packets_recieved > 0):
-        minRTT = round(min(round_trip_times))
-        maxRTT = round(max(round_trip_times))
-        avgRTT = round(sum(round_trip_times)/len(round_trip_times))
+        minRTT = round(statistics.minimum)
+        maxRTT = round(statistics.maximum)
+        avgRTT = round(statistics.mean)
         log("Approximate round trip times in milli-seconds:")
         log("\tMinimum = {}ms, Maximum = {}ms, Average = {}ms"
             .format(minRTT, maxRTT, avgRTT))
@@ -201,6 +333,7 @@ def verbose_ping(host, timeout=2.0, count=4, log=print):
 
 if __name__ == '__main__':
     import argparse
+    import contextlib
     parser = argparse.ArgumentParser(description='Test a host.')
     parser.add_argument('-w', '--timeout',
                         metavar='timeout',
@@ -217,7 +350,61 @@ if __name__ == '__main__':
                         type=str,
                         nargs='+',
                         help='URL or IPv4 address of target host(s)')
+    parser.add_argument('-r', '--rate',
+                        metavar='probes',
+                        type=float,
+                        help='Probe all hosts concurrently, sending this'
+                             ' many echo requests per second (0: as many'
+                             ' as possible)')
+    parser.add_argument('--loopback',
+                        action='store_true',
+                        help='Answer echo requests in-process, without'
+                             ' sending them (for testing)')
+    parser.add_argument('--hosts-file',
+                        metavar='path',
+                        help='Resolve names listed in this file (in the'
+                             ' format of /etc/hosts) without DNS')
+    parser.add_argument('--records',
+                        metavar='path',
+                        help='Append periodic statistics to this file'
+                             " ('-' for standard output)")
+    parser.add_argument('--format',
+                        choices=['json', 'csv'],
+                        default='json',
+                        help='Format of records: JSON lines or CSV')
+    parser.add_argument('--interval',
+                        metavar='seconds',
+                        type=float,
+                        default=10.0,
+                        help='Period of records (seconds)')
     args = parser.parse_args()
-
-    for host in args.hosts:
-        verbose_ping(host, timeout=args.timeout, count=args.count)
+    transport = LoopbackTransport if args.loopback else RawSocket
+
+    # Resolve every host concurrently, once, before any probe is sent
+    from resolver import ResolverCache
+    resolver = ResolverCache(
+        hosts_file=args.hosts_file,
+        resolve=(LoopbackTransport().gethostbyname if args.loopback
+                 else socket.gethostbyname))
+    resolver.resolve_all(args.hosts)
+
+    with contextlib.ExitStack() as stack:
+        report = None
+        if args.records is not None:
+            from rttstats import record_writer
+            records = (sys.stdout if args.records == '-'
+                       else stack.enter_context(
+                           open(args.records, 'a', newline='')))
+            report = record_writer(records, format=args.format)
+
+        if args.rate is not None:
+            from multiping import verbose_multi_ping
+            verbose_multi_ping(args.hosts, timeout=args.timeout,
+                               count=args.count, rate=args.rate,
+                               transport=transport, resolver=resolver,
+                               report=report, interval=args.interval)
+        else:
+            for host in args.hosts:
+                verbose_ping(host, timeout=args.timeout, count=args.count,
+                             transport=transport, resolver=resolver,
+                             report=report, interval=args.interval)
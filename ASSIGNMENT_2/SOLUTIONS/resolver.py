@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import collections
+import concurrent.futures
+import copy
+import socket
+import threading
+import time
+
+# Seconds for which a resolved address is reused
+DEFAULT_TTL = 300.0
+
+# Seconds for which a failed lookup is remembered, and not retried
+DEFAULT_NEGATIVE_TTL = 10.0
+
+
+class ResolverCache(object):
+    """
+    Caching stand-in for socket.gethostbyname.
+
+    Addresses returned by ``resolve`` are kept for ``ttl`` seconds, and
+    the least recently used are evicted beyond ``maxsize`` entries.
+    Failures (the OSError raised) are kept for ``negative_ttl`` seconds,
+    so that a host that could not be resolved is not looked up again
+    straight away; each hit raises a fresh copy of the error.
+    Entries of a hosts file (in the format of /etc/hosts) take precedence
+    and never expire, so a file can stand in for DNS altogether.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, maxsize=4096, hosts_file=None,
+                 resolve=socket.gethostbyname,
+                 negative_ttl=DEFAULT_NEGATIVE_TTL, clock=time.monotonic):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.maxsize = maxsize
+        self.resolve = resolve
+        self.clock = clock
+        self.static = {}
+        # host -> (address or OSError, without a traceback; expiry)
+        self.cache = collections.OrderedDict()
+        self.lock = threading.Lock()
+        if hosts_file is not None:
+            self.load_hosts(hosts_file)
+
+    def load_hosts(self, path):
+        """
+        Add the IPv4 entries of a hosts file.
+        """
+        with open(path) as lines:
+            for line in lines:
+                fields = line.split('#', 1)[0].split()
+                if len(fields) < 2:
+                    continue
+                try:
+                    socket.inet_aton(fields[0])
+                except OSError:
+                    continue  # e.g. an IPv6 entry
+                for name in fields[1:]:
+                    self.static.setdefault(name, fields[0])
+
+    def gethostbyname(self, host):
+        if host in self.static:
+            return self.static[host]
+
+        now = self.clock()
+        with self.lock:
+            entry = self.cache.get(host)
+            if entry is not None and entry[1] > now:
+                self.cache.move_to_end(host)
+                if isinstance(entry[0], OSError):
+                    # A copy, so that the cached error gathers no traceback
+                    raise copy.copy(entry[0])
+                return entry[0]
+
+        # Resolve outside the lock, so that lookups proceed concurrently
+        try:
+            address = self.resolve(host)
+        except OSError as error:
+            self._store(host, copy.copy(error).with_traceback(None),
+                        now + self.negative_ttl)
+            raise
+        self._store(host, address, now + self.ttl)
+        return address
+
+    def _store(self, host, value, expiry):
+        with self.lock:
+            self.cache[host] = (value, expiry)
+            self.cache.move_to_end(host)
+            while len(self.cache) > self.maxsize:
+                self.cache.popitem(last=False)
+
+    def resolve_all(self, hosts, max_workers=32):
+        """
+        Resolve many hosts concurrently, in a thread pool.
+
+        Returns a dict mapping each host to its address or, if it could
+        not be resolved, to the OSError raised.
+        """
+
+        def lookup(host):
+            try:
+                return self.gethostbyname(host)
+            except OSError as error:
+                return error
+
+        hosts = list(dict.fromkeys(hosts))  # unique, in order
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=max(1, min(max_workers, len(hosts)))) as pool:
+            return dict(zip(hosts, pool.map(lookup, hosts)))
@@ -1,84 +1,342 @@
 # -*- coding: utf-8 -*-
 
+import array
+import concurrent.futures
+import heapq
+import itertools
 import math
+import operator
+import zlib
+from multiprocessing import shared_memory
 
+from csr import CSRGraph
 
-def dijkstra_predecessor_and_distance(graph, source, weight='cost'):
+
+# Relative difference below which two distances count as equal, so that
+# float costs summed in different orders still tie
+TOLERANCE = 1e-9
+
+
+def dijkstra_predecessor_and_distance(graph, source, weight='cost',
+                                      targets=None, tolerance=TOLERANCE):
     """
     Shortest paths via Dijkstra's algorithm,
     consistent with pseudocode on Slide 5-14.
     """
-    import math
+    return dijkstra_generalized(graph, source, weight=weight, targets=targets,
+                                tolerance=tolerance)
 
-    # Definitions consistent with Kurose & Ross
-    u = source
 
-    def c(x, y):
-        return graph[x][y][weight]
-    N = frozenset(graph.nodes())
-    NPrime = {u}  # i.e. "set([u])"
-    D = dict.fromkeys(N, math.inf)
-    P = {}  # create predecessor dictionary, to return
+def _first_hops(predecessor, source):
+    """
+    First hop on the path from the source to each node of a predecessor map.
+    """
 
-    # Initialization
-    for v in N:
-        P[v] = []
-        if graph.has_edge(u, v):
-            D[v] = c(u, v)
-            P[v] = [u]  # add coresponding predecessor
+    # Maps each node to its first hop (None: source or unreachable node)
+    hop = {}
 
-    D[u] = 0  # over-write inf entry for source
+    for destination in predecessor:
+        # Follow predecessors until a node with a known first hop is found
+        path = []
+        node = destination
+        while node not in hop:
+            path.append(node)
+            parents = predecessor[node]
+            if node == source or not parents:
+                hop[node] = None
+                break
+            if parents[0] == source:
+                hop[node] = node
+                break
+            node = parents[0]
 
-    # Loop
-    while NPrime != N:
-        candidates = {w: D[w] for w in N if w not in NPrime}
-        w, Dw = min(candidates.items(), key=lambda item: item[1])
-        NPrime.add(w)
+        # Every node visited along the way shares that first hop
+        first = hop[node]
+        for node in path:
+            hop[node] = first
 
-        for v in graph[w]:
-            if v not in NPrime:
-                DvNew = D[w] + c(w, v)
-                if DvNew < D[v]:
-                    D[v] = DvNew
-                    # add node and its predecessor to predecessor dictionary
-                    P[v] = [w]
-    return P, D
+    return hop
 
 
 def predecessor_to_forwarding(predecessor, source):
     """
     Compute a forwarding table from a predecessor list.
+
+    First hops are memoised, so each node's predecessor chain is followed
+    only as far as the first node already resolved. Unreachable nodes
+    (those with empty predecessor lists) are omitted.
     """
+    hop = _first_hops(predecessor, source)
 
     # Create variable to return (forwarding-table dictionary)
     FT = {}
+    for key in predecessor:
+        if hop[key] is not None:
+            FT[key] = (source, hop[key])
+    return FT
+
+
+def predecessor_to_forwarding_array(predecessor, source, nodes=None):
+    """
+    Compact forwarding table for large graphs.
+
+    Returns ``(nodes, next_hop)``, where ``next_hop[i]`` is the index in
+    ``nodes`` of the first hop towards ``nodes[i]``, or -1 for the source
+    and unreachable nodes. By default, nodes are ordered as in the
+    predecessor map.
+    """
+    if nodes is None:
+        nodes = list(predecessor)
+    index = {v: i for i, v in enumerate(nodes)}
+    hop = _first_hops(predecessor, source)
+
+    next_hop = array.array('i', [-1]) * len(nodes)
+    for i, v in enumerate(nodes):
+        if hop[v] is not None:
+            next_hop[i] = index[hop[v]]
+    return nodes, next_hop
+
+
+def _first_hop_counts(predecessor, source):
+    """
+    Number of paths from the source to each node of a predecessor map
+    (with predecessor sets, as on ties), by first hop: dicts ordered as
+    the predecessors, or None for the source and unreachable nodes.
+    """
+    counts = {}
+
+    for destination in predecessor:
+        # Depth-first, so that predecessors are resolved before successors
+        stack = [destination]
+        while stack:
+            node = stack[-1]
+            if node in counts:
+                stack.pop()
+                continue
+            parents = predecessor[node]
+            if node == source or not parents:
+                counts[node] = None
+                stack.pop()
+                continue
+            pending = [p for p in parents if p != source and p not in counts]
+            if pending:
+                stack.extend(pending)
+                continue
+            stack.pop()
+
+            total = {}
+            for parent in parents:
+                if parent == source:
+                    total[node] = total.get(node, 0) + 1
+                elif counts[parent] is not None:
+                    for hop, paths in counts[parent].items():
+                        total[hop] = total.get(hop, 0) + paths
+            counts[node] = total or None
+
+    return counts
+
+
+def predecessor_to_ecmp_forwarding(predecessor, source):
+    """
+    Compute an equal-cost multipath (ECMP) forwarding table from a
+    predecessor map with predecessor sets, as returned by
+    dijkstra_generalized.
+
+    Each destination maps to ``(source, hops)``, where ``hops`` maps every
+    first hop on a least-cost path to the number of such paths through it;
+    the first is the hop of predecessor_to_forwarding. Unreachable nodes
+    are omitted.
+    """
+    counts = _first_hop_counts(predecessor, source)
+    return {v: (source, counts[v]) for v in predecessor
+            if counts[v] is not None}
+
+
+def _flow_hash(flow):
+    """
+    Hash of a flow identifier (e.g. a 5-tuple) that, unlike hash(), is the
+    same in every process.
+    """
+    if not isinstance(flow, (bytes, bytearray, memoryview)):
+        flow = repr(flow).encode()
+    return zlib.crc32(flow)
+
+
+def ecmp_next_hop(entry, flow, weighted=True):
+    """
+    Next hop for a flow, from an entry of predecessor_to_ecmp_forwarding.
+
+    Hashing the flow identifier keeps each flow on one path, so that its
+    packets are not reordered, while spreading flows over the first hops:
+    in proportion to their numbers of least-cost paths if ``weighted``,
+    or else evenly.
+    """
+    _, hops = entry
+    bucket = _flow_hash(flow)
+    if not weighted:
+        return list(hops)[bucket % len(hops)]
+    bucket %= sum(hops.values())
+    for hop, paths in hops.items():
+        if bucket < paths:
+            return hop
+        bucket -= paths
+
+
+def _close(a, b, tolerance):
+    """
+    Whether two distances are equal, up to a relative tolerance.
+    """
+    return a == b or (tolerance > 0 and math.isclose(a, b, rel_tol=tolerance))
+
+
+def _heap_key(less):
+    """
+    Wrap distances so that heapq orders them by ``less``.
+    """
+
+    # The built-in ordering already agrees with the default semiring
+    if less is operator.lt:
+        return None
+
+    class Key(object):
+        __slots__ = ('value',)
+
+        def __init__(self, value):
+            self.value = value
+
+        def __lt__(self, other):
+            return less(self.value, other.value)
 
-    # Loop over all nodes that AREN'T the source
-    for (key, value) in predecessor.items():
-        if (key != source):
-            # Add all node pairs, where the immediate predecessor is the source
-            if (value[0] == source):
-                FT[key] = (value[0], key)
-            # If immediate predecessor is not source, follow predecessors
-            # until source is found, and isolate that link, to add to the dict
+    return Key
+
+
+def _dijkstra_csr(graph, s, infinity=math.inf,
+                  plus=operator.add,
+                  less=operator.lt,
+                  sourcedist=0,
+                  targets=None,
+                  multipath=False,
+                  tolerance=TOLERANCE):
+    """
+    dijkstra_generalized on the integer node ids of a CSRGraph.
+
+    Returns lists ``(P, D)`` indexed by node id, where ``P[v]`` is the id
+    of the predecessor of node ``v`` (-1 if there is none), or, if
+    ``multipath``, the list of ids of its predecessors on all least-cost
+    paths.
+    """
+    offsets = graph.offsets
+    neighbours = graph.neighbours
+    weights = graph.weights
+    n = len(graph.labels)
+    NPrime = bytearray(n)  # NPrime[v] == 1 once node v is settled
+    NPrime[s] = 1
+    D = [infinity] * n
+    P = [-1] * n
+    ties = {} if multipath else None  # further predecessors, by node id
+    if not multipath:
+        tolerance = 0
+
+    key = _heap_key(less)
+    counter = itertools.count()
+    queue = []
+
+    # Initialization
+    for k in range(offsets[s], offsets[s + 1]):
+        v = neighbours[k]
+        D[v] = weights[k]
+        P[v] = s
+        if v != s:
+            entry = D[v] if key is None else key(D[v])
+            heapq.heappush(queue, (entry, next(counter), v))
+    D[s] = sourcedist
+
+    remaining = None if targets is None else set(targets) - {s}
+    if remaining is not None and not remaining:
+        return _predecessor_sets(P, ties), D
+
+    # Loop, specialised for the (common) least-cost semiring
+    fast = key is None and plus is operator.add
+    while queue:
+        _, _, w = heapq.heappop(queue)
+        if NPrime[w]:
+            continue  # stale entry
+        NPrime[w] = 1
+
+        if remaining is not None:
+            remaining.discard(w)
+            if not remaining:
+                break
+
+        Dw = D[w]
+        for k in range(offsets[w], offsets[w + 1]):
+            v = neighbours[k]
+            if NPrime[v]:
+                continue
+            if fast:
+                DvNew = Dw + weights[k]
+                Dv = D[v]
+                if ties is not None and _close(DvNew, Dv, tolerance):
+                    ties.setdefault(v, []).append(w)
+                elif DvNew < Dv:
+                    D[v] = DvNew
+                    P[v] = w
+                    if ties is not None:
+                        ties.pop(v, None)
+                    heapq.heappush(queue, (DvNew, next(counter), v))
             else:
-                newKey = key
-                newValue = value[0]
-                while (newValue != source):
-                    newKey = newValue
-                    newValue = predecessor[newKey][0]
-                FT[key] = (newValue, newKey)
-    return FT
+                DvNew = plus(Dw, weights[k])
+                tie = ties is not None and DvNew != infinity and _close(
+                    DvNew, D[v], tolerance)
+                if tie:
+                    ties.setdefault(v, []).append(w)
+                elif less(DvNew, D[v]):
+                    D[v] = DvNew
+                    P[v] = w
+                    if ties is not None:
+                        ties.pop(v, None)
+                    entry = DvNew if key is None else key(DvNew)
+                    heapq.heappush(queue, (entry, next(counter), v))
+    return _predecessor_sets(P, ties), D
+
+
+def _predecessor_sets(P, ties):
+    """
+    Merge the ties found by _dijkstra_csr into its predecessor list.
+    """
+    if ties is None:
+        return P
+    return [[] if p < 0 else [p] + ties.get(v, [])
+            for v, p in enumerate(P)]
 
 
 def dijkstra_generalized(graph, source, weight='cost',
                          infinity=math.inf,
-                         plus=lambda x, y: x + y,
-                         less=lambda x, y: x < y,
+                         plus=operator.add,
+                         less=operator.lt,
                          min=min,
-                         sourcedist=0):  # this is a suitable default
+                         sourcedist=0,  # this is a suitable default
+                         targets=None,
+                         multipath=True,
+                         tolerance=TOLERANCE):
     """
     Least-cost or widest paths via Dijkstra's algorithm.
+
+    ``graph`` is a NetworkX graph or a CSRGraph snapshot of one.
+
+    Unsettled nodes are kept in a binary heap (``heapq``) ordered by
+    ``less``; an improved distance is pushed as a new entry and outdated
+    entries are skipped when popped ("lazy decrease-key"). The heap takes
+    the role of ``min``, which is retained for compatibility and must
+    agree with ``less``.
+
+    If ``targets`` is given, the search stops once every target has been
+    settled; distances to the remaining nodes are then only upper bounds.
+
+    As in NetworkX, ``P[v]`` lists the predecessors of ``v`` on all
+    least-cost paths (in the order found), distances within a relative
+    ``tolerance`` counting as equal; with ``multipath=False``, only the
+    first is kept.
     """
 
     # WPP: for the widest path problem the parameters should be as follows:
@@ -93,35 +351,190 @@ def dijkstra_generalized(graph, source, weight='cost',
     # less= lambda x, y : x < y
     # min = min
 
+    # Array-backed snapshots have a dedicated engine
+    if isinstance(graph, CSRGraph):
+        if weight != graph.weight:
+            raise ValueError('CSRGraph holds {!r}, not {!r}'.format(
+                graph.weight, weight))
+        index = graph.index
+        P, D = _dijkstra_csr(
+            graph, index[source], infinity=infinity, plus=plus, less=less,
+            sourcedist=sourcedist,
+            targets=None if targets is None else [index[t] for t in targets],
+            multipath=multipath, tolerance=tolerance)
+        labels = graph.labels
+        if not multipath:
+            P = [[] if p < 0 else [p] for p in P]
+        return ({v: [labels[p] for p in parents]
+                 for v, parents in zip(labels, P)},
+                dict(zip(labels, D)))
+
     # Definitions consistent with Kurose & Ross
     u = source
-
-    def c(x, y):
-        return graph[x][y][weight]
-    N = frozenset(graph.nodes())  # creates set of nodes from graph
+    N = graph.nodes()
     NPrime = {u}  # i.e. "set([u])"
     D = dict.fromkeys(N, infinity)  # sets all weights to infinity initially
-    P = {}  # create predecessor dictionary, to return
+    P = {v: [] for v in N}  # create predecessor dictionary, to return
+
+    # Priority queue of (distance, tie-breaker, node) entries
+    key = _heap_key(less)
+    counter = itertools.count()
+    queue = []
 
     # Initialization
-    for v in N:
-        P[v] = []
-        if graph.has_edge(u, v):  # checks if a node is connected to the source
-            D[v] = c(u, v)
-            P[v] = [u]  # add predecessor of node, to pred dict
+    for v, attributes in graph[u].items():  # nodes connected to the source
+        D[v] = attributes[weight]
+        P[v] = [u]  # add predecessor of node, to pred dict
+        if v != u:
+            entry = D[v] if key is None else key(D[v])
+            heapq.heappush(queue, (entry, next(counter), v))
     D[u] = sourcedist  # over-write inf entry for source
 
+    # Targets that have yet to be settled, if any were requested
+    remaining = None if targets is None else set(targets) - NPrime
+    if remaining is not None and not remaining:
+        return P, D
+
     # Loop
-    while NPrime != N:
-        candidates = {w: D[w] for w in N if w not in NPrime}
-        w, Dw = min(candidates.items(), key=lambda item: item[1])
+    while queue:
+        _, _, w = heapq.heappop(queue)
+        if w in NPrime:
+            continue  # stale entry: w was settled via a better distance
         NPrime.add(w)
 
-        for v in graph[w]:
+        # Early exit once every requested target has been settled
+        if remaining is not None:
+            remaining.discard(w)
+            if not remaining:
+                break
+
+        Dw = D[w]
+        for v, attributes in graph[w].items():
             if v not in NPrime:
-                DvNew = plus(D[w], c(w, v))
-                if less(DvNew, D[v]):
+                DvNew = plus(Dw, attributes[weight])
+                if (multipath and DvNew != infinity
+                        and _close(DvNew, D[v], tolerance)):
+                    # another least-cost path: keep both predecessors
+                    P[v].append(w)
+                elif less(DvNew, D[v]):
                     D[v] = DvNew
                     # add node and its predecessor to the predecessor dict
                     P[v] = [w]
+                    entry = DvNew if key is None else key(DvNew)
+                    heapq.heappush(queue, (entry, next(counter), v))
     return P, D
+
+
+def _first_hop_ids(P, s):
+    """
+    _first_hops for a predecessor list of node ids, as returned by
+    _dijkstra_csr; -1 marks the source and unreachable nodes.
+    """
+    hop = [None] * len(P)
+    hop[s] = -1
+
+    for destination in range(len(P)):
+        path = []
+        node = destination
+        while hop[node] is None:
+            path.append(node)
+            parent = P[node]
+            if parent < 0:
+                hop[node] = -1
+                break
+            if parent == s:
+                hop[node] = node
+                break
+            node = parent
+
+        first = hop[node]
+        for node in path:
+            hop[node] = first
+
+    return hop
+
+
+# Snapshot shared by the tasks of each worker process
+_worker_graph = None
+
+
+def _attach_worker(name, layout, labels, weight):
+    """
+    Process-pool initializer: view the shared CSR arrays without copying.
+    """
+    global _worker_graph
+    shm = shared_memory.SharedMemory(name=name)
+
+    views = []
+    for typecode, start, stop in layout:
+        views.append(shm.buf[start:stop].cast(typecode))
+    offsets, neighbours, weights = views
+
+    index = {v: i for i, v in enumerate(labels)}
+    _worker_graph = (shm, CSRGraph(
+        labels, index, offsets, neighbours, weights, weight))
+
+
+def _forwarding_tables(sources):
+    """
+    Process-pool task: forwarding tables for a batch of source ids.
+    """
+    _, graph = _worker_graph
+    labels = graph.labels
+    tables = []
+    for s in sources:
+        P, _ = _dijkstra_csr(graph, s)
+        hop = _first_hop_ids(P, s)
+        tables.append((labels[s], {
+            labels[v]: (labels[s], labels[h])
+            for v, h in enumerate(hop) if h >= 0}))
+    return tables
+
+
+def all_forwarding_tables(graph, weight='cost', sources=None,
+                          max_workers=None, chunksize=16):
+    """
+    Forwarding tables for every source, computed in a process pool.
+
+    The graph is copied once into shared memory as a CSRGraph; workers
+    map it on start-up and receive only batches of ``chunksize`` sources.
+    Pairs ``(source, table)`` are yielded as soon as each batch completes,
+    so their order is unspecified.
+    """
+    if not isinstance(graph, CSRGraph):
+        graph = CSRGraph.from_graph(graph, weight=weight)
+    elif weight != graph.weight:
+        raise ValueError('CSRGraph holds {!r}, not {!r}'.format(
+            graph.weight, weight))
+
+    if sources is None:
+        ids = range(len(graph.labels))
+    else:
+        ids = [graph.index[source] for source in sources]
+
+    # Lay the three arrays out back to back in one shared block
+    arrays = (graph.offsets, graph.neighbours, graph.weights)
+    layout = []
+    size = 0
+    for a in arrays:
+        layout.append((a.typecode, size, size + len(a) * a.itemsize))
+        size += len(a) * a.itemsize
+
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    try:
+        for a, (_, start, stop) in zip(arrays, layout):
+            shm.buf[start:stop] = a.tobytes()
+
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=max_workers,
+                initializer=_attach_worker,
+                initargs=(shm.name, layout, graph.labels, graph.weight)
+                ) as executor:
+            futures = [
+                executor.submit(_forwarding_tables, ids[i:i + chunksize])
+                for i in range(0, len(ids), chunksize)]
+            for future in concurrent.futures.as_completed(futures):
+                yield from future.result()
+    finally:
+        shm.close()
+        shm.unlink()
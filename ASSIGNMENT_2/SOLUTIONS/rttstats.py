@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+import collections
+import csv
+import json
+import math
+import time
+
+# Round-trip times (milliseconds) at or below which buckets are merged
+MIN_RTT = 1e-6
+
+# Fields of the records passed to IntervalReporter's report function
+RECORD_FIELDS = ['time', 'host', 'sent', 'received', 'lost', 'loss',
+                 'minimum', 'maximum', 'mean', 'stdev', 'jitter',
+                 'p50', 'p99']
+
+
+class QuantileSketch(object):
+    """
+    Mergeable quantile sketch with bounded relative error: values are
+    counted in logarithmically-sized buckets, so that any quantile is
+    estimated to within ``relative_accuracy`` of a value of that rank.
+    Memory grows with the logarithm of the range of values, not their
+    number, and sketches with equal accuracy merge by adding counts.
+    Estimates are clamped to the range of the values seen, which a
+    bucket's midpoint may otherwise overshoot.
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = collections.Counter()
+        self.zeros = 0  # values of at most MIN_RTT
+        self.count = 0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+
+    def add(self, value):
+        if value <= MIN_RTT:
+            self.zeros += 1
+        else:
+            self.buckets[math.ceil(math.log(value) / self.log_gamma)] += 1
+        self.count += 1
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+
+    def merge(self, other):
+        if other.gamma != self.gamma:
+            raise ValueError('sketches differ in accuracy')
+        self.buckets.update(other.buckets)
+        self.zeros += other.zeros
+        self.count += other.count
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+
+    def quantile(self, q):
+        if self.count == 0:
+            return math.nan
+        return min(max(self._estimate(q), self.minimum), self.maximum)
+
+    def _estimate(self, q):
+        rank = max(0, math.ceil(q * self.count) - 1)  # nearest rank
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                # Bucket (gamma^(i-1), gamma^i], up to the relative error
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+class RTTStatistics(object):
+    """
+    Constant-memory statistics of a stream of round-trip times: extremes,
+    mean and variance (Welford's algorithm), jitter (the smoothed mean
+    difference between consecutive RTTs, as in RFC 3550) and quantiles.
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        self.sent = 0
+        self.received = 0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.mean = 0.0
+        self.m2 = 0.0  # sum of squared differences from the mean
+        self.jitter = 0.0
+        self.previous = None
+        self.sketch = QuantileSketch(relative_accuracy)
+
+    def add(self, rtt):
+        """
+        Count a reply received after ``rtt`` milliseconds.
+        """
+        self.sent += 1
+        self.received += 1
+        self.minimum = min(self.minimum, rtt)
+        self.maximum = max(self.maximum, rtt)
+        delta = rtt - self.mean
+        self.mean += delta / self.received
+        self.m2 += delta * (rtt - self.mean)
+        if self.previous is not None:
+            self.jitter += (abs(rtt - self.previous) - self.jitter) / 16
+        self.previous = rtt
+        self.sketch.add(rtt)
+
+    def lose(self):
+        """
+        Count a request that got no (valid) reply.
+        """
+        self.sent += 1
+
+    def merge(self, other):
+        """
+        Combine with the statistics of another (e.g. later) stream.
+        """
+        n = self.received + other.received
+        if other.received:
+            delta = other.mean - self.mean
+            self.mean += delta * other.received / n
+            self.m2 += (other.m2
+                        + delta ** 2 * self.received * other.received / n)
+            # Jitter does not merge exactly: weight by number of replies
+            self.jitter = (self.jitter * self.received
+                           + other.jitter * other.received) / n
+            self.previous = other.previous
+        self.sent += other.sent
+        self.received = n
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        self.sketch.merge(other.sketch)
+
+    @property
+    def variance(self):
+        if self.received < 2:
+            return 0.0
+        return self.m2 / (self.received - 1)
+
+    def quantile(self, q):
+        return self.sketch.quantile(q)
+
+    def record(self):
+        """
+        Summary as a dict of numbers (None where there were no replies).
+        """
+        received = self.received > 0
+        return {
+            'sent': self.sent,
+            'received': self.received,
+            'lost': self.sent - self.received,
+            'loss': (round(100 * (self.sent - self.received) / self.sent, 2)
+                     if self.sent else None),
+            'minimum': self.minimum if received else None,
+            'maximum': self.maximum if received else None,
+            'mean': self.mean if received else None,
+            'stdev': math.sqrt(self.variance) if received else None,
+            'jitter': self.jitter if received else None,
+            'p50': self.quantile(0.5) if received else None,
+            'p99': self.quantile(0.99) if received else None,
+        }
+
+
+class IntervalReporter(object):
+    """
+    RTTStatistics per host, over consecutive intervals of ``interval``
+    seconds. As each interval ends, its record is passed to ``report``
+    (if given) and merged into the host's totals.
+    """
+
+    def __init__(self, report=None, interval=10.0):
+        self.report = report
+        self.interval = interval
+        self.current = {}
+        self.totals = {}
+        self.deadline = time.monotonic() + interval
+
+    def add(self, host, rtt):
+        self.tick()
+        self.current.setdefault(host, RTTStatistics()).add(rtt)
+
+    def lose(self, host):
+        self.tick()
+        self.current.setdefault(host, RTTStatistics()).lose()
+
+    def tick(self):
+        now = time.monotonic()
+        if now >= self.deadline:
+            self.flush()
+            while self.deadline <= now:
+                self.deadline += self.interval
+
+    def flush(self):
+        for host, statistics in self.current.items():
+            if self.report is not None:
+                record = statistics.record()
+                record.update(time=time.time(), host=host)
+                self.report(record)
+            if host in self.totals:
+                self.totals[host].merge(statistics)
+            else:
+                self.totals[host] = statistics
+        self.current = {}
+
+    def close(self):
+        """
+        Report the final (partial) interval, and return the totals.
+        """
+        self.flush()
+        return self.totals
+
+
+def record_writer(stream, format='json'):
+    """
+    Report function for IntervalReporter, writing records to a text
+    stream as JSON lines or as CSV (with a header, unless the stream is a
+    file being appended to, which already has one).
+    """
+    if format == 'json':
+        def report(record):
+            stream.write(json.dumps(record) + '\n')
+            stream.flush()
+    elif format == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=RECORD_FIELDS)
+        try:
+            empty = stream.tell() == 0
+        except (OSError, ValueError):
+            empty = True  # e.g. a pipe
+        if empty:
+            writer.writeheader()
+
+        def report(record):
+            writer.writerow(record)
+            stream.flush()
+    else:
+        raise ValueError('unknown record format {!r}'.format(format))
+    return report
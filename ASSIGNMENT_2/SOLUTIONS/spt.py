@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+import heapq
+import itertools
+import math
+import operator
+
+from routing import (_heap_key, dijkstra_generalized,
+                     predecessor_to_forwarding)
+
+
+class ShortestPathTree(object):
+    """
+    Least-cost (or widest, etc.) path tree of a single source, repaired in
+    place when link costs change rather than recomputed from scratch.
+
+    ``P``, ``D`` and ``forwarding`` match the output of
+    dijkstra_generalized and predecessor_to_forwarding for the current
+    graph, up to ties between equal-cost paths. Each update returns the
+    forwarding-table entries that changed, with ``None`` marking a
+    destination that became unreachable.
+
+    The tree holds on to ``graph`` and the updates below change it in
+    place: pass a copy to keep the original, and don't change the graph
+    other than through this tree.
+    """
+
+    def __init__(self, graph, source, weight='cost',
+                 infinity=math.inf,
+                 plus=operator.add,
+                 less=operator.lt,
+                 sourcedist=0):
+        self.graph = graph
+        self.source = source
+        self.weight = weight
+        self.infinity = infinity
+        self.plus = plus
+        self.less = less
+        self.key = _heap_key(less)
+
+        self.P, self.D = dijkstra_generalized(
+            graph, source, weight=weight, infinity=infinity,
+            plus=plus, less=less, sourcedist=sourcedist, multipath=False)
+        self.forwarding = predecessor_to_forwarding(self.P, source)
+
+        # Shortest path tree, from each node to its successors
+        self.children = {v: set() for v in self.P}
+        for v, parents in self.P.items():
+            if parents and v != source:
+                self.children[parents[0]].add(v)
+
+    def update_edge(self, u, v, new_cost):
+        """
+        Change the cost of an existing link, in the graph as well.
+        """
+        attributes = self.graph[u][v]
+        old_cost = attributes[self.weight]
+        attributes[self.weight] = new_cost
+
+        # Subtrees hanging from a link that got worse must be recomputed
+        roots = []
+        if self.less(old_cost, new_cost):
+            roots = [b for a, b in self._directions(u, v) if self._uses(a, b)]
+        return self._repair(roots, self._directions(u, v))
+
+    def remove_edge(self, u, v):
+        """
+        Remove a link from the graph, which is modified in place.
+        """
+        roots = [b for a, b in self._directions(u, v) if self._uses(a, b)]
+        self.graph.remove_edge(u, v)
+        return self._repair(roots, [])
+
+    def add_edge(self, u, v, cost):
+        """
+        Add a link to the graph, which is modified in place (or change the
+        cost of an existing link).
+        """
+        if self.graph.has_edge(u, v):
+            return self.update_edge(u, v, cost)
+        for node in (u, v):
+            if node not in self.P:
+                self.P[node] = []
+                self.D[node] = self.infinity
+                self.children[node] = set()
+        self.graph.add_edge(u, v, **{self.weight: cost})
+        return self._repair([], self._directions(u, v))
+
+    def _directions(self, u, v):
+        if self.graph.is_directed():
+            return [(u, v)]
+        return [(u, v), (v, u)]
+
+    def _uses(self, a, b):
+        """
+        Whether the tree reaches ``b`` via the link from ``a``.
+        """
+        return self.P.get(b) == [a] and b != self.source
+
+    def _reached(self, v):
+        return v == self.source or bool(self.P[v])
+
+    def _extend(self, x, cost):
+        # Consistent with dijkstra_generalized, the source's neighbours
+        # are initialised with the link cost itself
+        if x == self.source:
+            return cost
+        return self.plus(self.D[x], cost)
+
+    def _set_parent(self, v, parent, changed):
+        if self.P[v]:
+            self.children[self.P[v][0]].discard(v)
+        if parent is None:
+            self.P[v] = []
+        else:
+            self.P[v] = [parent]
+            self.children[parent].add(v)
+        changed.add(v)
+
+    def _repair(self, roots, links):
+        """
+        Recompute distances below the invalidated ``roots``, then propagate
+        any improvement along ``links``, Dijkstra-style.
+        """
+        graph, weight = self.graph, self.weight
+        inbound = graph.pred if graph.is_directed() else graph.adj
+        changed = set()
+        counter = itertools.count()
+        queue = []
+
+        def push(v):
+            entry = self.D[v] if self.key is None else self.key(self.D[v])
+            heapq.heappush(queue, (entry, next(counter), self.D[v], v))
+
+        # Detach the invalidated subtrees
+        invalid = set()
+        stack = list(roots)
+        while stack:
+            x = stack.pop()
+            if x not in invalid:
+                invalid.add(x)
+                stack.extend(self.children[x])
+        for x in invalid:
+            self._set_parent(x, None, changed)
+            self.D[x] = self.infinity
+
+        # Best estimates for invalidated nodes from intact neighbours
+        for x in invalid:
+            for y, attributes in inbound[x].items():
+                if y not in invalid and self._reached(y):
+                    Dx = self._extend(y, attributes[weight])
+                    if self.less(Dx, self.D[x]):
+                        self.D[x] = Dx
+                        self._set_parent(x, y, changed)
+            if self._reached(x):
+                push(x)
+
+        # Improvements via new or cheaper links
+        for a, b in links:
+            if b != self.source and self._reached(a):
+                Db = self._extend(a, graph[a][b][weight])
+                if self.less(Db, self.D[b]):
+                    self.D[b] = Db
+                    self._set_parent(b, a, changed)
+                    push(b)
+
+        # Dijkstra, restricted to the nodes whose distances decrease
+        while queue:
+            _, _, Dw, w = heapq.heappop(queue)
+            if Dw != self.D[w]:
+                continue  # stale entry
+            for v, attributes in graph[w].items():
+                if v == self.source:
+                    continue
+                DvNew = self._extend(w, attributes[weight])
+                if self.less(DvNew, self.D[v]):
+                    self.D[v] = DvNew
+                    self._set_parent(v, w, changed)
+                    push(v)
+
+        return self._update_forwarding(changed)
+
+    def _update_forwarding(self, changed):
+        """
+        Refresh the first hops below every re-parented node.
+        """
+        affected = set()
+        stack = list(changed)
+        while stack:
+            x = stack.pop()
+            if x not in affected:
+                affected.add(x)
+                stack.extend(self.children[x])
+
+        # First hops of unaffected nodes are still valid
+        hop = {}
+        for destination in affected:
+            path = []
+            node = destination
+            while node not in hop:
+                parents = self.P[node]
+                if node not in affected:
+                    entry = self.forwarding.get(node)
+                    hop[node] = None if entry is None else entry[1]
+                    break
+                path.append(node)
+                if not parents:
+                    hop[node] = None
+                    break
+                if parents[0] == self.source:
+                    hop[node] = node
+                    break
+                node = parents[0]
+            first = hop[node]
+            for node in path:
+                hop[node] = first
+
+        delta = {}
+        for destination in affected:
+            old = self.forwarding.get(destination)
+            new = None
+            if hop[destination] is not None:
+                new = (self.source, hop[destination])
+            if new != old:
+                delta[destination] = new
+                if new is None:
+                    del self.forwarding[destination]
+                else:
+                    self.forwarding[destination] = new
+        return delta
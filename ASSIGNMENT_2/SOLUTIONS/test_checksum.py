@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import random
+
+import pytest
+
+import checksum as checksum_module
+from checksum import (NUMPY_THRESHOLD, InternetChecksum, checksum_update,
+                      hextet_sum, internet_checksum, internet_checksum_batch)
+
+
+def reference_sum(data):
+    """
+    One's complement sum of big-endian hextets, by the book (RFC 1071).
+    """
+    data = bytes(data) + b'\0' * (len(data) % 2)
+    total = 0
+    for i in range(0, len(data), 2):
+        total += (data[i] << 8) | data[i + 1]
+        total = (total & 0xffff) + (total >> 16)
+    return total
+
+
+@pytest.fixture(params=[True, False], ids=['numpy', 'python'])
+def numpy(request, monkeypatch):
+    if not request.param:
+        monkeypatch.setattr(checksum_module, 'numpy', None)
+    elif checksum_module.numpy is None:
+        pytest.skip('NumPy is not installed')
+    return request.param
+
+
+LENGTHS = [0, 1, 2, 3, 63, 64, NUMPY_THRESHOLD - 2, NUMPY_THRESHOLD - 1,
+           NUMPY_THRESHOLD, NUMPY_THRESHOLD + 1, NUMPY_THRESHOLD + 2, 1501]
+
+
+@pytest.mark.parametrize('length', LENGTHS)
+def test_hextet_sum_matches_reference(numpy, length):
+    rng = random.Random(length)
+    for data in (rng.randbytes(length), b'\xff' * length):
+        assert hextet_sum(data) == reference_sum(data)
+        assert internet_checksum(data) == ~reference_sum(data) & 0xffff
+    assert hextet_sum(list(data)) == reference_sum(data)
+
+
+@pytest.mark.parametrize('length', [1, 7, 8, 20, 64, 301])
+def test_batch_matches_single_checksums(numpy, length):
+    rng = random.Random(length)
+    packets = [rng.randbytes(length) for _ in range(9)]
+    expected = [internet_checksum(packet) for packet in packets]
+    data = b''.join(packets)
+    assert internet_checksum_batch(data, length) == expected
+    assert internet_checksum_batch(bytearray(data), length) == expected
+    assert internet_checksum_batch(packets) == expected
+    assert internet_checksum_batch(data) == [internet_checksum(data)]
+
+
+def test_batch_takes_rows_of_arrays(numpy):
+    np = pytest.importorskip('numpy')
+    rows = np.arange(60, dtype=np.uint8).reshape(4, 15)
+    expected = [internet_checksum(row.tobytes()) for row in rows]
+    assert internet_checksum_batch(rows) == expected
+    assert internet_checksum_batch(rows[:, :14]) == [
+        internet_checksum(row.tobytes()) for row in rows[:, :14]]
+
+
+def test_batch_refuses_partial_packets(numpy):
+    with pytest.raises(ValueError):
+        internet_checksum_batch(bytes(10), 4)
+    with pytest.raises(ValueError):
+        internet_checksum_batch([b'ab', b'abc'])
+    assert internet_checksum_batch(b'', 4) == []
+    assert internet_checksum_batch(b'') == []
+    assert internet_checksum_batch([]) == []
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_incremental_update_matches_recompute(numpy, seed):
+    rng = random.Random(seed)
+    data = bytearray(rng.randbytes(rng.choice([20, 64, 300, 1501])))
+    checksum = internet_checksum(data)
+    for _ in range(50):
+        start = 2 * rng.randrange(len(data) // 2)
+        stop = min(len(data), start + 2 * rng.randint(1, 4))
+        old = bytes(data[start:stop])
+        data[start:stop] = rng.randbytes(stop - start)
+        if rng.random() < 0.5:
+            checksum = checksum_update(checksum, old, data[start:stop])
+        else:
+            checksum = checksum_update(checksum, hextet_sum(old),
+                                       hextet_sum(data[start:stop]))
+        # RFC 1624: equal, but for the two zeros of all-zero data
+        assert checksum == internet_checksum(data)
+
+
+def test_incremental_update_of_all_zero_data():
+    assert checksum_update(internet_checksum(b'\0\1'), 1, 0) in (
+        0x0000, 0xffff)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_streamed_checksum_matches_one_shot(numpy, seed):
+    rng = random.Random(seed)
+    data = rng.randbytes(rng.randint(0, 2000))
+    stream = InternetChecksum()
+    start = 0
+    while start < len(data):
+        stop = start + rng.choice([1, 3, 5, 255, 257, 999])
+        stream.update(data[start:stop])
+        start = stop
+    assert stream.value == internet_checksum(data)
+    assert stream.digest() == internet_checksum(data).to_bytes(2, 'big')
+
+    copy = stream.copy()
+    copy.update(b'\x01')
+    assert copy.value == internet_checksum(data + b'\x01')
+    assert stream.value == internet_checksum(data)
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+import random
+
+import pytest
+from bitarray import bitarray
+from bitarray.util import ba2int
+
+import crc as crc_module
+from crc import CRC, crc, crc_batch, crc_bytes
+
+GENERATORS = [0b1011, 0x11021, 0x104C11DB7, (1 << 64) | 0x1B]
+
+
+def random_frames(seed, count=100, longest=300):
+    rng = random.Random(seed)
+    return [rng.randbytes(rng.randint(0, longest)) for _ in range(count)]
+
+
+@pytest.mark.parametrize('g', GENERATORS)
+def test_crc_bytes_matches_crc(g):
+    for frame in random_frames(0, count=20):
+        bits = bitarray(endian='big')
+        bits.frombytes(frame)
+        assert crc_bytes(frame, g) == ba2int(crc(bits, g))
+
+
+@pytest.mark.parametrize('numpy', [True, False])
+@pytest.mark.parametrize('g', GENERATORS)
+def test_crc_batch_matches_crc_bytes(g, numpy, monkeypatch):
+    if not numpy:
+        monkeypatch.setattr(crc_module, 'numpy', None)
+    frames = random_frames(1)
+    assert crc_batch(frames, g) == [crc_bytes(frame, g) for frame in frames]
+
+    data = bytes(range(60))
+    assert crc_batch(data, g, length=6) == [
+        crc_bytes(data[i:i + 6], g) for i in range(0, len(data), 6)]
+    assert crc_batch([], g) == []
+
+
+def test_incremental_crc_matches_crc_bytes():
+    data = b''.join(random_frames(3, count=10))
+    stream = CRC(0x104C11DB7)
+    for start in range(0, len(data), 97):
+        stream.update(data[start:start + 97])
+    assert stream.value == crc_bytes(data, 0x104C11DB7)
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+import networkx as nx
+import pytest
+
+from csr import CSRGraph
+
+
+@pytest.mark.parametrize('directed', [False, True])
+def test_snapshot_holds_every_link(directed):
+    graph = nx.gnm_random_graph(30, 80, seed=1, directed=directed)
+    for u, v in graph.edges():
+        graph[u][v]['cost'] = u + v
+    csr = CSRGraph.from_graph(graph)
+    assert csr.nodes() == tuple(graph)
+    assert csr.number_of_nodes() == len(graph)
+    for u in graph:
+        i = csr.index[u]
+        assert csr.labels[i] == u
+        assert {csr.labels[j]: cost for j, cost in csr.neighbourhood(i)} == {
+            v: attributes['cost'] for v, attributes in graph[u].items()}
+
+
+def test_costs_keep_their_type():
+    graph = nx.path_graph(3)
+    nx.set_edge_attributes(graph, 2, 'cost')
+    assert CSRGraph.from_graph(graph).weights.typecode == 'q'
+    graph[0][1]['cost'] = 2.5
+    assert CSRGraph.from_graph(graph).weights.typecode == 'd'
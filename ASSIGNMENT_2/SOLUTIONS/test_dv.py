@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+import math
+import random
+
+import networkx as nx
+import pytest
+
+from dv import DistanceVector
+from routing import dijkstra_generalized
+
+# Semirings of dijkstra_generalized, as documented there
+SHORTEST = dict(infinity=math.inf, plus=lambda x, y: x + y,
+                less=lambda x, y: x < y)
+WIDEST = dict(infinity=0, plus=min, less=lambda x, y: x > y)
+
+
+def random_graph(seed, n=30, m=70, directed=False):
+    graph = nx.gnm_random_graph(n, m, seed=seed, directed=directed)
+    rng = random.Random(seed)
+    for u, v in graph.edges():
+        graph[u][v]['cost'] = rng.randint(1, 9)
+    return graph
+
+
+def assert_matches_dijkstra(graph, semiring, **options):
+    dv = DistanceVector(graph, **semiring, **options)
+    dv.run()
+    for source in graph:
+        _, D = dijkstra_generalized(graph, source, **semiring,
+                                    sourcedist=options.get('sourcedist', 0))
+        assert dv.distances(source) == D
+
+
+@pytest.mark.parametrize('vectorise', [True, False])
+@pytest.mark.parametrize('seed', range(3))
+def test_shortest_paths_match_dijkstra(seed, vectorise):
+    assert_matches_dijkstra(random_graph(seed), SHORTEST,
+                            vectorise=vectorise)
+
+
+@pytest.mark.parametrize('sourcedist', [0, math.inf])
+@pytest.mark.parametrize('vectorise', [True, False])
+@pytest.mark.parametrize('seed', range(3))
+def test_widest_paths_match_dijkstra(seed, vectorise, sourcedist):
+    assert_matches_dijkstra(random_graph(seed), WIDEST,
+                            vectorise=vectorise, sourcedist=sourcedist)
+
+
+@pytest.mark.parametrize('triggered', [True, False])
+@pytest.mark.parametrize('vectorise', [True, False])
+@pytest.mark.parametrize('seed', range(3))
+def test_directed_graphs_match_dijkstra(seed, vectorise, triggered):
+    for semiring in (SHORTEST, WIDEST):
+        graph = random_graph(seed, n=20, m=60, directed=True)
+        dv = DistanceVector(graph, vectorise=vectorise, **semiring)
+        dv.run(triggered=triggered)
+        for source in graph:
+            _, D = dijkstra_generalized(graph, source, **semiring)
+            assert dv.distances(source) == D
+
+
+@pytest.mark.parametrize('asynchronous', [False, True])
+@pytest.mark.parametrize('vectorise', [True, False])
+@pytest.mark.parametrize('seed', range(3))
+def test_directed_link_changes_reach_upstream_nodes(seed, vectorise,
+                                                    asynchronous):
+    graph = random_graph(seed, n=20, m=60, directed=True)
+    dv = DistanceVector(graph, vectorise=vectorise)
+    dv.run()
+    rng = random.Random(seed)
+    for u, v in rng.sample(list(graph.edges()), 10):
+        cost = rng.choice([None, rng.randint(1, 9), rng.randint(10, 30)])
+        dv.set_cost(u, v, cost)
+        if cost is None:
+            graph.remove_edge(u, v)
+        else:
+            graph[u][v]['cost'] = cost
+    dv.run(asynchronous=asynchronous, seed=seed)
+    for source in graph:
+        _, D = dijkstra_generalized(graph, source)
+        assert dv.distances(source) == D
+
+
+def test_directed_paths_are_within_max_metric():
+    graph = nx.DiGraph()
+    graph.add_edge('a', 'b', cost=1)
+    graph.add_edge('b', 'c', cost=1)
+    dv = DistanceVector(graph)
+    dv.run()
+    assert dv.distances('a') == {'a': 0, 'b': 1, 'c': 2}
+    assert dv.distances('c') == {'a': math.inf, 'b': math.inf, 'c': 0}
+
+
+def test_directed_set_cost_changes_one_direction():
+    graph = nx.DiGraph()
+    graph.add_edge('a', 'b', cost=1)
+    graph.add_edge('b', 'a', cost=1)
+    dv = DistanceVector(graph)
+    dv.run()
+    dv.set_cost('a', 'b', 5)
+    dv.run()
+    assert dv.distances('a')['b'] == 5
+    assert dv.distances('b')['a'] == 1
+
+
+def test_widest_paths_are_not_zero():
+    graph = nx.Graph()
+    graph.add_edge('u', 'v', cost=5)
+    graph.add_edge('v', 'w', cost=3)
+    dv = DistanceVector(graph, **WIDEST)
+    dv.run()
+    assert dv.distances('u') == {'u': 0, 'v': 5, 'w': 3}
+    assert dv.forwarding('u') == {'v': ('u', 'v'), 'w': ('u', 'v')}
+
+
+@pytest.mark.parametrize('vectorise', [True, False])
+def test_link_failure_counts_to_infinity_without_poisoned_reverse(vectorise):
+    graph = nx.Graph()
+    graph.add_edge('x', 'y', cost=4)
+    graph.add_edge('y', 'z', cost=1)
+    graph.add_edge('x', 'z', cost=50)
+
+    rounds = {}
+    for poisoned_reverse in (False, True):
+        dv = DistanceVector(graph, poisoned_reverse=poisoned_reverse,
+                            vectorise=vectorise)
+        dv.run()
+        dv.set_cost('x', 'y', 60)
+        rounds[poisoned_reverse] = len(dv.run())
+        assert dv.distances('y') == {'x': 51, 'y': 0, 'z': 1}
+    assert rounds[True] < rounds[False]
+
+
+def test_partition_is_cut_at_max_metric():
+    graph = nx.path_graph(4)
+    nx.set_edge_attributes(graph, 1, 'cost')
+    dv = DistanceVector(graph)
+    dv.run()
+    dv.set_cost(2, 3, None)
+    metrics = dv.run(max_rounds=100)
+    assert len(metrics) < 100
+    assert dv.distances(0) == {0: 0, 1: 1, 2: 2, 3: math.inf}
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import random
+import socket
+import struct
+
+import pytest
+
+import fib as fib_module
+from fib import FIB, address_to_int, compile_fib, parse_prefix
+
+
+def random_routes(seed, count=300):
+    """
+    Prefixes of every length, nested within a few /8s so that many of
+    them overlap, each with a next hop.
+    """
+    rng = random.Random(seed)
+    routes = []
+    for k in range(count):
+        length = rng.choice([8, 12, 16, 20, 24, 25, 26, 28, 30, 32,
+                             rng.randint(0, 32)])
+        network = (rng.choice([10, 172, 192]) << 24) | rng.getrandbits(24)
+        routes.append(((network, length), 'hop{}'.format(k % 17)))
+    return routes
+
+
+def longest_match(routes, address, default=None):
+    """
+    Longest-prefix match by brute force: the last route of the greatest
+    length covering the address, as FIB inserts them in that order.
+    """
+    best, hop = -1, default
+    for prefix, candidate in routes:
+        network, length = parse_prefix(prefix)
+        if length >= best and address >> (32 - length) == (
+                network >> (32 - length)):
+            best, hop = length, candidate
+    return hop
+
+
+@pytest.fixture(scope='module')
+def table():
+    # Each FIB has a 64 MiB first-level table: build one for the module
+    routes = random_routes(0)
+    return routes, FIB(routes, default='default')
+
+
+def addresses_near(routes, seed, count=2000):
+    """
+    Addresses in, just outside and at the edges of the routes' prefixes.
+    """
+    rng = random.Random(seed)
+    addresses = []
+    for _ in range(count):
+        network, length = parse_prefix(rng.choice(routes)[0])
+        size = 1 << (32 - length)
+        offset = rng.choice([0, size - 1, size, -1, rng.randrange(size)])
+        addresses.append((network + offset) & 0xffffffff)
+    return addresses
+
+
+def test_lookup_matches_brute_force(table):
+    routes, fib = table
+    for address in addresses_near(routes, 1):
+        expected = longest_match(routes, address, 'default')
+        assert fib.lookup(address) == expected
+
+
+@pytest.mark.parametrize('numpy', [True, False])
+def test_batch_lookups_match_single_lookups(table, numpy, monkeypatch):
+    routes, fib = table
+    if not numpy:
+        monkeypatch.setattr(fib_module, 'numpy', None)
+    addresses = addresses_near(routes, 2)
+    expected = [fib.lookup(address) for address in addresses]
+    assert fib.lookup_batch(addresses) == expected
+    packed = b''.join(struct.pack('!I', address) for address in addresses)
+    assert [fib.hops[i] for i in fib.lookup_ids(packed)] == expected
+    quads = [socket.inet_ntoa(struct.pack('!I', address))
+             for address in addresses[:50]]
+    assert fib.lookup_batch(quads) == expected[:50]
+
+
+def test_compile_fib_delivers_locally_and_skips_unreachable():
+    forwarding = {'v': ('u', 'v'), 'w': ('u', 'v')}
+    prefixes = {'u': ['10.0.0.0/8'], 'v': ['10.1.0.0/16'],
+                'w': ['10.1.2.0/24', '10.1.2.128/25'], 'x': ['10.3.0.0/16']}
+    fib = compile_fib(forwarding, prefixes, 'u')
+    assert fib.lookup('10.9.9.9') == 'u'
+    assert fib.lookup('10.1.9.9') == 'v'
+    assert fib.lookup('10.1.2.200') == 'v'
+    assert fib.lookup('10.3.0.1') == 'u'  # x is unreachable
+    assert fib.lookup('11.0.0.1') is None
+
+
+def test_addresses_and_prefixes_parse():
+    assert address_to_int('10.0.0.1') == address_to_int(
+        b'\x0a\x00\x00\x01') == 0x0a000001
+    assert parse_prefix('10.1.2.3/16') == (0x0a010000, 16)
+    assert parse_prefix('10.1.2.3') == (0x0a010203, 32)
+    with pytest.raises(ValueError):
+        parse_prefix('10.0.0.0/33')
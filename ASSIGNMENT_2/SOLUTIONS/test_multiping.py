@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import socket
+
+import pytest
+
+from multiping import multi_ping, multi_ping_statistics, verbose_multi_ping
+from ping import ECHO_REPLY, ChecksumError
+from transport import LoopbackTransport
+
+ADDRESSES = {'alpha': '10.0.0.1', 'beta': '10.0.0.2', 'gamma': '10.0.0.3'}
+
+
+def outcomes(count=4, timeout=200, rate=1000, **options):
+    with LoopbackTransport(seed=1, **options) as transport:
+        return list(multi_ping(transport, ADDRESSES, count=count,
+                               timeout=timeout, rate=rate, client_id=0x4242))
+
+
+@pytest.mark.parametrize('rate', [1000, 0, -1])
+def test_every_probe_is_answered_in_order(rate):
+    results = outcomes(count=5, rate=rate, latency=1.0)
+    assert len(results) == 5 * len(ADDRESSES)
+    for host, address in ADDRESSES.items():
+        probes = [(probe, outcome) for probe, outcome in results
+                  if probe.host == host]
+        assert [probe.seq_no for probe, _ in probes] == list(range(5))
+        for probe, (rtt, header) in probes:
+            assert probe.address == address
+            assert rtt >= 0
+            assert header.type == ECHO_REPLY.type
+            assert header.identifier == 0x4242
+            assert header.sequence_number == probe.seq_no
+
+
+def test_lost_replies_time_out():
+    results = outcomes(count=3, timeout=20, loss=1.0)
+    assert len(results) == 3 * len(ADDRESSES)
+    assert all(isinstance(outcome, socket.timeout) for _, outcome in results)
+
+    # Deadlines expire in the order the probes were sent
+    assert [probe.seq_no for probe, _ in results] == sorted(
+        probe.seq_no for probe, _ in results)
+
+
+def test_corrupt_replies_fail_their_checksum():
+    results = outcomes(count=3, corruption=1.0)
+    assert len(results) == 3 * len(ADDRESSES)
+    assert all(isinstance(outcome, ChecksumError)
+               for _, outcome in results)
+
+
+def test_partial_loss_accounts_for_every_probe():
+    results = outcomes(count=20, timeout=50, loss=0.3, corruption=0.2)
+    assert sorted((probe.host, probe.seq_no) for probe, _ in results) == \
+        sorted((host, seq_no) for host in ADDRESSES for seq_no in range(20))
+    kinds = {type(outcome) for _, outcome in results}
+    assert kinds == {tuple, socket.timeout, ChecksumError}
+
+
+def test_statistics_count_replies_and_losses():
+    summary = multi_ping_statistics(
+        ADDRESSES, count=10, timeout=20, rate=0,
+        transport=lambda: LoopbackTransport(loss=0.5, seed=3))
+    assert set(summary) == set(ADDRESSES)
+    for host, (address, sent, statistics) in summary.items():
+        assert address == ADDRESSES[host]
+        assert sent == 10
+        assert statistics.sent == 10
+        assert 0 < statistics.received < 10
+
+
+def test_verbose_multi_ping_skips_unknown_hosts():
+    lines = []
+    hosts = ['localhost', 'unknown.invalid']
+    summary = verbose_multi_ping(hosts, count=2, timeout=100, rate=0,
+                                 log=lines.append,
+                                 transport=LoopbackTransport)
+    assert set(summary) == {'localhost'}
+    assert summary['localhost'].statistics.received == 2
+    assert 'Could not find host unknown.invalid.' in lines
+    assert sum(line.startswith('Reply from 127.0.0.1') for line in lines
+               if isinstance(line, str)) == 2
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+import json
+import math
+import os
+
+import pytest
+
+import netjson
+
+LAB_TOPOLOGY = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            '..', '..', 'LABS', 'LAB_5',
+                            'KuroseRoss5-15.json')
+
+
+def network_graph(directed=False):
+    return {
+        'type': 'NetworkGraph',
+        'directed': directed,
+        'nodes': [
+            {'id': 'a', 'properties': {'name': 'A', 'pos': [0.0, 0.0]}},
+            {'id': 'b', 'properties': {'pos': [1.0, 0.0]}},
+            {'id': 'c'},
+        ],
+        'links': [
+            {'source': 'a', 'target': 'b', 'cost': 1.0},
+            {'source': 'b', 'target': 'c', 'cost': 2.5,
+             'properties': {'bandwidth': 10}},
+            {'source': 'c', 'target': 'a', 'cost': 4.0, 'label': 'slow'},
+            {'source': 'c', 'target': 'd', 'cost': 1.0},  # d: not a node
+        ],
+    }
+
+
+@pytest.fixture(params=[False, True], ids=['undirected', 'directed'])
+def topology_file(request, tmp_path):
+    path = tmp_path / 'topology.json'
+    path.write_text(json.dumps(network_graph(request.param)))
+    return str(path)
+
+
+def state(topology):
+    graph = topology.graph
+    positions = topology.positions
+    return (graph.labels, graph.weight, list(graph.offsets),
+            list(graph.neighbours), list(graph.weights),
+            None if positions is None else [
+                None if math.isnan(x) else x for x in positions],
+            topology.node_properties, topology.link_properties,
+            topology.directed)
+
+
+@pytest.mark.parametrize('properties', [False, True])
+def test_cache_matches_a_fresh_parse(topology_file, tmp_path, properties):
+    cache_directory = str(tmp_path / 'cache')
+    fresh = netjson.load(topology_file, cache_directory=False,
+                         properties=properties)
+    first = netjson.load(topology_file, cache_directory=cache_directory,
+                         properties=properties)
+    assert len(os.listdir(cache_directory)) == 1
+    cached = netjson.load(topology_file, cache_directory=cache_directory,
+                          properties=properties)
+    assert state(fresh) == state(first) == state(cached)
+    assert (fresh.node_properties is not None) == properties
+    assert (fresh.link_properties is not None) == properties
+
+
+def test_properties_are_read_only_when_asked(topology_file, tmp_path):
+    path = str(tmp_path / 'topology.csr')
+    with open(topology_file) as stream:
+        netjson.write_cache(netjson.from_netjson(json.load(stream)), path)
+
+    # The header describes the sections, without holding their contents
+    with open(path, 'rb') as stream:
+        stream.seek(len(netjson.CACHE_MAGIC))
+        length, = netjson.CACHE_LENGTH.unpack(
+            stream.read(netjson.CACHE_LENGTH.size))
+        header = json.loads(stream.read(length))
+    assert set(header) == {'weight', 'directed', 'sections'}
+    assert [name for name, _, _ in header['sections']] == [
+        'offsets', 'neighbours', 'weights', 'positions', 'labels',
+        'node_properties', 'link_properties']
+
+    topology = netjson.read_cache(path)
+    assert topology.node_properties is None
+    assert topology.link_properties is None
+    topology = netjson.read_cache(path, properties=True)
+    assert topology.node_properties[0] == {'name': 'A', 'pos': [0.0, 0.0]}
+
+
+def test_cache_is_read_rather_than_the_file(topology_file, tmp_path,
+                                            monkeypatch):
+    cache_directory = str(tmp_path / 'cache')
+    netjson.load(topology_file, cache_directory=cache_directory)
+
+    def unexpected(*args, **kwargs):
+        raise AssertionError('parsed again')
+
+    monkeypatch.setattr(netjson, 'from_netjson', unexpected)
+    assert netjson.load(topology_file, cache_directory=cache_directory)
+
+
+def test_editing_the_file_invalidates_the_cache(topology_file, tmp_path):
+    cache_directory = str(tmp_path / 'cache')
+    netjson.load(topology_file, cache_directory=cache_directory)
+    edited = network_graph()
+    edited['links'][0]['cost'] = 7.0
+    with open(topology_file, 'w') as stream:
+        json.dump(edited, stream)
+    topology = netjson.load(topology_file, cache_directory=cache_directory)
+    assert 7.0 in topology.graph.weights
+    assert len(os.listdir(cache_directory)) == 2
+
+
+def test_weights_are_cached_separately(topology_file, tmp_path):
+    cache_directory = str(tmp_path / 'cache')
+    netjson.load(topology_file, cache_directory=cache_directory)
+    edited = network_graph()
+    for link in edited['links']:
+        link['delay'] = 2 * link['cost']
+    with open(topology_file, 'w') as stream:
+        json.dump(edited, stream)
+    by_cost = netjson.load(topology_file, cache_directory=cache_directory)
+    by_delay = netjson.load(topology_file, weight='delay',
+                            cache_directory=cache_directory)
+    assert list(by_delay.graph.weights) == [
+        2 * cost for cost in by_cost.graph.weights]
+
+
+def test_unreadable_cache_is_replaced(topology_file, tmp_path):
+    cache_directory = str(tmp_path / 'cache')
+    netjson.load(topology_file, cache_directory=cache_directory)
+    cache, = os.listdir(cache_directory)
+    path = os.path.join(cache_directory, cache)
+    with open(path, 'rb') as stream:
+        contents = stream.read()
+    for damaged in [b'', b'junk', contents[:len(contents) // 2]]:
+        with open(path, 'wb') as stream:
+            stream.write(damaged)
+        topology = netjson.load(topology_file,
+                                cache_directory=cache_directory)
+        assert state(topology) == state(
+            netjson.load(topology_file, cache_directory=False))
+
+
+@pytest.mark.parametrize('cached', [False, True])
+def test_networkx_graph_matches_the_file(topology_file, tmp_path, cached):
+    topology = netjson.load(
+        topology_file, cache_directory=cached and str(tmp_path / 'cache'),
+        properties=True)
+    graph = netjson.to_networkx(topology)
+    assert set(graph.nodes) == {'a', 'b', 'c', 'd'}
+    assert graph.nodes['a'] == {'name': 'A', 'pos': [0.0, 0.0]}
+    assert graph['b']['c'] == {'cost': 2.5, 'bandwidth': 10}
+    assert graph['c']['a'] == {'cost': 4.0, 'label': 'slow'}
+    assert graph.is_directed() == topology.directed
+    assert graph.has_edge('a', 'c') != topology.directed
+    assert graph.number_of_edges() == 4
+
+
+def test_positions_without_properties(topology_file):
+    graph = netjson.to_networkx(netjson.load(topology_file,
+                                             cache_directory=False))
+    assert dict(graph.nodes(data=True)) == {
+        'a': {'pos': [0.0, 0.0]}, 'b': {'pos': [1.0, 0.0]}, 'c': {},
+        'd': {}}
+    assert graph['b']['c'] == {'cost': 2.5}
+
+
+def test_lab_topology(tmp_path):
+    with open(LAB_TOPOLOGY) as stream:
+        expected = {frozenset((link['source'], link['target'])): link['cost']
+                    for link in json.load(stream)['links']}
+    graph = netjson.to_networkx(netjson.load(
+        LAB_TOPOLOGY, cache_directory=str(tmp_path), properties=True))
+    assert {frozenset((u, v)): cost
+            for u, v, cost in graph.edges(data='cost')} == expected
+    assert all(data['name'] == v for v, data in graph.nodes(data=True))
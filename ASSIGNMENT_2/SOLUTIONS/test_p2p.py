@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+import math
+import random
+
+import networkx as nx
+import pytest
+
+from csr import CSRGraph
+from p2p import PathQuery
+
+
+def geometric_graph(seed, directed=False, n=60):
+    """
+    Random geometric graph whose costs are at least the straight-line
+    length of each link, so that the euclidean heuristic is admissible.
+    """
+    graph = nx.random_geometric_graph(n, 0.25, seed=seed)
+    if directed:
+        graph = graph.to_directed()
+    rng = random.Random(seed)
+    for u, v in graph.edges():
+        (x1, y1), (x2, y2) = graph.nodes[u]['pos'], graph.nodes[v]['pos']
+        graph[u][v]['cost'] = math.hypot(x1 - x2, y1 - y2) * rng.uniform(1, 2)
+    return graph
+
+
+def pairs(graph, seed, count=40):
+    rng = random.Random(seed)
+    nodes = list(graph)
+    return [tuple(rng.sample(nodes, 2)) for _ in range(count)] + [
+        (nodes[0], nodes[0])]
+
+
+def assert_route(graph, route, source, target):
+    try:
+        expected = nx.dijkstra_path_length(graph, source, target,
+                                           weight='cost')
+    except nx.NetworkXNoPath:
+        assert route.path == [] and route.distance == math.inf
+        return
+    assert math.isclose(route.distance, expected, rel_tol=1e-9)
+    assert route.path[0] == source and route.path[-1] == target
+    cost = sum(graph[a][b]['cost'] for a, b in zip(route.path,
+                                                   route.path[1:]))
+    assert math.isclose(cost, expected, rel_tol=1e-9)
+
+
+@pytest.mark.parametrize('directed', [False, True])
+@pytest.mark.parametrize('seed', range(3))
+def test_queries_match_networkx(seed, directed):
+    graph = geometric_graph(seed, directed)
+    query = PathQuery(graph)
+    query.add_landmarks(4, seed=seed)
+    for source, target in pairs(graph, seed):
+        for method, heuristic in (('dijkstra', None),
+                                  ('bidirectional', None),
+                                  ('astar', 'euclidean'),
+                                  ('astar', 'landmarks'),
+                                  ('astar', 'auto')):
+            route = query.shortest_path(source, target, method,
+                                        heuristic or 'auto')
+            assert_route(graph, route, source, target)
+
+
+def test_heuristics_settle_fewer_nodes():
+    graph = geometric_graph(0, n=200)
+    query = PathQuery(graph)
+    query.add_landmarks(8, seed=0)
+    settled = {method: 0 for method in ('dijkstra', 'astar')}
+    for source, target in pairs(graph, 1):
+        for method in settled:
+            settled[method] += query.shortest_path(
+                source, target, method).settled
+    assert settled['astar'] < settled['dijkstra']
+
+
+def test_csr_graph_and_callable_heuristic():
+    graph = geometric_graph(1)
+    positions = dict(graph.nodes(data='pos'))
+    query = PathQuery(CSRGraph.from_graph(graph), positions=positions)
+    assert query.scale is not None
+
+    def straight_line(v, t):
+        (x1, y1), (x2, y2) = positions[v], positions[t]
+        return math.hypot(x1 - x2, y1 - y2)
+
+    for source, target in pairs(graph, 2):
+        route = query.astar(source, target, heuristic=straight_line)
+        assert_route(graph, route, source, target)
+
+
+def test_bad_requests_are_refused():
+    graph = geometric_graph(2)
+    query = PathQuery(graph)
+    with pytest.raises(ValueError):
+        query.astar(0, 1, heuristic='landmarks')
+    with pytest.raises(ValueError):
+        query.shortest_path(0, 1, method='teleport')
+    with pytest.raises(ValueError):
+        PathQuery(CSRGraph.from_graph(graph), weight='delay')
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+import socket
+import struct
+
+import pytest
+
+from checksum import internet_checksum
+from pcapng import (ENHANCED_PACKET, IF_TSOFFSET, IF_TSRESOL,
+                    INTERFACE_DESCRIPTION, LINKTYPE_ETHERNET, LINKTYPE_RAW,
+                    SECTION_HEADER, SIMPLE_PACKET, PcapngReader, icmp_header,
+                    ipv4_header, packet_filter, tcp_header, verify_checksums)
+
+
+def block(order, block_type, body):
+    body += bytes(-len(body) % 4)
+    length = struct.pack(order + 'I', len(body) + 12)
+    return struct.pack(order + 'I', block_type) + length + body + length
+
+
+def option(order, code, value):
+    return (struct.pack(order + 'HH', code, len(value)) + value
+            + bytes(-len(value) % 4))
+
+
+def section(order):
+    return block(order, SECTION_HEADER,
+                 struct.pack(order + 'IHHq', 0x1A2B3C4D, 1, 0, -1))
+
+
+def interface(order, link_type, resolution=None, offset=None):
+    options = b''
+    if resolution is not None:
+        options += option(order, IF_TSRESOL, bytes([resolution]))
+    if offset is not None:
+        options += option(order, IF_TSOFFSET,
+                          struct.pack(order + 'q', offset))
+    if options:
+        options += option(order, 0, b'')
+    return block(order, INTERFACE_DESCRIPTION,
+                 struct.pack(order + 'HHI', link_type, 0, 0) + options)
+
+
+def enhanced(order, data, ticks, interface=0, original=None):
+    return block(order, ENHANCED_PACKET, struct.pack(
+        order + 'IIIII', interface, ticks >> 32, ticks & 0xffffffff,
+        len(data), len(data) if original is None else original) + data)
+
+
+def simple(order, data):
+    return block(order, SIMPLE_PACKET,
+                 struct.pack(order + 'I', len(data)) + data)
+
+
+def ipv4(source, destination, protocol, payload):
+    header = bytearray(struct.pack(
+        '!BBHHHBBH4s4s', 0x45, 0, 20 + len(payload), 0, 0, 64, protocol,
+        0, socket.inet_aton(source), socket.inet_aton(destination)))
+    struct.pack_into('!H', header, 10, internet_checksum(header))
+    return bytes(header) + payload
+
+
+def icmp(source, destination, icmp_type, identifier, sequence):
+    message = bytearray(struct.pack('!BBHHH', icmp_type, 0, 0, identifier,
+                                    sequence) + bytes(8))
+    struct.pack_into('!H', message, 2, internet_checksum(message))
+    return ipv4(source, destination, socket.IPPROTO_ICMP, bytes(message))
+
+
+def tcp(source, source_port, destination, destination_port, flags,
+        payload=b''):
+    segment = struct.pack('!HHIIBBHHH', source_port, destination_port, 0, 0,
+                          5 << 4, flags, 65535, 0, 0) + payload
+    return ipv4(source, destination, socket.IPPROTO_TCP, segment)
+
+
+def ethernet(packet):
+    return bytes(6) + bytes(6) + b'\x08\x00' + packet
+
+
+@pytest.fixture(params=['<', '>'])
+def order(request):
+    return request.param
+
+
+@pytest.fixture
+def capture(tmp_path, order):
+    """
+    Two sections: Ethernet with microsecond timestamps, then raw IPv4
+    with nanosecond timestamps offset by 1000 seconds.
+    """
+    path = tmp_path / 'capture.pcapng'
+    request = icmp('10.0.0.1', '10.0.0.2', 8, 7, 1)
+    reply = icmp('10.0.0.2', '10.0.0.1', 0, 7, 1)
+    syn = tcp('10.0.0.1', 40000, '10.0.0.2', 80, 0x02)
+    path.write_bytes(
+        section(order)
+        + interface(order, LINKTYPE_ETHERNET)
+        + enhanced(order, ethernet(request), 1500000)
+        + enhanced(order, ethernet(reply), 1750000)
+        + enhanced(order, ethernet(b'\x45' * 10), 1800000)  # truncated
+        + section(order)
+        + interface(order, LINKTYPE_RAW, resolution=9, offset=1000)
+        + enhanced(order, syn, 2 * 10 ** 9 + 5, original=len(syn) + 100)
+        + simple(order, request))
+    return path
+
+
+def test_packets_round_trip(capture):
+    with PcapngReader(str(capture)) as reader:
+        packets = [(packet.interface, packet.timestamp,
+                    packet.original_length, bytes(packet.data), packet.ip)
+                   for packet in reader.packets()]
+    assert [p[0] for p in packets] == [0, 0, 0, 0, 0]
+    assert [p[1] for p in packets] == [
+        pytest.approx(1.5), pytest.approx(1.75), pytest.approx(1.8),
+        pytest.approx(1002.000000005), None]
+    assert [p[4] for p in packets] == [14, 14, None, 0, 0]
+    assert packets[3][2] == len(packets[3][3]) + 100
+
+    data, ip = packets[0][3], packets[0][4]
+    header = ipv4_header(data, ip)
+    assert socket.inet_ntoa(header.destination) == '10.0.0.2'
+    assert icmp_header(data, ip)[:1] == (8,)
+    assert verify_checksums(data, ip)
+    assert tcp_header(packets[3][3], 0).destination_port == 80
+
+
+def test_chunks_read_as_the_whole(capture):
+    with PcapngReader(str(capture)) as reader:
+        whole = [bytes(packet.data) for packet in reader.packets()]
+        for size in [1, 64, 1 << 20]:
+            parts = [bytes(packet.data)
+                     for chunk in reader.chunks(size)
+                     for packet in reader.packets(chunk=chunk)]
+            assert parts == whole
+
+
+def test_filters(capture):
+    def matching(**criteria):
+        with PcapngReader(str(capture)) as reader:
+            return len(list(reader.packets(packet_filter(**criteria))))
+
+    assert matching() == 4
+    assert matching(protocol='icmp') == 3
+    assert matching(protocol='tcp', port=80) == 1
+    assert matching(destination_port=443) == 0
+    assert matching(source='10.0.0.2') == 1
+    assert matching(host='10.0.0.2', icmp_type=8) == 2
+
+
+def test_corrupt_checksum_is_detected():
+    packet = bytearray(icmp('10.0.0.1', '10.0.0.2', 8, 7, 1))
+    packet[-1] ^= 1
+    assert verify_checksums(packet, 0) is False
+    assert verify_checksums(packet[:-4], 0) is None
+
+
+def test_truncated_blocks_are_refused(tmp_path):
+    path = tmp_path / 'truncated.pcapng'
+    path.write_bytes((section('<') + interface('<', LINKTYPE_RAW))[:-4])
+    with PcapngReader(str(path)) as reader:
+        with pytest.raises(ValueError):
+            list(reader.packets())
+
+
+def test_empty_capture(tmp_path):
+    path = tmp_path / 'empty.pcapng'
+    path.write_bytes(b'')
+    with PcapngReader(str(path)) as reader:
+        assert list(reader.packets()) == []
+        assert list(reader.chunks(64)) == []
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+import random
+
+import pytest
+
+from pcapng import LINKTYPE_ETHERNET
+from pcapstats import ACK, SYN, Flow, analyse, analyse_chunk
+from test_pcapng import enhanced, ethernet, icmp, interface, section, tcp
+
+
+def flow(*packets):
+    result = Flow()
+    for timestamp, flags in packets:
+        result.add(timestamp, 60, flags)
+    return result
+
+
+def test_handshake_rtt():
+    assert flow((1.0, SYN), (1.25, SYN | ACK), (1.5, ACK)).handshake_rtt \
+        == pytest.approx(250.0)
+    assert flow((1.0, SYN)).handshake_rtt is None
+
+
+def test_syn_ack_without_an_earlier_syn_is_ignored():
+    # e.g. a capture started mid-handshake, then a new connection reusing
+    # the same ports
+    handshake = flow((1.0, SYN | ACK), (2.0, SYN))
+    assert handshake.handshake_rtt is None
+    handshake.add(2.5, 60, SYN | ACK)
+    assert handshake.handshake_rtt == pytest.approx(500.0)
+
+
+def test_handshake_split_across_parts():
+    first = flow((1.0, SYN))
+    first.merge(flow((1.1, SYN | ACK), (1.2, ACK)))
+    assert first.handshake_rtt == pytest.approx(100.0)
+
+    # A SYN/ACK in the first part, and the SYN only in the second
+    first = flow((1.0, SYN | ACK))
+    first.merge(flow((2.0, SYN)))
+    assert first.handshake_rtt is None
+    first.merge(flow((2.5, SYN | ACK)))
+    assert first.handshake_rtt == pytest.approx(500.0)
+
+
+def test_merge_matches_a_single_pass():
+    packets = [(1.0, 0), (2.0, SYN | ACK), (3.0, SYN), (4.0, SYN | ACK),
+               (5.0, ACK), (6.0, SYN | ACK)]
+    whole = flow(*packets)
+    for split in range(len(packets) + 1):
+        parts = flow(*packets[:split])
+        parts.merge(flow(*packets[split:]))
+        assert (parts.packets, parts.bytes) == (whole.packets, whole.bytes)
+        assert (parts.first, parts.last) == (whole.first, whole.last)
+        assert (parts.syn, parts.syn_ack) == (whole.syn, whole.syn_ack)
+
+
+@pytest.fixture(params=['<', '>'])
+def capture(request, tmp_path):
+    """
+    Interleaved TCP connections and pings (some unanswered, some answered
+    out of order), over several sections.
+    """
+    order = request.param
+    rng = random.Random(0)
+    events = []
+    for n in range(40):
+        client, server = '10.0.0.{}'.format(n % 7 + 1), '10.1.0.1'
+        start = rng.uniform(0, 10)
+        port = 40000 + n
+        for k, (flags, forward) in enumerate([
+                (SYN, True), (SYN | ACK, False), (ACK, True),
+                (ACK, True), (ACK, False)]):
+            source, destination = client, server
+            ports = (port, 80)
+            if not forward:
+                source, destination = server, client
+                ports = (80, port)
+            events.append((start + 0.01 * k, tcp(
+                source, ports[0], destination, ports[1], flags,
+                bytes(rng.randrange(100)))))
+        host = '10.2.0.{}'.format(n % 5 + 1)
+        events.append((start, icmp('10.0.0.1', host, 8, 9, n)))
+        if n % 4:
+            events.append((start + rng.uniform(0, 0.5),
+                           icmp(host, '10.0.0.1', 0, 9, n)))
+    events.sort(key=lambda event: event[0])
+
+    blocks = []
+    for k, (timestamp, packet) in enumerate(events):
+        if k % 50 == 0:
+            blocks.append(section(order) + interface(order,
+                                                     LINKTYPE_ETHERNET))
+        blocks.append(enhanced(order, ethernet(packet),
+                               int(timestamp * 10 ** 6)))
+    path = tmp_path / 'capture.pcapng'
+    path.write_bytes(b''.join(blocks))
+    return str(path)
+
+
+def flow_state(each):
+    return (each.packets, each.bytes, each.first, each.last, each.syn,
+            each.syn_ack)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 500, 4096])
+@pytest.mark.parametrize('max_workers', [1, 3])
+def test_parallel_analysis_matches_a_single_pass(capture, chunk_size,
+                                                 max_workers):
+    serial = analyse_chunk(capture)
+    parallel = analyse(capture, chunk_size=chunk_size,
+                       max_workers=max_workers)
+    assert len(serial.flows) == 40
+    assert ({key: flow_state(each) for key, each in parallel.flows.items()}
+            == {key: flow_state(each) for key, each in serial.flows.items()})
+    for each in serial.flows.values():
+        assert each.handshake_rtt == pytest.approx(10.0, abs=0.01)
+
+    expected = serial.ping_statistics()
+    statistics = parallel.ping_statistics()
+    assert set(statistics) == set(expected) == {
+        '10.2.0.{}'.format(n) for n in range(1, 6)}
+    for host, echoes in statistics.items():
+        assert (echoes.sent, echoes.received) == (
+            expected[host].sent, expected[host].received)
+        assert echoes.mean == pytest.approx(expected[host].mean)
+    assert sum(echoes.sent for echoes in statistics.values()) == 40
+    assert sum(echoes.received for echoes in statistics.values()) == 30
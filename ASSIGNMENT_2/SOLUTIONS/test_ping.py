@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import random
+import struct
+
+import pytest
+
+from checksum import internet_checksum
+from ping import (BUFFER_SIZE, ECHO_REPLY, ECHO_REQUEST, ICMP_STRUCT,
+                  RIGHT_HEXTET, TIMESTAMP_STRUCT, ChecksumError,
+                  EchoRequestBuilder, echo_header, echo_reply, echo_request,
+                  ping)
+from transport import LoopbackTransport
+
+
+def from_scratch(client_id, seq_no, timestamp):
+    """
+    Echo request packed and checksummed in full, without the builder.
+    """
+    payload = TIMESTAMP_STRUCT.pack(timestamp)
+    header = ICMP_STRUCT.pack(ECHO_REQUEST.type, ECHO_REQUEST.code, 0,
+                              client_id, 0)
+    header = bytearray(header)
+    struct.pack_into('H', header, 6, seq_no)
+    checksum = internet_checksum(bytes(header) + payload)
+    struct.pack_into('!H', header, 2, checksum)
+    return bytes(header) + payload
+
+
+@pytest.mark.parametrize('client_id', [0, 1, 0x1234, RIGHT_HEXTET])
+def test_builder_matches_full_recompute(client_id):
+    rng = random.Random(client_id)
+    builder = EchoRequestBuilder(client_id)
+    for seq_no in [0, 1, RIGHT_HEXTET] + rng.sample(range(1 << 16), 50):
+        timestamp = rng.uniform(0, 1e6)
+        packet = builder.build(seq_no, timestamp)
+        assert bytes(packet) == from_scratch(client_id, seq_no, timestamp)
+        assert internet_checksum(packet) == 0
+
+
+def test_built_requests_make_valid_replies():
+    builder = EchoRequestBuilder(0x4242)
+    with LoopbackTransport() as transport:
+        for seq_no in range(20):
+            transport.sendto(builder.build(seq_no, 100.0), ('10.0.0.1', 1))
+            datagram, address = transport.recvfrom(1024)
+            assert address == ('10.0.0.1', 0)
+
+            header = echo_header(datagram)
+            assert (header.type, header.code) == ECHO_REPLY
+            assert (header.identifier, header.sequence_number) == (
+                0x4242, seq_no)
+            rtt, reply = echo_reply(datagram, 100.25)
+            assert rtt == pytest.approx(250.0)
+            assert reply == header
+
+
+def test_corrupt_and_short_replies_are_refused():
+    packet = echo_request(7, 3)
+    with LoopbackTransport(corruption=1.0, seed=0) as transport:
+        transport.sendto(packet, ('127.0.0.1', 1))
+        datagram, _ = transport.recvfrom(1024)
+    assert echo_header(datagram) is not None
+    with pytest.raises(ChecksumError):
+        echo_reply(datagram, 0.0)
+    assert echo_header(datagram[:-1]) is None
+    with pytest.raises(ChecksumError):
+        echo_reply(datagram[:-1], 0.0)
+
+
+def test_ping_reuses_its_builder_and_buffer():
+    builder = EchoRequestBuilder(0x4242)
+    buffer = bytearray(BUFFER_SIZE)
+    packet = builder.packet
+    with LoopbackTransport(hosts={'example.test': '192.0.2.1'}) as transport:
+        transport.settimeout(1.0)
+        for seq_no in range(50):
+            rtt, header = ping(transport, 'example.test', 0x4242, seq_no,
+                               builder=builder, buffer=buffer)
+            assert rtt >= 0
+            assert (header.identifier, header.sequence_number) == (
+                0x4242, seq_no)
+            assert len(buffer) == BUFFER_SIZE
+    assert builder.packet is packet
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import socket
+
+import pytest
+
+from resolver import ResolverCache
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeLookup(object):
+    """
+    Resolves names of the form "hostN" to 10.0.0.N, counting lookups.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, host):
+        self.calls.append(host)
+        if not host.startswith('host'):
+            raise socket.gaierror(socket.EAI_NONAME,
+                                  'Name or service not known')
+        return '10.0.0.{}'.format(host[4:])
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def lookup():
+    return FakeLookup()
+
+
+def test_addresses_expire_after_their_ttl(clock, lookup):
+    cache = ResolverCache(ttl=60, resolve=lookup, clock=clock)
+    assert cache.gethostbyname('host1') == '10.0.0.1'
+    clock.now = 59.9
+    assert cache.gethostbyname('host1') == '10.0.0.1'
+    assert lookup.calls == ['host1']
+    clock.now = 60.0
+    assert cache.gethostbyname('host1') == '10.0.0.1'
+    assert lookup.calls == ['host1', 'host1']
+
+
+def test_failures_are_cached_for_the_negative_ttl(clock, lookup):
+    cache = ResolverCache(ttl=60, negative_ttl=5, resolve=lookup,
+                          clock=clock)
+    with pytest.raises(socket.gaierror):
+        cache.gethostbyname('unknown')
+    clock.now = 4.0
+    with pytest.raises(socket.gaierror):
+        cache.gethostbyname('unknown')
+    assert lookup.calls == ['unknown']
+    clock.now = 5.0
+    with pytest.raises(socket.gaierror):
+        cache.gethostbyname('unknown')
+    assert lookup.calls == ['unknown', 'unknown']
+
+
+def test_each_cached_failure_raises_a_fresh_error(clock, lookup):
+    cache = ResolverCache(resolve=lookup, clock=clock)
+    errors = []
+    for _ in range(3):
+        with pytest.raises(socket.gaierror) as info:
+            cache.gethostbyname('unknown')
+        errors.append(info.value)
+    assert len({id(error) for error in errors}) == 3
+    assert all(error.errno == socket.EAI_NONAME for error in errors)
+    assert cache.cache['unknown'][0].__traceback__ is None
+
+
+def test_least_recently_used_are_evicted(clock, lookup):
+    cache = ResolverCache(maxsize=2, resolve=lookup, clock=clock)
+    cache.gethostbyname('host1')
+    cache.gethostbyname('host2')
+    cache.gethostbyname('host1')  # now more recent than host2
+    cache.gethostbyname('host3')
+    assert list(cache.cache) == ['host1', 'host3']
+    cache.gethostbyname('host2')
+    assert lookup.calls == ['host1', 'host2', 'host3', 'host2']
+
+
+def test_hosts_file_takes_precedence(tmp_path, clock, lookup):
+    hosts = tmp_path / 'hosts'
+    hosts.write_text('# comment\n'
+                     '192.0.2.1  host1 alias  # trailing comment\n'
+                     '::1        host2\n'
+                     '192.0.2.3\n')
+    cache = ResolverCache(hosts_file=str(hosts), resolve=lookup,
+                          clock=clock)
+    clock.now = 1e9
+    assert cache.gethostbyname('host1') == '192.0.2.1'
+    assert cache.gethostbyname('alias') == '192.0.2.1'
+    assert cache.gethostbyname('host2') == '10.0.0.2'
+    assert lookup.calls == ['host2']
+
+
+def test_resolve_all_maps_hosts_to_addresses_or_errors(lookup):
+    cache = ResolverCache(resolve=lookup)
+    hosts = ['host{}'.format(n) for n in range(50)] + ['unknown', 'host7']
+    results = cache.resolve_all(hosts, max_workers=8)
+    assert list(results) == hosts[:-1]
+    for n in range(50):
+        assert results['host{}'.format(n)] == '10.0.0.{}'.format(n)
+    assert isinstance(results['unknown'], socket.gaierror)
+    assert len(lookup.calls) == 51
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+import collections
+import math
+import random
+
+import networkx as nx
+import pytest
+
+from csr import CSRGraph
+from routing import (all_forwarding_tables, dijkstra_generalized,
+                     dijkstra_predecessor_and_distance, ecmp_next_hop,
+                     predecessor_to_ecmp_forwarding,
+                     predecessor_to_forwarding,
+                     predecessor_to_forwarding_array)
+
+# Parameters of dijkstra_generalized for the widest path problem
+WIDEST = dict(infinity=0, plus=min, less=lambda x, y: x > y, min=max)
+
+
+def random_graph(seed, directed=False, n=40, m=100, costs='int'):
+    """
+    Random graph whose costs are small ints (many ties) or floats (none).
+    """
+    graph = nx.gnm_random_graph(n, m, seed=seed, directed=directed)
+    rng = random.Random(seed)
+    for u, v in graph.edges():
+        graph[u][v]['cost'] = (rng.randint(1, 5) if costs == 'int'
+                               else rng.uniform(1, 10))
+    return graph
+
+
+def representations(graph):
+    return [graph, CSRGraph.from_graph(graph)]
+
+
+def sorted_sets(P):
+    return {v: sorted(parents) for v, parents in P.items()}
+
+
+@pytest.mark.parametrize('directed', [False, True])
+@pytest.mark.parametrize('seed', range(3))
+def test_shortest_paths_match_networkx(seed, directed):
+    graph = random_graph(seed, directed)
+    expected_P, expected_D = nx.dijkstra_predecessor_and_distance(
+        graph, 0, weight='cost')
+    for g in representations(graph):
+        P, D = dijkstra_predecessor_and_distance(g, 0)
+        assert {v: D[v] for v in expected_D} == expected_D
+        assert all(D[v] == math.inf for v in D if v not in expected_D)
+        # Integer costs tie often: every least-cost predecessor is kept
+        assert sorted_sets({v: P[v] for v in expected_P}) == sorted_sets(
+            expected_P)
+
+
+def bottlenecks(graph, source):
+    """
+    Widest-path widths from the source: the narrowest link on its path in
+    a maximum spanning tree, which is a widest path.
+    """
+    tree = nx.maximum_spanning_tree(graph, weight='cost')
+    widths = {}
+    for v, path in nx.single_source_shortest_path(tree, source).items():
+        if v != source:
+            widths[v] = min(tree[a][b]['cost']
+                            for a, b in zip(path, path[1:]))
+    return widths
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_widest_paths_match_spanning_tree(seed):
+    graph = random_graph(seed, costs='float')
+    expected = bottlenecks(graph, 0)
+    for g in representations(graph):
+        P, D = dijkstra_generalized(g, 0, **WIDEST)
+        assert {v: D[v] for v in expected} == expected
+        assert all(D[v] == 0 for v in D if v != 0 and v not in expected)
+        # Each predecessor gives the width found
+        for v, parents in P.items():
+            for p in parents:
+                width = graph[p][v]['cost']
+                assert (width if p == 0 else min(D[p], width)) == D[v]
+
+
+@pytest.mark.parametrize('directed', [False, True])
+@pytest.mark.parametrize('seed', range(3))
+def test_forwarding_tables_follow_shortest_paths(seed, directed):
+    graph = random_graph(seed, directed, costs='float')
+    paths = nx.single_source_dijkstra_path(graph, 0, weight='cost')
+    for g in representations(graph):
+        P, _ = dijkstra_predecessor_and_distance(g, 0)
+        forwarding = predecessor_to_forwarding(P, 0)
+        # Float costs: shortest paths are unique
+        assert forwarding == {v: (0, path[1])
+                              for v, path in paths.items() if v != 0}
+
+        nodes, next_hop = predecessor_to_forwarding_array(P, 0)
+        assert {nodes[i]: (0, nodes[h]) for i, h in enumerate(next_hop)
+                if h >= 0} == forwarding
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_ecmp_counts_match_all_shortest_paths(seed):
+    graph = random_graph(seed)
+    for g in representations(graph):
+        P, _ = dijkstra_predecessor_and_distance(g, 0)
+        ecmp = predecessor_to_ecmp_forwarding(P, 0)
+        for v in graph:
+            if v == 0 or not nx.has_path(graph, 0, v):
+                assert v not in ecmp
+                continue
+            counts = collections.Counter(
+                path[1] for path in nx.all_shortest_paths(
+                    graph, 0, v, weight='cost'))
+            assert ecmp[v] == (0, dict(counts))
+            assert ecmp[v][1].keys() <= graph[0].keys()
+            for weighted in (True, False):
+                hop = ecmp_next_hop(ecmp[v], (0, v, 6), weighted)
+                assert hop in counts
+                assert hop == ecmp_next_hop(ecmp[v], (0, v, 6), weighted)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_targets_stop_early_with_exact_distances(seed):
+    graph = random_graph(seed)
+    targets = random.Random(seed).sample(list(graph), 3)
+    for g in representations(graph):
+        _, expected = dijkstra_predecessor_and_distance(g, 0)
+        _, D = dijkstra_predecessor_and_distance(g, 0, targets=targets)
+        assert {t: D[t] for t in targets} == {
+            t: expected[t] for t in targets}
+
+
+def test_all_forwarding_tables_match_single_sources():
+    graph = random_graph(0, n=20, m=40, costs='float')
+    tables = dict(all_forwarding_tables(graph, max_workers=2, chunksize=4))
+    assert tables.keys() == set(graph)
+    for source, table in tables.items():
+        P, _ = dijkstra_predecessor_and_distance(graph, source)
+        assert table == predecessor_to_forwarding(P, source)
+
+
+def test_csr_graph_must_hold_the_weight():
+    graph = CSRGraph.from_graph(random_graph(0), weight='cost')
+    with pytest.raises(ValueError):
+        dijkstra_generalized(graph, 0, weight='delay')
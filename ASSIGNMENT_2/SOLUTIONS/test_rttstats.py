@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+import io
+import json
+import math
+import random
+import statistics
+
+import pytest
+
+from rttstats import (RECORD_FIELDS, IntervalReporter, QuantileSketch,
+                      RTTStatistics, record_writer)
+
+
+def rtts(seed, n=1000):
+    rng = random.Random(seed)
+    return [rng.lognormvariate(3, 1) for _ in range(n)]
+
+
+def nearest_rank(values, q):
+    values = sorted(values)
+    return values[max(0, math.ceil(q * len(values)) - 1)]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_mean_and_variance_match_statistics(seed):
+    values = rtts(seed)
+    stats = RTTStatistics()
+    for value in values:
+        stats.add(value)
+    assert stats.received == stats.sent == len(values)
+    assert stats.mean == pytest.approx(statistics.mean(values))
+    assert stats.variance == pytest.approx(statistics.variance(values))
+    assert (stats.minimum, stats.maximum) == (min(values), max(values))
+
+
+def test_merge_matches_a_single_stream():
+    values = rtts(1)
+    whole, first, second = RTTStatistics(), RTTStatistics(), RTTStatistics()
+    for k, value in enumerate(values):
+        whole.add(value)
+        (first if k < 300 else second).add(value)
+    first.lose()
+    first.merge(second)
+    assert first.sent == len(values) + 1
+    assert first.received == len(values)
+    assert first.mean == pytest.approx(whole.mean)
+    assert first.variance == pytest.approx(whole.variance)
+    assert first.quantile(0.5) == whole.quantile(0.5)
+
+
+@pytest.mark.parametrize('accuracy', [0.01, 0.05])
+@pytest.mark.parametrize('seed', range(3))
+def test_quantiles_are_within_relative_accuracy(seed, accuracy):
+    values = rtts(seed)
+    sketch = QuantileSketch(accuracy)
+    for value in values:
+        sketch.add(value)
+    for q in [0.0, 0.01, 0.25, 0.5, 0.75, 0.9, 0.99, 1.0]:
+        exact = nearest_rank(values, q)
+        assert abs(sketch.quantile(q) - exact) <= accuracy * exact
+        assert min(values) <= sketch.quantile(q) <= max(values)
+
+
+def test_quantiles_stay_within_the_observed_range():
+    sketch = QuantileSketch(0.05)
+    for value in [10.0] * 5:
+        sketch.add(value)
+    assert sketch.quantile(0.0) == sketch.quantile(1.0) == 10.0
+    assert math.isnan(QuantileSketch().quantile(0.5))
+
+
+def test_sketches_of_different_accuracy_do_not_merge():
+    with pytest.raises(ValueError):
+        QuantileSketch(0.01).merge(QuantileSketch(0.02))
+
+
+def test_record_without_replies():
+    stats = RTTStatistics()
+    stats.lose()
+    stats.lose()
+    record = stats.record()
+    assert (record['sent'], record['lost'], record['loss']) == (2, 2, 100.0)
+    assert record['mean'] is None and record['p99'] is None
+
+
+def test_reporter_reports_every_host_and_keeps_totals():
+    records = []
+    reporter = IntervalReporter(records.append, interval=3600)
+    for value in [1.0, 2.0, 3.0]:
+        reporter.add('alpha', value)
+    reporter.lose('beta')
+    totals = reporter.close()
+    assert sorted(record['host'] for record in records) == ['alpha', 'beta']
+    assert totals['alpha'].mean == pytest.approx(2.0)
+    assert totals['beta'].sent == 1
+
+
+def test_json_records():
+    stream = io.StringIO()
+    report = record_writer(stream, 'json')
+    report({'host': 'alpha', 'sent': 1})
+    assert json.loads(stream.getvalue()) == {'host': 'alpha', 'sent': 1}
+
+
+def test_csv_header_is_written_once(tmp_path):
+    path = tmp_path / 'records.csv'
+    record = dict.fromkeys(RECORD_FIELDS, 1)
+    for _ in range(2):
+        with open(path, 'a', newline='') as stream:
+            record_writer(stream, 'csv')(record)
+    lines = path.read_text().splitlines()
+    assert lines == [','.join(RECORD_FIELDS)] + [
+        ','.join(['1'] * len(RECORD_FIELDS))] * 2
+
+
+def test_unknown_format_is_refused():
+    with pytest.raises(ValueError):
+        record_writer(io.StringIO(), 'xml')
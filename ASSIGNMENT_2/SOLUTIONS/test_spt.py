@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import math
+import random
+
+import networkx as nx
+import pytest
+
+from routing import dijkstra_generalized, predecessor_to_forwarding
+from spt import ShortestPathTree
+
+# Semirings of dijkstra_generalized, as documented there
+SHORTEST = dict(infinity=math.inf, plus=lambda x, y: x + y,
+                less=lambda x, y: x < y)
+WIDEST = dict(infinity=0, plus=min, less=lambda x, y: x > y)
+
+
+def random_graph(seed, directed, n=25, m=50):
+    graph = nx.gnm_random_graph(n, m, seed=seed, directed=directed)
+    rng = random.Random(seed)
+    for u, v in graph.edges():
+        graph[u][v]['cost'] = rng.uniform(1, 10)
+    return graph
+
+
+def random_updates(graph, tree, rng, count=60):
+    """
+    Random cost changes, removals and additions of links, applied through
+    the tree; yields after each.
+    """
+    nodes = list(graph)
+    for _ in range(count):
+        edges = list(graph.edges())
+        action = rng.random()
+        if edges and action < 0.5:
+            u, v = rng.choice(edges)
+            delta = tree.update_edge(u, v, rng.uniform(1, 10))
+        elif edges and action < 0.75:
+            u, v = rng.choice(edges)
+            delta = tree.remove_edge(u, v)
+        else:
+            u, v = rng.sample(nodes, 2)
+            delta = tree.add_edge(u, v, rng.uniform(1, 10))
+        yield delta
+
+
+@pytest.mark.parametrize('directed', [False, True])
+@pytest.mark.parametrize('seed', range(4))
+def test_shortest_path_repairs_match_recompute(seed, directed):
+    graph = random_graph(seed, directed)
+    tree = ShortestPathTree(graph, 0)
+    forwarding = dict(tree.forwarding)
+    for delta in random_updates(graph, tree, random.Random(seed)):
+        P, D = dijkstra_generalized(graph, 0, multipath=False)
+        assert tree.D == D
+        # Random float costs: no ties, so the tree itself is unique
+        assert tree.P == P
+        assert tree.forwarding == predecessor_to_forwarding(P, 0)
+
+        # The deltas reported account for every change of the table
+        for destination, entry in delta.items():
+            if entry is None:
+                del forwarding[destination]
+            else:
+                forwarding[destination] = entry
+        assert forwarding == tree.forwarding
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_widest_path_repairs_match_recompute(seed):
+    graph = random_graph(seed, directed=False)
+    tree = ShortestPathTree(graph, 0, **WIDEST)
+    for _ in random_updates(graph, tree, random.Random(seed)):
+        P, D = dijkstra_generalized(graph, 0, multipath=False, **WIDEST)
+        assert tree.D == D
+        # Bottlenecks tie, so only check the tree is consistent
+        assert tree.forwarding == predecessor_to_forwarding(tree.P, 0)
+        for v, parents in tree.P.items():
+            if parents:
+                u, = parents
+                width = tree._extend(u, graph[u][v]['cost'])
+                assert width == tree.D[v]
+
+
+def test_updates_change_the_callers_graph():
+    graph = nx.path_graph(3)
+    nx.set_edge_attributes(graph, 1, 'cost')
+    tree = ShortestPathTree(graph, 0)
+    assert tree.update_edge(0, 1, 5) == {}
+    assert graph[0][1]['cost'] == 5
+    assert tree.remove_edge(1, 2) == {2: None}
+    assert not graph.has_edge(1, 2)
+    assert tree.add_edge(0, 2, 2) == {2: (0, 2)}
+    assert graph[0][2]['cost'] == 2
+    assert tree.D == {0: 0, 1: 5, 2: 2}
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+import socket
+import time
+
+import pytest
+
+from ping import ECHO_REPLY, ChecksumError, echo_request, ping, verbose_ping
+from transport import IPV4_HEADER_LENGTH, LoopbackTransport
+
+
+def test_replies_arrive_after_the_latency():
+    with LoopbackTransport(latency=20.0) as transport:
+        transport.sendto(echo_request(1), ('10.0.0.1', 1))
+        start = time.perf_counter()
+        datagram, address = transport.recvfrom(1024)
+        assert time.perf_counter() - start >= 0.015
+    assert address == ('10.0.0.1', 0)
+    assert datagram[IPV4_HEADER_LENGTH] == ECHO_REPLY.type
+
+
+def test_receiving_honours_the_timeout():
+    with LoopbackTransport(latency=50.0) as transport:
+        transport.settimeout(0.01)
+        assert transport.gettimeout() == 0.01
+        with pytest.raises(socket.timeout):
+            transport.recvfrom(1024)  # nothing sent
+
+        transport.sendto(echo_request(1), ('10.0.0.1', 1))
+        with pytest.raises(socket.timeout):
+            transport.recvfrom(1024)  # not arrived yet
+
+        transport.setblocking(False)
+        with pytest.raises(BlockingIOError):
+            transport.recvfrom(1024)
+
+
+def test_only_echo_requests_are_answered():
+    request = bytearray(echo_request(1))
+    request[0] = 13  # timestamp request
+    with LoopbackTransport() as transport:
+        transport.settimeout(0.0)
+        assert transport.sendto(request, ('10.0.0.1', 1)) == len(request)
+        with pytest.raises(BlockingIOError):
+            transport.recvfrom(1024)
+
+
+def test_seeded_loss_is_reproducible():
+    def answered(seed):
+        with LoopbackTransport(loss=0.5, seed=seed) as transport:
+            transport.settimeout(0.0)
+            for seq_no in range(100):
+                transport.sendto(echo_request(1, seq_no), ('10.0.0.1', 1))
+            return len(transport.in_flight)
+
+    assert answered(7) == answered(7)
+    assert 25 < answered(7) < 75
+
+
+def test_names_resolve_through_hosts():
+    transport = LoopbackTransport(hosts={'example.test': '192.0.2.1'})
+    assert transport.gethostbyname('example.test') == '192.0.2.1'
+    assert transport.gethostbyname('localhost') == '127.0.0.1'
+    assert transport.gethostbyname('198.51.100.7') == '198.51.100.7'
+    with pytest.raises(socket.gaierror):
+        transport.gethostbyname('unknown.invalid')
+
+
+def test_ping_resolves_and_measures():
+    with LoopbackTransport(latency=5.0) as transport:
+        transport.settimeout(1.0)
+        rtt, header = ping(transport, 'localhost', client_id=9, seq_no=4)
+        assert transport.gettimeout() == 1.0
+    assert rtt >= 4.0
+    assert (header.identifier, header.sequence_number) == (9, 4)
+
+
+def test_ping_skips_foreign_traffic():
+    with LoopbackTransport() as transport:
+        transport.settimeout(1.0)
+        # Replies to another process, and to an earlier probe, come first
+        transport.sendto(echo_request(8, 4), ('10.0.0.1', 1))
+        transport.sendto(echo_request(9, 3), ('10.0.0.1', 1))
+        _, header = ping(transport, '10.0.0.1', client_id=9, seq_no=4)
+        assert (header.identifier, header.sequence_number) == (9, 4)
+        assert not transport.in_flight
+
+
+def test_ping_times_out_and_detects_corruption():
+    with LoopbackTransport(loss=1.0) as transport:
+        transport.settimeout(0.02)
+        with pytest.raises(socket.timeout):
+            ping(transport, '10.0.0.1', client_id=9)
+        assert transport.gettimeout() == 0.02
+
+    with LoopbackTransport(corruption=1.0, seed=0) as transport:
+        transport.settimeout(1.0)
+        with pytest.raises(ChecksumError):
+            ping(transport, '10.0.0.1', client_id=9)
+
+
+def test_verbose_ping_over_loopback():
+    lines = []
+    verbose_ping('localhost', timeout=50, count=3, log=lines.append,
+                 transport=lambda: LoopbackTransport(latency=1.0))
+    replies = [line for line in lines
+               if isinstance(line, str) and line.startswith('Reply from')]
+    assert len(replies) == 3
+
+    lines = []
+    verbose_ping('localhost', timeout=10, count=2, log=lines.append,
+                 transport=lambda: LoopbackTransport(loss=1.0))
+    assert lines.count('Request timed out after 10ms') == 2
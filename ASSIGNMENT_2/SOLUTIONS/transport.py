@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+import heapq
+import itertools
+import random
+import socket
+import struct
+import time
+
+from checksum import checksum_update
+
+# Minimal IPv4 header prepended to simulated replies
+IPV4_HEADER_FIELDS = '!BBHHHBBH4s4s'
+IPV4_HEADER_LENGTH = 20
+ICMP_ECHO_REQUEST_TYPE = 8
+
+
+class RawSocket(socket.socket):
+    """
+    Raw ICMP socket: the transport used by ping unless told otherwise.
+
+    Transports are socket-like objects offering ``sendto``, ``recvfrom``,
+    ``recvfrom_into``, ``settimeout``, ``gettimeout`` and ``close`` (and
+    usable in a ``with`` statement), plus a ``gethostbyname`` method for
+    name resolution.
+    """
+
+    def __init__(self):
+        super().__init__(family=socket.AF_INET,
+                         type=socket.SOCK_RAW,  # <=="raw socket"
+                         proto=socket.getprotobyname('icmp'))
+
+    gethostbyname = staticmethod(socket.gethostbyname)
+
+
+class LoopbackTransport(object):
+    """
+    In-process stand-in for a raw socket and the hosts it reaches: every
+    echo request sent is answered by an echo reply, without privileges or
+    a network.
+
+    Replies arrive after ``latency`` milliseconds; each is dropped with
+    probability ``loss`` (so the receiver times out) or has a payload bit
+    flipped with probability ``corruption`` (so its checksum fails).
+    Names resolve through ``hosts`` (name -> IPv4 address), and IPv4
+    addresses resolve to themselves.
+    """
+
+    def __init__(self, latency=0.0, loss=0.0, corruption=0.0, hosts=None,
+                 seed=None):
+        self.latency = latency / 1000.0
+        self.loss = loss
+        self.corruption = corruption
+        self.hosts = {'localhost': '127.0.0.1'}
+        self.hosts.update(hosts or {})
+        self.random = random.Random(seed)
+        self.timeout = None
+        self.in_flight = []  # heap of (delivery instant, order, ...)
+        self.counter = itertools.count()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.in_flight = []
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def gettimeout(self):
+        return self.timeout
+
+    def setblocking(self, flag):
+        self.timeout = None if flag else 0.0
+
+    def gethostbyname(self, host):
+        if host in self.hosts:
+            return self.hosts[host]
+        try:
+            socket.inet_aton(host)
+        except OSError:
+            raise socket.gaierror(socket.EAI_NONAME,
+                                  'Name or service not known')
+        return host
+
+    def sendto(self, packet, address):
+        packet = bytes(packet)
+        host = address[0]
+        if packet[0] != ICMP_ECHO_REQUEST_TYPE:
+            return len(packet)  # nothing answers other messages
+
+        # Echo reply: zero type and code, and patch the checksum to match
+        checksum = int.from_bytes(packet[2:4], 'big')
+        checksum = checksum_update(
+            checksum, int.from_bytes(packet[:2], 'big'), 0)
+        reply = bytearray(packet)
+        reply[:4] = bytes(2) + checksum.to_bytes(2, 'big')
+
+        if self.random.random() < self.loss:
+            return len(packet)
+        if len(reply) > 8 and self.random.random() < self.corruption:
+            bit = self.random.randrange(8 * (len(reply) - 8))
+            reply[8 + bit // 8] ^= 1 << (bit % 8)
+
+        ip_header = struct.pack(
+            IPV4_HEADER_FIELDS, 0x45, 0, IPV4_HEADER_LENGTH + len(reply),
+            0, 0, 64, socket.IPPROTO_ICMP, 0,
+            socket.inet_aton(host), socket.inet_aton('127.0.0.1'))
+        heapq.heappush(self.in_flight, (
+            time.perf_counter() + self.latency, next(self.counter),
+            ip_header + bytes(reply), (host, 0)))
+        return len(packet)
+
+    def recvfrom_into(self, buffer, nbytes=0):
+        datagram, address = self.recvfrom(nbytes or len(buffer))
+        buffer[:len(datagram)] = datagram
+        return len(datagram), address
+
+    def recvfrom(self, bufsize):
+        # Wait for the next reply, as a socket with this timeout would
+        if self.in_flight:
+            wait = self.in_flight[0][0] - time.perf_counter()
+            if wait > 0:
+                if self.timeout == 0.0:
+                    raise BlockingIOError
+                if self.timeout is not None and wait > self.timeout:
+                    time.sleep(self.timeout)
+                    raise socket.timeout('timed out')
+                time.sleep(wait)
+            _, _, datagram, address = heapq.heappop(self.in_flight)
+            return datagram[:bufsize], address
+
+        # No reply will come: time out (at once, if blocking forever)
+        if self.timeout == 0.0:
+            raise BlockingIOError
+        if self.timeout is not None:
+            time.sleep(self.timeout)
+        raise socket.timeout('timed out')